@@ -26,6 +26,9 @@ from jx_sqlite.sqlite import quote_column
 
 DIGITS_TABLE = "__digits__"
 ABOUT_TABLE = "meta.about"
+TABLES_TABLE = "__tables__"  # CATALOG OF SNOWFLAKE TABLES, SEE ColumnList
+COLUMNS_TABLE = "__columns__"  # CATALOG OF COLUMNS, SEE ColumnList
+UNINDEXED_TABLE = "__unindexed__"  # FACT TABLES WHOSE GUIDS ARE NOT UNIQUE, SO CAN NOT BE INDEXED
 
 
 GUID = "_id"  # user accessible, unique value across many machines
@@ -154,18 +157,23 @@ sql_aggs = {
     "median": "MEDIAN",
     "min": "MIN",
     "minimum": "MIN",
-    "sum": "SUM"
+    "percentile": "PERCENTILE",
+    "std": "STDDEV_POP",
+    "stddev": "STDDEV_POP",
+    "sum": "SUM",
+    "var": "VAR_POP",
+    "variance": "VAR_POP"
 }
 
 STATS = {
     "count": "COUNT({{value}})",
-    "std": "SQRT((1-1.0/COUNT({{value}}))*VARIANCE({{value}}))",
+    "std": "STDDEV_POP({{value}})",
     "min": "MIN({{value}})",
     "max": "MAX({{value}})",
     "sum": "SUM({{value}})",
     "median": "MEDIAN({{value}})",
     "sos": "SUM({{value}}*{{value}})",
-    "var": "(1-1.0/COUNT({{value}}))*VARIANCE({{value}})",
+    "var": "VAR_POP({{value}})",
     "avg": "AVG({{value}})"
 }
 
@@ -0,0 +1,278 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import, division, unicode_literals
+
+from math import sqrt
+
+from mo_future import text
+from mo_json import json2value, value2json
+
+DIGEST_COMPRESSION = 100  # MORE IS MORE ACCURATE, AND MORE MEMORY
+DIGEST_BUFFER = 5 * DIGEST_COMPRESSION  # UNMERGED VALUES HELD BEFORE COMPRESSING
+
+
+class TDigest(object):
+    """
+    MERGING t-digest: A SKETCH OF A DISTRIBUTION IN BOUNDED MEMORY
+    EXACT UNTIL THERE ARE MORE THAN ABOUT compression VALUES, AND
+    MOST ACCURATE NEAR THE EXTREME QUANTILES AFTER THAT
+    """
+
+    __slots__ = ["compression", "centroids", "buffer", "total", "min", "max"]
+
+    def __init__(self, compression=DIGEST_COMPRESSION):
+        self.compression = compression
+        self.centroids = []  # SORTED LIST OF (mean, weight)
+        self.buffer = []
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.total += weight
+        self.buffer.append((value, weight))
+        if len(self.buffer) >= DIGEST_BUFFER:
+            self._compress()
+
+    def merge(self, other):
+        if not other.total:
+            return
+        for mean, weight in other.centroids + other.buffer:
+            self.buffer.append((mean, weight))
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def _compress(self):
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+        if not points:
+            return
+        total = self.total
+        output = []
+        mean, weight = points[0]
+        before = 0  # WEIGHT OF ALL CENTROIDS BEFORE THE CURRENT ONE
+        for m, w in points[1:]:
+            q = (before + weight + w / 2) / total
+            if weight + w <= 4 * total * q * (1 - q) / self.compression:
+                # MERGE INTO CURRENT CENTROID
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                output.append((mean, weight))
+                before += weight
+                mean, weight = m, w
+        output.append((mean, weight))
+        self.centroids = output
+
+    def percentile(self, percent):
+        """
+        :param percent: A NUMBER FROM 0 TO 1
+        :return: INTERPOLATED VALUE, SAME AS mo_math.stats.percentile() WHEN EXACT
+        """
+        if self.buffer:
+            self._compress()
+        if not self.total:
+            return None
+        if self.total == 1:
+            return self.min
+
+        # PLACE EACH CENTROID AT THE (FRACTIONAL) INDEX OF ITS CENTER
+        target = (self.total - 1) * percent
+        prev_index, prev_mean = 0, self.min
+        before = 0
+        for mean, weight in self.centroids:
+            index = before + (weight - 1) / 2
+            if index >= target:
+                if index == prev_index:
+                    return mean
+                return prev_mean + (mean - prev_mean) * (target - prev_index) / (index - prev_index)
+            prev_index, prev_mean = index, mean
+            before += weight
+        last = self.total - 1
+        if last == prev_index:
+            return self.max
+        return prev_mean + (self.max - prev_mean) * (target - prev_index) / (last - prev_index)
+
+    def __data__(self):
+        if self.buffer:
+            self._compress()
+        return {"centroids": self.centroids, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_json(cls, json):
+        output = cls()
+        if not json:
+            return output
+        data = json2value(json)
+        output.centroids = [(m, w) for m, w in data.centroids]
+        output.total = sum(w for _, w in output.centroids)
+        output.min = data.min
+        output.max = data.max
+        return output
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Percentile(object):
+    """
+    PERCENTILE(value, percent)
+    """
+
+    def __init__(self):
+        self.digest = TDigest()
+        self.percent = None
+
+    def step(self, value, percent):
+        self.percent = percent
+        if _is_number(value):
+            self.digest.add(value)
+
+    def finalize(self):
+        if self.percent is None:
+            return None
+        return self.digest.percentile(self.percent)
+
+
+class Median(object):
+    """
+    MEDIAN(value)
+    """
+
+    def __init__(self):
+        self.digest = TDigest()
+
+    def step(self, value):
+        if _is_number(value):
+            self.digest.add(value)
+
+    def finalize(self):
+        return self.digest.percentile(0.5)
+
+
+class Digest(object):
+    """
+    TDIGEST(value) - SERIALIZED SKETCH, FOR STORING OR FOR COMBINING WITH TDIGEST_MERGE
+    """
+
+    def __init__(self):
+        self.digest = TDigest()
+
+    def step(self, value):
+        if _is_number(value):
+            self.digest.add(value)
+
+    def finalize(self):
+        return value2json(self.digest)
+
+
+class DigestMerge(object):
+    """
+    TDIGEST_MERGE(sketch) - COMBINE SERIALIZED SKETCHES INTO ONE
+    """
+
+    def __init__(self):
+        self.digest = TDigest()
+
+    def step(self, sketch):
+        self.digest.merge(TDigest.from_json(sketch))
+
+    def finalize(self):
+        return value2json(self.digest)
+
+
+def digest_percentile(sketch, percent):
+    """
+    TDIGEST_PERCENTILE(sketch, percent)
+    """
+    return TDigest.from_json(sketch).percentile(percent)
+
+
+class Variance(object):
+    """
+    WELFORD'S ONLINE VARIANCE
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if not _is_number(value):
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+
+class SampleVariance(Variance):
+    def finalize(self):
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+
+class PopulationVariance(Variance):
+    def finalize(self):
+        if not self.count:
+            return None
+        return self.m2 / self.count
+
+
+class SampleStddev(SampleVariance):
+    def finalize(self):
+        output = SampleVariance.finalize(self)
+        return None if output is None else sqrt(output)
+
+
+class PopulationStddev(PopulationVariance):
+    def finalize(self):
+        output = PopulationVariance.finalize(self)
+        return None if output is None else sqrt(output)
+
+
+aggregates = {
+    # NAME: (NUMBER OF PARAMETERS, CLASS)
+    "MEDIAN": (1, Median),
+    "PERCENTILE": (2, Percentile),
+    "TDIGEST": (1, Digest),
+    "TDIGEST_MERGE": (1, DigestMerge),
+    "VARIANCE": (1, SampleVariance),
+    "VAR_SAMP": (1, SampleVariance),
+    "VAR_POP": (1, PopulationVariance),
+    "STDEV": (1, SampleStddev),
+    "STDDEV": (1, SampleStddev),
+    "STDDEV_SAMP": (1, SampleStddev),
+    "STDDEV_POP": (1, PopulationStddev),
+}
+
+functions = {
+    "TDIGEST_PERCENTILE": (2, digest_percentile),
+}
+
+
+def register(db):
+    """
+    ADD THE AGGREGATES TO A sqlite3 CONNECTION
+    """
+    for name, (num_params, aggregate) in aggregates.items():
+        db.create_aggregate(text(name), num_params, aggregate)
+    for name, (num_params, function) in functions.items():
+        db.create_function(text(name), num_params, function)
@@ -10,37 +10,68 @@ from __future__ import absolute_import, division, unicode_literals
 
 from mo_json import STRING
 
-from mo_dots import concat_field
+from mo_dots import concat_field, literal_field
 
 from jx_base import Facts, Column
-from jx_sqlite import UID, GUID, DIGITS_TABLE, ABOUT_TABLE
+from jx_sqlite import PARENT, UID, GUID, DIGITS_TABLE, ABOUT_TABLE, UNINDEXED_TABLE, quoted_GUID, quoted_UID
+from jx_sqlite.dictionary import dictionary_table, is_encoded
+from jx_sqlite.guid import bind_guid, is_guid, sql_guid_index
+from jx_sqlite.index_advisor import IndexAdvisor
+from jx_sqlite.loader import LOAD_CHUNK_SIZE, LOAD_REPORT_PERIOD, chunks, json_lines, json_texts
 from jx_sqlite.namespace import Namespace
 from jx_sqlite.query_table import QueryTable
-from jx_sqlite.snowflake import Snowflake
-from mo_future import first, PY3
+from jx_sqlite.result_cache import ResultCache
+from jx_sqlite.snowflake import REBUILD_BATCH, Snowflake, sql_parent_index
+from mo_future import allocate_lock as _allocate_lock, first, text
 from mo_kwargs import override
 from mo_logs import Log
+from mo_threads import Thread, Till
 from mo_sql import (
+    SQL,
     SQL_SELECT,
     SQL_FROM,
     SQL_UPDATE,
     SQL_SET,
+    SQL_WHERE,
+    SQL_LE,
+    SQL_UNION_ALL,
+    SQL_AND,
+    SQL_COMMA,
+    SQL_EQ,
+    SQL_GT,
+    SQL_LIMIT,
+    SQL_ORDERBY,
+    ConcatSQL,
+    sql_iso,
 )
 from jx_sqlite.sqlite import (
     Sqlite,
     quote_column,
+    quote_value,
+    sql_alias,
     sql_eq,
     sql_create,
     sql_insert,
     json_type_to_sqlite_type)
 from mo_times import Date
+from time import time
 
 _config = None
+MIN_UID_BLOCK = 1000  # FIRST NUMBER OF UIDS RESERVED
+MAX_UID_BLOCK = 1000000  # RESERVATIONS DOUBLE UNTIL THIS SIZE
 
 
 class Container(object):
     @override
-    def __init__(self, db=None):
+    def __init__(self, db=None, cache_size=0, cache_ttl=None, auto_index=False, stats_period=None):
+        """
+        :param db: Sqlite, OR THE SETTINGS TO MAKE ONE
+        :param cache_size: NUMBER OF QUERY RESULTS TO CACHE (0 FOR NO CACHE)
+        :param cache_ttl: SECONDS A CACHED RESULT IS KEPT (None FOR UNTIL THE TABLE CHANGES)
+        :param auto_index: True TO LET THE advisor MAKE AND DROP INDEXES (SEE IndexAdvisor)
+        :param stats_period: SECONDS BETWEEN SCANS THAT CORRECT THE COLUMN STATISTICS OF
+                             CHANGED TABLES (None FOR NO SCANS, SEE ColumnList.refresh_stats())
+        """
         global _config
         if isinstance(db, Sqlite):
             self.db = db
@@ -58,37 +89,160 @@ class Container(object):
 
         self.setup()
         self.ns = Namespace(db=db)
+        self.cache = ResultCache(size=cache_size, ttl=cache_ttl) if cache_size else None
+        self.advisor = IndexAdvisor(self, auto=auto_index)
         self.about = QueryTable("meta.about", self)
-        self.next_uid = self._gen_ids()  # A DELIGHTFUL SOURCE OF UNIQUE INTEGERS
+        self.uid_locker = _allocate_lock()
+        self.uid_block = MIN_UID_BLOCK
+        self.uid_next = self.uid_max = 0  # RESERVED UIDS ARE uid_next <= uid < uid_max
+        self._rebuild_uids()
+        self._index_nested()
+        self._index_guids()
+        self.stats_period = stats_period
+        self.stats_thread = Thread.run("refresh column stats", self._refresh_stats) if stats_period else None
+
+    def next_uid(self):
+        """
+        :return: A DELIGHTFUL SOURCE OF UNIQUE INTEGERS
+        """
+        with self.uid_locker:
+            if self.uid_next >= self.uid_max:
+                self._reserve_uids(1)
+            uid = self.uid_next
+            self.uid_next += 1
+            return uid
+
+    def reserve_uids(self, num):
+        """
+        :param num: NUMBER OF UIDS NEEDED
+        :return: range OF num UNIQUE INTEGERS
+        """
+        with self.uid_locker:
+            if self.uid_next + num > self.uid_max:
+                self._reserve_uids(num)
+            start = self.uid_next
+            self.uid_next += num
+            return range(start, start + num)
+
+    def _reserve_uids(self, num):
+        """
+        RESERVE A BLOCK OF AT LEAST num UIDS, EACH BLOCK TWICE THE SIZE OF THE LAST
+        """
+        block = max(num, self.uid_block)
+        self.uid_block = min(2 * self.uid_block, MAX_UID_BLOCK)
+        with self.db.transaction() as t:
+            top_id = first(first(t.query(
+                SQL_SELECT + quote_column("next_id") + SQL_FROM + quote_column(ABOUT_TABLE)
+            ).data))
+            t.execute(SQL_UPDATE + quote_column(ABOUT_TABLE) + SQL_SET + sql_eq(next_id=top_id + block))
+        if top_id != self.uid_max:
+            # ANOTHER Container RESERVED THE UIDS AFTER OURS
+            self.uid_next = top_id
+        self.uid_max = top_id + block
+
+    def _rebuild_uids(self):
+        """
+        ENSURE THE NEXT RESERVATION IS ABOVE EVERY __id__ IN THE DATABASE
+        """
+        tables = self.db.query(SQL(
+            "SELECT m.name FROM sqlite_master AS m, pragma_table_info(m.name) AS p"
+            " WHERE m.type='table' AND p.name=" + text(quote_value(UID))
+        )).data
+        if not tables:
+            return
+        max_id = first(first(self.db.query(
+            SQL_SELECT + "MAX" + sql_iso(quote_column("m")) + SQL_FROM + sql_iso(SQL_UNION_ALL.join(
+                SQL_SELECT + sql_alias("MAX" + sql_iso(quoted_UID), "m") + SQL_FROM + quote_column(name)
+                for name, in tables
+            ))
+        ).data))
+        if max_id is None:
+            return
+        with self.db.transaction() as t:
+            t.execute(
+                SQL_UPDATE + quote_column(ABOUT_TABLE) +
+                SQL_SET + sql_eq(next_id=max_id + 1) +
+                SQL_WHERE + quote_column("next_id") + SQL_LE + quote_value(max_id)
+            )
 
-    def _gen_ids(self):
-        def output():
+    def _index_nested(self):
+        """
+        ADD THE PARENT INDEX TO NESTED TABLES MADE BEFORE IT EXISTED
+        """
+        tables = self.db.query(SQL(
+            "SELECT m.name FROM sqlite_master AS m, pragma_table_info(m.name) AS p"
+            " WHERE m.type='table' AND p.name=" + text(quote_value(PARENT)) +
+            " AND NOT EXISTS (SELECT 1 FROM pragma_index_list(m.name) AS i, pragma_index_info(i.name) AS c"
+            " WHERE c.seqno=0 AND c.name=" + text(quote_value(PARENT)) + ")"
+        )).data
+        if not tables:
+            return
+        with self.db.transaction() as t:
+            for name, in tables:
+                Log.note("Index {{table|quote}} by parent", table=name)
+                t.execute(sql_parent_index(name))
+
+    def _index_guids(self):
+        """
+        STORE THE GUIDS OF FACT TABLES MADE BEFORE GUIDS WERE BINARY, AND INDEX THEM
+        A TABLE WITH DUPLICATE GUIDS KEEPS ITS (CONVERTED) GUIDS, AND IS RECORDED
+        IN UNINDEXED_TABLE SO IT IS NOT TRIED AGAIN
+        """
+        tables = self.db.query(SQL(
+            "SELECT m.name FROM sqlite_master AS m, pragma_table_info(m.name) AS p"
+            " WHERE m.type='table' AND p.name=" + text(quote_value(GUID)) +
+            " AND NOT EXISTS (SELECT 1 FROM pragma_index_list(m.name) AS i, pragma_index_info(i.name) AS c"
+            " WHERE i.\"unique\" AND c.seqno=0 AND c.name=" + text(quote_value(GUID)) + ")"
+            " AND m.name NOT IN (SELECT name FROM " + text(quote_column(UNINDEXED_TABLE)) + ")"
+        )).data
+        for name, in tables:
+            Log.note("Index {{table|quote}} by GUID", table=name)
+            # CONVERT IN __id__ ORDER, ONE BATCH PER TRANSACTION, SO MEMORY DOES NOT GROW WITH THE TABLE
+            last, done = None, 0
             while True:
                 with self.db.transaction() as t:
-                    top_id = first(
-                        first(
-                            t.query(
-                                SQL_SELECT
-                                + quote_column("next_id")
-                                + SQL_FROM
-                                + quote_column(ABOUT_TABLE)
-                            ).data
-                        )
+                    rows = t.query(ConcatSQL(
+                        SQL_SELECT, quoted_UID, SQL_COMMA, quoted_GUID,
+                        SQL_FROM, quote_column(name),
+                        SQL_WHERE, SQL("TYPEOF"), sql_iso(quoted_GUID), SQL_EQ, quote_value("text"),
+                        SQL_AND, quoted_UID, SQL_GT, quote_value(-1 if last is None else last),
+                        SQL_ORDERBY, quoted_UID, SQL_LIMIT, quote_value(REBUILD_BATCH)
+                    )).data
+                    if not rows:
+                        break
+                    t.execute_many(
+                        ConcatSQL(SQL_UPDATE, quote_column(name), SQL_SET, quoted_GUID, SQL("=?"), SQL_WHERE, quoted_UID, SQL("=?")),
+                        [(bind_guid(guid), uid) for uid, guid in rows if is_guid(guid)]
                     )
-                    max_id = top_id + 1000
-                    t.execute(
-                        SQL_UPDATE
-                        + quote_column(ABOUT_TABLE)
-                        + SQL_SET
-                        + sql_eq(next_id=max_id)
-                    )
-                while top_id < max_id:
-                    yield top_id
-                    top_id += 1
-        if PY3:
-            return output().__next__
-        else:
-            return output().next
+                last = max(uid for uid, _ in rows)
+                done += len(rows)
+                if len(rows) == REBUILD_BATCH:
+                    Log.note("Converting GUIDS of {{table|quote}}: {{done}} rows", table=name, done=done)
+            try:
+                with self.db.transaction() as t:
+                    t.execute(sql_guid_index(name))
+            except Exception as e:
+                Log.warning("Can not index {{table|quote}} by GUID; it will not be tried again", table=name, cause=e)
+                with self.db.transaction() as t:
+                    t.execute(sql_insert(UNINDEXED_TABLE, {"name": name, "reason": text(e)}))
+
+    def _refresh_stats(self, please_stop):
+        """
+        PERIODICALLY REFRESH THE STATISTICS OF THE FACTS WRITTEN SINCE THE LAST REFRESH
+        """
+        refreshed = {}  # MAP FROM FACT NAME TO THE VERSION LAST REFRESHED
+        while not please_stop:
+            (please_stop | Till(seconds=self.stats_period)).wait()
+            if please_stop or self.db.closed:
+                break
+            for fact_name, version in list(self.ns.versions.items()):
+                if refreshed.get(fact_name) == version or not self.ns.columns._snowflakes[literal_field(fact_name)]:
+                    continue
+                try:
+                    self.ns.columns.refresh_stats(fact_name)
+                    refreshed[fact_name] = version
+                except Exception as e:
+                    Log.warning("Can not refresh statistics of {{fact|quote}}", fact=fact_name, cause=e)
 
     def setup(self):
         if not self.db.about(ABOUT_TABLE):
@@ -99,6 +253,9 @@ class Container(object):
                 t.execute(sql_insert(ABOUT_TABLE, {"version": "1.0", "next_id": 1000}))
                 t.execute(sql_create(DIGITS_TABLE, {"value": "INTEGER"}))
                 t.execute(sql_insert(DIGITS_TABLE, [{"value": i} for i in range(10)]))
+        if not self.db.about(UNINDEXED_TABLE):
+            with self.db.transaction() as t:
+                t.execute(sql_create(UNINDEXED_TABLE, {"name": "TEXT PRIMARY KEY", "reason": "TEXT"}))
 
     def create_or_replace_facts(self, fact_name, uid=UID):
         """
@@ -117,6 +274,9 @@ class Container(object):
 
         with self.db.transaction() as t:
             t.execute(command)
+            t.execute(sql_guid_index(fact_name))
+            self.ns.columns.save_table(t, fact_name, ["."])
+        self.ns.changed(fact_name)
 
         snowflake = Snowflake(fact_name, self.ns)
         return Facts(self, snowflake)
@@ -128,7 +288,13 @@ class Container(object):
                 for p in paths:
                     full_name = concat_field(fact_name, p[0])
                     t.execute("DROP TABLE "+quote_column(full_name))
+                    for c in self.ns.columns.find(full_name):
+                        if is_encoded(c):
+                            t.execute("DROP TABLE IF EXISTS " + quote_column(dictionary_table(c)))
+                self.ns.columns.forget_facts(t, fact_name)
+                t.execute("DELETE FROM " + quote_column(UNINDEXED_TABLE) + " WHERE " + sql_eq(name=fact_name))
             self.ns.columns.remove_table(fact_name)
+            self.ns.changed(fact_name)
 
     def get_or_create_facts(self, fact_name, uid=UID):
         """
@@ -143,7 +309,7 @@ class Container(object):
                 Log.error("do not know how to handle yet")
 
             self.ns.columns._snowflakes[fact_name] = ["."]
-            self.ns.columns.add(Column(
+            id_column = self.ns.columns.add(Column(
                 name="_id",
                 es_column="_id",
                 es_index=fact_name,
@@ -157,8 +323,56 @@ class Container(object):
 
             with self.db.transaction() as t:
                 t.execute(command)
+                t.execute(sql_guid_index(fact_name))
+                self.ns.columns.save_table(t, fact_name, ["."])
+                self.ns.columns.save_column(t, id_column)
 
         return QueryTable(fact_name, self)
 
+    def load(self, source, table, chunk_size=LOAD_CHUNK_SIZE, processes=1, typed=False):
+        """
+        STREAM NEWLINE-DELIMITED JSON INTO table, chunk_size DOCUMENTS PER insert()
+        MEMORY IS BOUNDED BY chunk_size, NOT BY THE SIZE OF source
+        :param source: FILENAME (ENDING IN .gz IF COMPRESSED), FILE-LIKE OBJECT, OR ITERABLE OF LINES
+        :param table: NAME OF THE FACT TABLE
+        :param processes: NUMBER OF PROCESSES TO PARSE AND FLATTEN THE DOCUMENTS (SEE InsertTable.insert_parallel)
+        :param typed: True IF THE DOCUMENTS ARE ENCODED BY mo_json.typed_encoder (SEE InsertTable.insert_typed)
+        :return: NUMBER OF DOCUMENTS LOADED
+        """
+        facts = self.get_or_create_facts(table)
+        if processes > 1:
+            written = facts.insert_parallel(chunks(json_texts(source), chunk_size), processes, typed=typed)
+        else:
+            written = _insert_chunks(facts.insert_typed if typed else facts.insert, chunks(json_lines(source), chunk_size))
+
+        start = last_note = time()
+        num = 0
+        for n in written:
+            num += n
+            now = time()
+            if now - last_note > LOAD_REPORT_PERIOD:
+                last_note = now
+                Log.note(
+                    "{{num}} documents loaded into {{table|quote}} ({{rate}} docs/sec)",
+                    num=num,
+                    table=table,
+                    rate=int(num / (now - start)),
+                )
+        duration = time() - start
+        Log.note(
+            "Done: {{num}} documents loaded into {{table|quote}} in {{duration|round(places=3)}} seconds ({{rate}} docs/sec)",
+            num=num,
+            table=table,
+            duration=duration,
+            rate=int(num / duration) if duration else num,
+        )
+        return num
+
     def get_table(self, table_name):
         return QueryTable(table_name, self)
+
+
+def _insert_chunks(insert, chunks):
+    for chunk in chunks:
+        insert(chunk)
+        yield len(chunk)
@@ -0,0 +1,123 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http:# mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+DICTIONARY ENCODING: A STRING COLUMN CAN HOLD INTEGER CODES, WITH THE STRINGS
+IN A TABLE OF ITS OWN. THE COLUMN IS MARKED WITH es_type == DICTIONARY_TYPE
+SEE Snowflake.encode_column()
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_sql import SQL, SQL_EQ, SQL_FROM, SQL_IN, SQL_SELECT, SQL_WHERE, SQL_ZERO, ConcatSQL, sql_iso
+
+from jx_sqlite import GUID
+from jx_sqlite.guid import SqlGuid
+from jx_sqlite.sqlite import quote_column, quote_list, sql_call, sql_create
+
+DICTIONARY_TYPE = "DICTIONARY"  # es_type OF AN ENCODED COLUMN (SQLITE GIVES IT NUMERIC AFFINITY)
+DICTIONARY_PREFIX = "__dictionary__."  # TABLES STARTING WITH __ ARE NOT PART OF ANY SNOWFLAKE
+MAX_LOOKUP = 1000  # MOST VALUES LOOKED UP IN ONE QUERY
+
+SQL_CODE = SQL("code")
+SQL_VALUE = SQL("value")
+
+
+def is_encoded(column):
+    return column.es_type == DICTIONARY_TYPE
+
+
+def dictionary_table(column):
+    """
+    :return: NAME OF THE TABLE WITH THE (code, value) PAIRS OF column
+    """
+    return DICTIONARY_PREFIX + column.es_index + "." + column.es_column
+
+
+def sql_create_dictionary(column):
+    return sql_create(
+        dictionary_table(column),
+        {"code": "INTEGER PRIMARY KEY", "value": "TEXT"},
+        unique="value"
+    )
+
+
+class SqlDecode(ConcatSQL):
+    """
+    THE VALUE OF AN ENCODED COLUMN; code IS THE SQL FOR THE CODE ITSELF, WHICH
+    IS ALL THAT IS NEEDED TO FILTER AND GROUP
+    """
+    __slots__ = ["code", "dictionary"]
+
+    def __init__(self, column):
+        self.code = quote_column(column.es_column)
+        self.dictionary = quote_column(dictionary_table(column))
+        ConcatSQL.__init__(
+            self,
+            SQL("(SELECT value FROM"), self.dictionary, SQL("WHERE code ="), self.code, SQL(")")
+        )
+
+
+def sql_column(column):
+    """
+    :return: SQL FOR THE VALUE OF column, DECODED IF NEEDED
+    """
+    if is_encoded(column):
+        return SqlDecode(column)
+    if column.es_column == GUID:
+        return SqlGuid()
+    return quote_column(column.es_column)
+
+
+def sql_encode(column, value):
+    """
+    :param value: SQL FOR A STRING
+    :return: SQL FOR THE CODE OF value, IF column IS ENCODED
+    """
+    if is_encoded(column):
+        return sql_iso(ConcatSQL(
+            SQL_SELECT, SQL_CODE, SQL_FROM, quote_column(dictionary_table(column)), SQL_WHERE, SQL_VALUE, SQL("="), value
+        ))
+    return value
+
+
+def sql_match(value, condition, one=False):
+    """
+    :param value: SQL FOR A VALUE, MAYBE AN SqlDecode
+    :param condition: FUNCTION FROM THE SQL FOR A VALUE TO THE SQL FOR A BOOLEAN
+    :param one: True IF condition IS TRUE FOR AT MOST ONE VALUE (LIKE EQUALITY)
+    :return: condition(value), BUT ON THE CODES IF value IS DECODED, SO ONLY THE
+             DICTIONARY IS SEARCHED, AND AN INDEX ON THE CODES CAN BE USED
+    """
+    if isinstance(value, SqlDecode):
+        codes = sql_iso(ConcatSQL(SQL_SELECT, SQL_CODE, SQL_FROM, value.dictionary, SQL_WHERE, condition(SQL_VALUE)))
+        if one:
+            # COMPARE TO ONE CODE, FOUND ONCE; THERE IS NO CODE ZERO
+            return ConcatSQL(value.code, SQL_EQ, sql_call("COALESCE", codes, SQL_ZERO))
+        return ConcatSQL(value.code, SQL_IN, codes)
+    return condition(value)
+
+
+def encode(t, column, values):
+    """
+    ADD values MISSING FROM THE DICTIONARY OF column
+    :param t: THE TRANSACTION THAT WILL USE THE CODES
+    :param values: SET OF STRINGS
+    :return: MAP FROM EACH OF values TO ITS CODE
+    """
+    table = quote_column(dictionary_table(column))
+    values = list(values)
+    t.execute_many(ConcatSQL(SQL("INSERT OR IGNORE INTO"), table, SQL("(value) VALUES (?)")), [(v,) for v in values])
+    codes = {}
+    for i in range(0, len(values), MAX_LOOKUP):
+        result = t.query(ConcatSQL(
+            SQL("SELECT value, code FROM"), table, SQL("WHERE value IN"), quote_list(values[i:i + MAX_LOOKUP])
+        ))
+        codes.update((v, c) for v, c in result.data)
+    return codes
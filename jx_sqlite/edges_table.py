@@ -29,7 +29,7 @@ from mo_sql import SQL, SQL_AND, SQL_CASE, SQL_COMMA, SQL_DESC, SQL_ELSE, SQL_EN
     SQL_INNER_JOIN, SQL_IS_NOT_NULL, SQL_IS_NULL, SQL_LEFT_JOIN, SQL_LIMIT, SQL_NULL, SQL_ON, SQL_ONE, SQL_OR, \
     SQL_ORDERBY, SQL_SELECT, SQL_STAR, SQL_THEN, SQL_TRUE, SQL_UNION_ALL, SQL_WHEN, SQL_WHERE, sql_coalesce, \
     sql_count, sql_iso, sql_list, SQL_DOT, SQL_PLUS, ConcatSQL, SQL_EQ
-from jx_sqlite.sqlite import quote_column, quote_value, sql_alias
+from jx_sqlite.sqlite import quote_column, quote_value, sql_alias, sql_call
 
 EXISTS_COLUMN = quote_column("__exists__")
 
@@ -71,6 +71,7 @@ class EdgesTable(SetOpTable):
         orderby = []
         domains = []
 
+        # THE RAW (ENCODED) COLUMNS, BY NAME; THE OUTER EXPRESSIONS DECODE THEM
         select_clause = [SQL_ONE + EXISTS_COLUMN] + [quote_column(c.es_column) for c in self.snowflake.columns]
 
         for edge_index, query_edge in enumerate(query.edges):
@@ -389,7 +390,23 @@ class EdgesTable(SetOpTable):
                 if not isinstance(s.percentile, (int, float)):
                     Log.error("Expecting percentile to be a float between 0 and 1")
 
-                raise NotImplementedError()
+                for details in SQLang[s.value].partial_eval().to_sql(schema):
+                    sql = details.sql["n"]
+                    column_number = len(outer_selects)
+                    sql = sql_call(sql_aggs[s.aggregate], sql, quote_value(s.percentile))
+                    if s.default != None:
+                        sql = sql_coalesce([sql, quote_value(s.default)])
+                    outer_selects.append(sql_alias(sql, _make_column_name(column_number)))
+                    index_to_column[column_number] = ColumnMapping(
+                        push_name=s.name,
+                        push_column_name=s.name,
+                        push_column=si,
+                        push_child=".",
+                        pull=get_column(column_number),
+                        sql=sql,
+                        column_alias=_make_column_name(column_number),
+                        type=sql_type_to_json_type["n"]
+                    )
             elif s.aggregate == "cardinality":
                 for details in SQLang[s.value].to_sql(schema):
                     for sql_type, sql in details.sql.items():
@@ -423,10 +440,10 @@ class EdgesTable(SetOpTable):
                         )
 
             elif s.aggregate == "stats":  # THE STATS OBJECT
-                for details in s.value.to_sql(schema):
+                for details in SQLang[s.value].partial_eval().to_sql(schema):
                     sql = details.sql["n"]
                     for name, code in STATS.items():
-                        full_sql = code.replace("{{value}}", sql)
+                        full_sql = SQL(code.replace("{{value}}", text(sql)))
                         column_number = len(outer_selects)
                         outer_selects.append(sql_alias(full_sql, _make_column_name(column_number)))
                         index_to_column[column_number] = ColumnMapping(
@@ -10,6 +10,7 @@
 from __future__ import absolute_import, division, unicode_literals
 
 from jx_base.expressions import BasicStartsWithOp as BasicStartsWithOp_, is_literal
+from jx_sqlite.dictionary import sql_match
 from jx_sqlite.expressions._utils import SQLang, check
 from jx_sqlite.expressions.sql_eq_op import SqlEqOp
 from jx_sqlite.expressions.sql_instr_op import SqlInstrOp
@@ -28,9 +29,9 @@ class BasicStartsWithOp(BasicStartsWithOp_):
             if "%" in prefix or "_" in prefix:
                 for r in "\\_%":
                     prefix = prefix.replaceAll(r, "\\" + r)
-                sql = ConcatSQL(value, SQL_LIKE, quote_value(prefix+"%"), SQL_ESCAPE, SQL("\\"))
+                sql = sql_match(value, lambda u: ConcatSQL(u, SQL_LIKE, quote_value(prefix+"%"), SQL_ESCAPE, SQL("\\")))
             else:
-                sql = ConcatSQL(value, SQL_LIKE, quote_value(prefix+"%"))
+                sql = sql_match(value, lambda u: ConcatSQL(u, SQL_LIKE, quote_value(prefix+"%")))
             return wrap([{"name": ".", "sql": {"b": sql}}])
         else:
             return (
@@ -14,9 +14,12 @@ from jx_base.expressions import (
     FALSE,
     TRUE,
     ZERO,
+    is_literal,
     simplified,
 )
 from jx_base.expressions._utils import builtin_ops
+from jx_sqlite.dictionary import SqlDecode, sql_match
+from jx_sqlite.guid import SqlGuid, sql_guid_in
 from jx_sqlite.expressions._utils import SQLang, check
 from jx_sqlite.expressions.case_op import CaseOp
 from jx_sqlite.expressions.literal import Literal
@@ -59,7 +62,18 @@ class EqOp(EqOp_):
                     elif r.sql[t] is ZERO:
                         acc.append(l.sql[t])
                     else:
-                        acc.append(sql_iso(l.sql[t]) + SQL_EQ + sql_iso(r.sql[t]))
+                        l_sql, r_sql = l.sql[t], r.sql[t]
+                        if isinstance(r_sql, (SqlDecode, SqlGuid)) and is_literal(self.lhs):
+                            l_sql, r_sql = r_sql, l_sql
+                        if isinstance(l_sql, SqlGuid) and (is_literal(self.lhs) or is_literal(self.rhs)):
+                            # COMPARE THE STORED GUID, SO THE INDEX IS USED
+                            literal = self.lhs if is_literal(self.lhs) else self.rhs
+                            acc.append(sql_guid_in(l_sql, [literal.value]))
+                        elif is_literal(self.lhs) or is_literal(self.rhs):
+                            # COMPARE CODES, NOT DECODED VALUES
+                            acc.append(sql_match(l_sql, lambda v: sql_iso(v) + SQL_EQ + sql_iso(r_sql), one=True))
+                        else:
+                            acc.append(sql_iso(l_sql) + SQL_EQ + sql_iso(r_sql))
         if not acc:
             return FALSE.to_sql(schema)
         else:
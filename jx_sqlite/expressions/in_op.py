@@ -13,6 +13,8 @@ from jx_sqlite.sqlite import quote_list
 
 from jx_base.expressions import InOp as InOp_
 from jx_base.language import is_op
+from jx_sqlite.dictionary import sql_match
+from jx_sqlite.guid import SqlGuid, sql_guid_in
 from jx_sqlite.expressions._utils import SQLang, check
 from jx_sqlite.expressions.literal import Literal
 from mo_dots import wrap
@@ -30,7 +32,9 @@ class InOp(InOp_):
         if j_value:
             var = SQLang[self.value].to_sql(schema)
             sql = SQL_OR.join(
-                sql_iso(v, SQL_IN, quote_list(j_value))
+                sql_guid_in(v, j_value)
+                if isinstance(v, SqlGuid)
+                else sql_match(v, lambda u: sql_iso(u, SQL_IN, quote_list(j_value)))
                 for t, v in var[0].sql.items()
             )
         else:
@@ -11,6 +11,8 @@ from __future__ import absolute_import, division, unicode_literals
 
 from jx_base.expressions import MissingOp as MissingOp_
 from jx_base.language import is_op
+from jx_sqlite.dictionary import SqlDecode, sql_match
+from jx_sqlite.guid import SqlGuid
 from jx_sqlite.expressions._utils import SQLang, check
 from mo_dots import wrap
 from mo_sql import (
@@ -44,10 +46,11 @@ class MissingOp(MissingOp_):
                 if t in "bn":
                     acc.append(ConcatSQL(sql_iso(v), SQL_IS_NULL))
                 if t == "s":
+                    # AN ENCODED VALUE IS NULL WHEN ITS CODE IS
                     acc.append(ConcatSQL(
-                        sql_iso(sql_iso(v), SQL_IS_NULL),
+                        sql_iso(sql_iso(v.code if isinstance(v, (SqlDecode, SqlGuid)) else v), SQL_IS_NULL),
                         SQL_OR,
-                        sql_iso(sql_iso(v), SQL_EQ, SQL_EMPTY_STRING)
+                        sql_match(v, lambda u: sql_iso(sql_iso(u), SQL_EQ, SQL_EMPTY_STRING), one=True)
                     ))
 
         if not acc:
@@ -9,7 +9,8 @@
 #
 from __future__ import absolute_import, division, unicode_literals
 
-from jx_base.expressions import PrefixOp as PrefixOp_
+from jx_base.expressions import PrefixOp as PrefixOp_, is_literal
+from jx_sqlite.dictionary import sql_match
 from jx_sqlite.expressions._utils import check, SQLang
 from jx_sqlite.sqlite import sql_call
 from mo_dots import wrap
@@ -22,13 +23,15 @@ class PrefixOp(PrefixOp_):
         if not self.expr:
             return wrap([{"name": ".", "sql": {"b": SQL_TRUE}}])
         else:
-            sql = ConcatSQL(
-                sql_call(
-                    "INSTR",
-                    SQLang[self.expr].to_sql(schema)[0].sql.s,
-                    SQLang[self.prefix].to_sql(schema)[0].sql.s,
-                ),
-                SQL_EQ,
-                SQL_ONE,
-            )
+            expr = SQLang[self.expr].to_sql(schema)[0].sql.s
+            prefix = SQLang[self.prefix].to_sql(schema)[0].sql.s
+
+            def starts_with(value):
+                return ConcatSQL(sql_call("INSTR", value, prefix), SQL_EQ, SQL_ONE)
+
+            if is_literal(self.prefix):
+                # SEARCH THE DICTIONARY, NOT THE ENCODED COLUMN
+                sql = sql_match(expr, starts_with)
+            else:
+                sql = starts_with(expr)
             return wrap([{"name": ".", "sql": {"b": sql}}])
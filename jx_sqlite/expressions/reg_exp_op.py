@@ -10,15 +10,146 @@
 from __future__ import absolute_import, division, unicode_literals
 
 from jx_base.expressions import RegExpOp as RegExpOp_
-from jx_sqlite.expressions._utils import check
+from jx_sqlite.expressions._utils import check, SQLang
 from jx_sqlite.sqlite import quote_value
 from mo_dots import wrap
+from mo_future import unichr
 from mo_json import json2value
+from mo_sql import ConcatSQL, SQL, SQL_AND, SQL_EQ, SQL_FALSE, SQL_GE, SQL_IS_NOT_NULL, SQL_LT, sql_iso
+
+SQL_GLOB = SQL(" GLOB ")
+SQL_REGEXP = SQL(" REGEXP ")
+
+_meta = set(".^$*+?{}[]()|\\")
+_glob_meta = set("*?[")
+MAX_UNICODE = 0x10FFFF
 
 
 class RegExpOp(RegExpOp_):
     @check
     def to_sql(self, schema, not_null=False, boolean=False):
-        pattern = quote_value(json2value(self.pattern.json))
-        value = self.var.to_sql(schema)[0].sql.s
-        return wrap([{"name": ".", "sql": {"b": value + " REGEXP " + pattern}}])
+        pattern = json2value(self.pattern.json)
+        value = SQLang[self.var].to_sql(schema)[0].sql.s
+        if not value:
+            return wrap([{"name": ".", "sql": {"b": SQL_FALSE}}])
+        return wrap([{"name": ".", "sql": {"b": regex_to_sql(value, pattern)}}])
+
+
+def regex_to_sql(value, pattern):
+    """
+    :param value: SQL FOR THE STRING TO MATCH
+    :param pattern: REGULAR EXPRESSION THAT MUST MATCH ALL OF value
+    :return: SQL USING =, RANGE OR GLOB WHEN POSSIBLE, SO AN INDEX CAN BE USED
+             AND THE PYTHON REGEXP CALLBACK IS AVOIDED
+    """
+    tokens, complete = _parse(pattern)
+    if complete:
+        if all(t is not ANY and t is not ANY_STRING for t in tokens):
+            # LITERAL
+            return ConcatSQL(value, SQL_EQ, quote_value("".join(tokens)))
+        prefix = _literal_prefix(tokens)
+        if tokens[len(prefix):] == [ANY_STRING]:
+            # prefix.*
+            return _prefix_range(value, prefix)
+        return ConcatSQL(value, SQL_GLOB, quote_value(_glob(tokens)))
+
+    prefix = _literal_prefix(tokens)
+    regexp = ConcatSQL(value, SQL_REGEXP, quote_value("(?s)^(?:" + pattern + ")\\Z"))
+    if not prefix:
+        return regexp
+    # NARROW WITH THE RANGE, THEN CHECK THE REST WITH THE REGEX
+    return ConcatSQL(sql_iso(_prefix_range(value, prefix)), SQL_AND, regexp)
+
+
+ANY = object()  # .
+ANY_STRING = object()  # .*
+
+
+def _parse(pattern):
+    """
+    :return: (tokens, complete) PAIR: tokens ARE LITERAL CHARACTERS, ANY AND ANY_STRING;
+             complete IS False IF THE PATTERN HAS MORE THAN THE tokens CAN EXPRESS
+    """
+    if "|" in pattern:
+        # ALTERNATION MAY APPLY TO ANY PART OF THE PATTERN
+        return [], False
+    tokens = []
+    i = 1 if pattern.startswith("^") else 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                tokens.append(pattern[i + 1])
+                i += 2
+                continue
+            return tokens, False
+        elif c == ".":
+            if pattern[i + 1:i + 2] == "*":
+                if pattern[i + 2:i + 3] in ("?", "+"):
+                    # LAZY OR POSSESSIVE
+                    return tokens, False
+                tokens.append(ANY_STRING)
+                i += 2
+                continue
+            tokens.append(ANY)
+        elif c in "*+?{":
+            # QUANTIFIER APPLIES TO THE PREVIOUS TOKEN, SO IT IS NOT A LITERAL
+            if tokens:
+                tokens.pop()
+            return tokens, False
+        elif c in _meta:
+            return tokens, False
+        else:
+            tokens.append(c)
+        i += 1
+    return tokens, True
+
+
+def _literal_prefix(tokens):
+    prefix = []
+    for t in tokens:
+        if t is ANY or t is ANY_STRING:
+            break
+        prefix.append(t)
+    return "".join(prefix)
+
+
+def _glob(tokens):
+    output = []
+    for t in tokens:
+        if t is ANY:
+            output.append("?")
+        elif t is ANY_STRING:
+            output.append("*")
+        elif t in _glob_meta:
+            output.append("[" + t + "]")
+        else:
+            output.append(t)
+    return "".join(output)
+
+
+def _prefix_range(value, prefix):
+    """
+    :return: SQL FOR ALL STRINGS STARTING WITH prefix
+    """
+    if not prefix:
+        return ConcatSQL(value, SQL_IS_NOT_NULL)
+    upper = _successor(prefix)
+    lower = ConcatSQL(value, SQL_GE, quote_value(prefix))
+    if upper is None:
+        return lower
+    return ConcatSQL(lower, SQL_AND, value, SQL_LT, quote_value(upper))
+
+
+def _successor(prefix):
+    """
+    :return: SMALLEST STRING GREATER THAN ALL STRINGS STARTING WITH prefix (None IF NONE)
+    """
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            code = 0xE000  # SKIP SURROGATES
+        if code <= MAX_UNICODE:
+            return prefix[:-1] + unichr(code)
+        prefix = prefix[:-1]
+    return None
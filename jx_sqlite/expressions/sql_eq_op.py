@@ -10,6 +10,8 @@
 from __future__ import absolute_import, division, unicode_literals
 
 from jx_base.expressions import FALSE, SqlEqOp as SqlEqOp_, is_literal
+from jx_sqlite.dictionary import SqlDecode, sql_match
+from jx_sqlite.guid import SqlGuid, sql_guid_in
 from jx_sqlite.expressions._utils import SQLang, check
 from jx_sqlite.expressions.boolean_op import BooleanOp
 from mo_dots import wrap
@@ -43,9 +45,17 @@ class SqlEqOp(SqlEqOp_):
                 elif l.sql[t] == None:
                     acc.append(ConcatSQL((r.sql[t], SQL_IS_NULL)))
                 else:
-                    acc.append(
-                        ConcatSQL(sql_iso(l.sql[t]), SQL_EQ, sql_iso(r.sql[t]))
-                    )
+                    l_sql, r_sql = l.sql[t], r.sql[t]
+                    if is_literal(lhs) and isinstance(r_sql, (SqlDecode, SqlGuid)):
+                        l_sql, r_sql = r_sql, l_sql
+                    if isinstance(l_sql, SqlGuid) and (is_literal(lhs) or is_literal(rhs)):
+                        # COMPARE THE STORED GUID, SO THE INDEX IS USED
+                        acc.append(sql_guid_in(l_sql, [(lhs if is_literal(lhs) else rhs).value]))
+                    elif is_literal(lhs) or is_literal(rhs):
+                        # COMPARE CODES, NOT DECODED VALUES
+                        acc.append(sql_match(l_sql, lambda v: ConcatSQL(sql_iso(v), SQL_EQ, sql_iso(r_sql)), one=True))
+                    else:
+                        acc.append(ConcatSQL(sql_iso(l_sql), SQL_EQ, sql_iso(r_sql)))
         if not acc:
             return FALSE.to_sql(schema)
         else:
@@ -13,7 +13,9 @@ from jx_sqlite.sqlite import quote_column
 
 from jx_base.expressions import Variable as Variable_
 from jx_base.queries import get_property_name
-from jx_sqlite import GUID, quoted_GUID
+from jx_sqlite import GUID
+from jx_sqlite.dictionary import sql_column
+from jx_sqlite.guid import SqlGuid
 from jx_sqlite.expressions._utils import json_type_to_sql_type, check
 from mo_dots import ROOT_PATH, relative_field, wrap
 from mo_json import BOOLEAN, OBJECT
@@ -26,7 +28,7 @@ class Variable(Variable_):
         var_name = self.var
         if var_name == GUID:
             return wrap(
-                [{"name": ".", "sql": {"s": quoted_GUID}, "nested_path": ROOT_PATH}]
+                [{"name": ".", "sql": {"s": SqlGuid()}, "nested_path": ROOT_PATH}]
             )
         cols = schema.leaves(var_name)
         if not cols:
@@ -58,16 +60,12 @@ class Variable(Variable_):
                             for child_col in cs:
                                 tempa = acc.setdefault(child_col.nested_path[0], {})
                                 tempb = tempa.setdefault(get_property_name(cname), {})
-                                tempb[json_type_to_sql_type[col.type]] = quote_column(
-                                    child_col.es_column
-                                )
+                                tempb[json_type_to_sql_type[col.type]] = sql_column(child_col)
                 else:
                     nested_path = col.nested_path[0]
                     tempa = acc.setdefault(nested_path, {})
                     tempb = tempa.setdefault(get_property_name(cname), {})
-                    tempb[json_type_to_sql_type[col.jx_type]] = quote_column(
-                        col.es_column
-                    )
+                    tempb[json_type_to_sql_type[col.jx_type]] = sql_column(col)
 
         return wrap(
             [
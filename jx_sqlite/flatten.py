@@ -0,0 +1,228 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http:# mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+FLATTEN DOCUMENTS WITHOUT TOUCHING THE DATABASE, SO IT CAN BE DONE IN ANOTHER PROCESS
+SEE InsertTable.insert_parallel() AND InsertTable.insert_typed()
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+from collections import Mapping, OrderedDict
+
+from jx_base import generateGuid
+from jx_sqlite import GUID, get_jx_type, typed_column
+from jx_sqlite.expressions._utils import json_type_to_sql_type
+from jx_sqlite.guid import bind_guid
+from jx_sqlite.sqlite import bind_value
+from mo_dots import concat_field, is_list, is_many, listwrap, literal_field, unwrap, wrap
+from mo_future import is_text
+from mo_json import NESTED, OBJECT, STRUCT, json2value
+from mo_json.typed_encoder import EXISTS_TYPE, NESTED_TYPE, decode_property, inserter_type_to_json_type
+
+
+VALUE_TYPES = set(inserter_type_to_json_type.keys()) | {NESTED_TYPE}  # PROPERTIES HOLDING A TYPED VALUE
+
+
+def snapshot(snowflake):
+    """
+    :return: PICKLABLE COPY OF WHAT flatten_docs() NEEDS TO KNOW ABOUT THE SNOWFLAKE
+        columns - MAP FROM (name, jx_type) TO (es_column, nested_path)
+        nested - SET OF NAMES STORED IN THEIR OWN (NESTED) TABLE
+    """
+    columns = {}
+    nested = set(path[0] for path in snowflake.query_paths if is_list(path) and path[0] != ".")
+    for path in ["."] + list(nested):
+        for c in snowflake.namespace.columns.find(concat_field(snowflake.fact_name, path)):
+            if c.jx_type not in STRUCT:
+                columns[(c.name, c.jx_type)] = (c.es_column, list(c.nested_path))
+    return {"columns": columns, "nested": nested}
+
+
+class Restructure(Exception):
+    """
+    THE DOCUMENTS NEED AN EXISTING COLUMN MOVED, WHICH ONLY InsertTable.flatten_many() CAN DO
+    """
+    pass
+
+
+def flatten_docs(snapshot, docs):
+    """
+    :param snapshot: SEE snapshot()
+    :param docs: LIST OF DOCUMENTS (OR THEIR JSON)
+    :return: None IF THE DOCUMENTS NEED A SCHEMA RESTRUCTURE, OTHERWISE A dict WITH
+        tables - MAP FROM nested_path[0] TO (es_columns, rows) PAIR; EACH row IS A TUPLE OF
+                 META COLUMNS ([GUID, UID] FOR THE FACT TABLE, [UID, PARENT, ORDER] OTHERWISE)
+                 FOLLOWED BY es_columns. UID AND PARENT ARE LOCAL: 0 <= uid < count
+        columns - LIST OF (name, jx_type, nested_path) FOR NEW COLUMNS
+        nests - LIST OF nested_path FOR NEW NESTED TABLES
+        count - NUMBER OF UIDS USED
+    """
+    return _Flattener(snapshot).run(docs, typed=False)
+
+
+def flatten_typed(snapshot, docs):
+    """
+    SAME AS flatten_docs(), FOR DOCUMENTS ALREADY ENCODED BY mo_json.typed_encoder
+    THE TYPE OF EACH VALUE IS READ FROM ITS PROPERTY (~n~, ~s~, ~b~, ~N~), NOT INFERRED
+    """
+    return _Flattener(snapshot).run(docs, typed=True)
+
+
+def untype(value):
+    """
+    :return: THE PLAIN DOCUMENT FOR A TYPED ONE; UNLIKE mo_json.typed_encoder.untyped()
+             A ONE-ELEMENT ARRAY REMAINS AN ARRAY, SO IT IS STILL NESTED
+    """
+    if isinstance(value, Mapping):
+        output = {}
+        for k, v in value.items():
+            if k == EXISTS_TYPE or v == None:
+                continue
+            elif k == NESTED_TYPE:
+                return [untype(u) for u in v]
+            elif k in inserter_type_to_json_type:
+                return list(v) if is_many(v) else v
+            output[decode_property(k)] = untype(v)
+        return output
+    return value
+
+
+class _Flattener(object):
+
+    def __init__(self, snapshot):
+        self.known = snapshot["columns"]
+        self.nested = set(snapshot["nested"])
+        self.new_columns = OrderedDict()
+        self.nests = []
+        self.tables = {}
+        self.paths = {}  # MAP FROM (full_path, TYPED PROPERTY) TO THE PATH OF THE PROPERTY
+        self.count = 0
+
+    def next_uid(self):
+        uid = self.count
+        self.count += 1
+        return uid
+
+    def insertion(self, path):
+        output = self.tables.get(path)
+        if output is None:
+            output = self.tables[path] = (OrderedDict(), [])
+        return output
+
+    def run(self, docs, typed):
+        flatten = self._typed if typed else self._untyped
+        try:
+            for doc in docs:
+                if is_text(doc):
+                    doc = json2value(doc)
+                if typed:
+                    # PLAIN dict AND list ARE FASTER TO WALK
+                    doc = unwrap(doc)
+                uid = self.next_uid()
+                row = {"uid": uid, GUID: generateGuid()}
+                self.insertion(".")[1].append(row)
+                flatten(doc, uid, ".", ["."], row)
+        except Restructure:
+            return None
+
+        output = {}
+        for path, (columns, rows) in self.tables.items():
+            columns = list(columns)
+            if path == ".":
+                output[path] = (columns, [
+                    tuple([bind_guid(r[GUID]), r["uid"]] + [bind_value(r.get(c)) for c in columns])
+                    for r in rows
+                ])
+            else:
+                output[path] = (columns, [
+                    tuple([r["uid"], r["parent"], r["order"]] + [bind_value(r.get(c)) for c in columns])
+                    for r in rows
+                ])
+        return {
+            "tables": output,
+            "columns": [(name, jx_type, nested_path) for (name, jx_type), (_, nested_path) in self.new_columns.items()],
+            "nests": self.nests,
+            "count": self.count,
+        }
+
+    def _nest(self, cname, values, uid, nested_path, flatten):
+        """
+        ADD ONE ROW TO THE cname TABLE FOR EACH OF values
+        """
+        if cname == nested_path[0]:
+            # ARRAY OF ARRAYS
+            raise Restructure()
+        deeper_nested_path = [cname] + nested_path
+        if cname not in self.nested:
+            self.nested.add(cname)
+            self.nests.append(deeper_nested_path)
+        _, rows = self.insertion(cname)
+        for i, r in enumerate(values):
+            child_uid = self.next_uid()
+            child = {"uid": child_uid, "parent": uid, "order": i}
+            rows.append(child)
+            flatten(r, child_uid, cname, deeper_nested_path, child)
+
+    def _value(self, cname, jx_type, v, nested_path, row):
+        key = (cname, jx_type)
+        found = self.known.get(key) or self.new_columns.get(key)
+        if found is None:
+            found = self.new_columns[key] = (typed_column(cname, json_type_to_sql_type.get(jx_type)), nested_path)
+        elif list(found[1]) != list(nested_path):
+            # EXISTING COLUMN IS AT ANOTHER DEPTH
+            raise Restructure()
+        es_column = found[0]
+        if es_column != GUID:
+            self.insertion(nested_path[0])[0][es_column] = True
+        row[es_column] = v
+
+    def _untyped(self, data, uid, full_path, nested_path, row):
+        if isinstance(data, Mapping):
+            items = [(concat_field(full_path, k), v) for k, v in wrap(data).leaves()]
+        else:
+            # PRIMITIVE VALUES
+            items = [(full_path, data)]
+
+        for cname, v in items:
+            jx_type = get_jx_type(v)
+            if jx_type is None:
+                continue
+
+            if jx_type == NESTED or (jx_type == OBJECT and cname in self.nested):
+                # OBJECTS ARE PROMOTED TO NESTED, ONCE NESTED
+                self._nest(cname, listwrap(v), uid, nested_path, self._untyped)
+            elif jx_type == OBJECT:
+                self._untyped(v, uid, cname, nested_path, row)
+            else:
+                self._value(cname, jx_type, v, nested_path, row)
+
+    def _typed(self, data, uid, full_path, nested_path, row):
+        for k, v in data.items():
+            if v == None or k == EXISTS_TYPE:
+                continue
+            elif k == NESTED_TYPE:
+                self._nest(full_path, v, uid, nested_path, self._typed)
+                continue
+            jx_type = inserter_type_to_json_type.get(k)
+            if jx_type is None:
+                # A PROPERTY
+                cname = self.paths.get((full_path, k))
+                if cname is None:
+                    cname = self.paths[(full_path, k)] = concat_field(full_path, literal_field(decode_property(k)))
+                if cname in self.nested and not any(t in VALUE_TYPES for t in v.keys()):
+                    # OBJECTS ARE PROMOTED TO NESTED, ONCE NESTED
+                    self._nest(cname, [v], uid, nested_path, self._typed)
+                else:
+                    self._typed(v, uid, cname, nested_path, row)
+            elif is_many(v):
+                # MULTIVALUE, STORED LIKE AN ARRAY OF PRIMITIVES
+                self._nest(full_path, [{k: u} for u in v], uid, nested_path, self._typed)
+            else:
+                self._value(full_path, jx_type, v, nested_path, row)
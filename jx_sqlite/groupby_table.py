@@ -13,6 +13,8 @@ from __future__ import absolute_import, division, unicode_literals
 
 from jx_python import jx
 from jx_sqlite import ColumnMapping, _make_column_name, get_column, sql_aggs, PARENT, UID
+from jx_sqlite.dictionary import SqlDecode
+from jx_sqlite.guid import SqlGuid
 from jx_sqlite.edges_table import EdgesTable
 from jx_sqlite.expressions._utils import SQLang, sql_type_to_json_type
 from mo_dots import concat_field, join_field, listwrap, split_field, startswith_field
@@ -50,6 +52,7 @@ class GroupbyTable(EdgesTable):
 
         selects = []
         groupby = []
+        by_code = False  # True IF ANY COLUMN IS GROUPED BY CODE
         for i, e in enumerate(query.groupby):
             for edge_sql in SQLang[e.value].to_sql(schema):
                 column_number = len(selects)
@@ -58,7 +61,12 @@ class GroupbyTable(EdgesTable):
                     Log.error("No such column {{var}}", var=e.value.var)
 
                 column_alias = _make_column_name(column_number)
-                groupby.append(sql)
+                # ENCODED VALUES ARE GROUPED BY CODE, AND DECODED ONCE PER GROUP
+                if isinstance(sql, (SqlDecode, SqlGuid)):
+                    groupby.append(sql.code)
+                    by_code = True
+                else:
+                    groupby.append(sql)
                 selects.append(sql_alias(sql, column_alias))
                 if edge_sql.nested_path == ".":
                     select_name = edge_sql.name
@@ -85,6 +93,10 @@ class GroupbyTable(EdgesTable):
             # AGGREGATE
             if select.value == "." and select.aggregate == "count":
                 sql = sql_count(SQL_ONE)
+            elif select.aggregate == "percentile":
+                if not isinstance(select.percentile, (int, float)):
+                    Log.error("Expecting percentile to be a float between 0 and 1")
+                sql = sql_call(sql_aggs[select.aggregate], sql, quote_value(select.percentile))
             else:
                 sql = sql_call(sql_aggs[select.aggregate], sql)
 
@@ -123,5 +135,8 @@ class GroupbyTable(EdgesTable):
                 for s, sql in [(s, SQLang[s.value].to_sql(schema)[0].sql) for s in query.sort]
                 for t in "bns" if sql[t]
             )
+        elif by_code:
+            # GROUPS COME IN CODE ORDER; PUT THEM IN THE ORDER OF THE VALUES, AS IF NOT ENCODED
+            command += SQL_ORDERBY + sql_list(quote_column(_make_column_name(n)) for n in range(len(groupby)))
 
         return command, index_to_column
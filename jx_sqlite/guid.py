@@ -0,0 +1,94 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http:# mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+THE GUID OF EACH DOCUMENT IS STORED AS A 16-BYTE BLOB, NOT 36 CHARACTERS OF
+TEXT. ONLY THE CANONICAL (LOWERCASE) TEXT OF A GUID IS CONVERTED, SO ANY OTHER
+_id IS KEPT AS-IS, AND THE TEXT CAN ALWAYS BE RECOVERED
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import re
+from binascii import unhexlify
+
+from mo_future import is_text
+from mo_sql import SQL, SQL_IN, ConcatSQL, sql_iso, sql_list
+
+from jx_sqlite import GUID, quoted_GUID
+from jx_sqlite.sqlite import bind_value, quote_column, quote_value
+
+GUID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\Z")
+GUID_PARTS = [(1, 8), (9, 4), (13, 4), (17, 4), (21, 12)]  # (START, LENGTH) OF EACH PART IN THE HEX
+
+
+def is_guid(value):
+    return is_text(value) and GUID_PATTERN.match(value) is not None
+
+
+def bind_guid(value):
+    """
+    :return: value AS A BOUND PARAMETER FOR THE GUID COLUMN
+    """
+    if is_guid(value):
+        return unhexlify(value.replace("-", ""))
+    return bind_value(value)
+
+
+def quote_guid(value):
+    """
+    :return: SQL FOR value, AS STORED IN THE GUID COLUMN
+    """
+    if is_guid(value):
+        return SQL("X'" + value.replace("-", "") + "'")
+    return quote_value(value)
+
+
+def sql_guid_index(table):
+    """
+    :return: SQL TO MAKE THE GUID OF table UNIQUE, AND A LOOKUP BY GUID A SEARCH, NOT A SCAN
+    """
+    return ConcatSQL(
+        SQL("CREATE UNIQUE INDEX IF NOT EXISTS "),
+        quote_column(table + "." + GUID + ".unique"),
+        SQL(" ON "),
+        quote_column(table),
+        sql_iso(quoted_GUID),
+    )
+
+
+class SqlGuid(ConcatSQL):
+    """
+    THE TEXT OF THE GUID COLUMN; code IS THE SQL FOR THE STORED VALUE, WHICH
+    IS WHAT FILTERS COMPARE, SO THE INDEX CAN BE USED
+    """
+    __slots__ = ["code"]
+
+    def __init__(self):
+        self.code = quoted_GUID
+        hex = "HEX(" + quoted_GUID.sql + ")"
+        ConcatSQL.__init__(
+            self,
+            SQL(
+                "(CASE WHEN TYPEOF(" + quoted_GUID.sql + ")='blob' THEN LOWER(" +
+                "||'-'||".join("SUBSTR(" + hex + "," + str(s) + "," + str(n) + ")" for s, n in GUID_PARTS) +
+                ") ELSE"
+            ),
+            self.code,
+            SQL("END)")
+        )
+
+
+def sql_guid_in(value, values):
+    """
+    :param value: AN SqlGuid
+    :param values: LIST OF LITERAL VALUES
+    :return: SQL FOR value BEING ONE OF values
+    """
+    return ConcatSQL(value.code, SQL_IN, sql_iso(sql_list([quote_guid(v) for v in values])))
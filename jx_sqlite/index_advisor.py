@@ -0,0 +1,193 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http:# mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_dots import concat_field, listwrap, relative_field, wrap
+from mo_json import STRUCT
+from mo_logs import Log
+from mo_sql import SQL, ConcatSQL, sql_iso, sql_list
+from mo_threads import Lock
+
+from jx_sqlite.sqlite import quote_column
+
+ADVISE_MIN_SECONDS = 1  # QUERY TIME THAT MUST BE SPENT ON A CANDIDATE BEFORE AN INDEX IS ADVISED
+ADVISE_PERIOD = 1000  # QUERIES BETWEEN AUTOMATIC apply()
+MAX_INDEX_WIDTH = 3  # MOST COLUMNS IN A COMPOSITE INDEX
+ADVISED = "__advised__"  # SUFFIX OF THE INDEXES THE ADVISOR MADE, AND MAY DROP
+
+INDEX_QUERY = SQL(
+    "SELECT m.tbl_name, m.name, i.name FROM sqlite_master AS m, pragma_index_info(m.name) AS i"
+    " WHERE m.type='index' ORDER BY m.tbl_name, m.name, i.seqno"
+)
+
+
+class IndexAdvisor(object):
+    """
+    WATCH THE TYPED COLUMNS USED TO FILTER, SORT AND GROUP, AND THE TIME
+    THOSE QUERIES TAKE, TO ADVISE (OR MAKE) INDEXES ON THEM
+    """
+
+    def __init__(self, container, auto=False, min_seconds=ADVISE_MIN_SECONDS, period=ADVISE_PERIOD):
+        """
+        :param container: THE Container WITH THE TABLES
+        :param auto: True TO apply() THE ADVICE EVERY period QUERIES
+        :param min_seconds: QUERY TIME A CANDIDATE NEEDS BEFORE IT IS ADVISED
+        :param period: QUERIES IN EACH OBSERVATION WINDOW
+        """
+        self.container = container
+        self.auto = auto
+        self.min_seconds = min_seconds
+        self.period = period
+        self.locker = Lock("index advisor")
+        self.candidates = {}  # MAP FROM (table, es_columns) TO {count, seconds, uses}
+        self.num_queries = 0  # QUERIES IN THIS WINDOW
+
+    def record(self, query, duration):
+        """
+        :param query: THE (WRAPPED) QueryOp THAT RAN
+        :param duration: SECONDS IT TOOK
+        """
+        snowflake = query.frum.snowflake
+        origin = relative_field(query.frum.name, snowflake.fact_name)
+        where = self._columns(snowflake, origin, query.where.vars())
+        order = self._columns(snowflake, origin, [
+            v
+            for e in listwrap(query.sort) + listwrap(query.groupby) + listwrap(query.edges)
+            if e.value is not None
+            for v in e.value.vars()
+        ])
+
+        found = {}  # MAP FROM (table, es_columns) TO WHAT THEY ARE USED FOR
+        for table, columns in where.items():
+            for c in columns:
+                found[(table, (c,))] = "where"
+            composite = sorted(columns) + [c for c in order.get(table, []) if c not in columns]
+            if len(composite) > 1:
+                found[(table, tuple(composite[:MAX_INDEX_WIDTH]))] = "where and sort"
+        for table, columns in order.items():
+            if table not in where:
+                found[(table, tuple(columns[:MAX_INDEX_WIDTH]))] = "sort"
+
+        with self.locker:
+            for key, use in found.items():
+                usage = self.candidates.get(key)
+                if usage is None:
+                    usage = self.candidates[key] = {"count": 0, "seconds": 0, "uses": set()}
+                usage["count"] += 1
+                usage["seconds"] += duration
+                usage["uses"].add(use)
+            self.num_queries += 1
+            apply = self.auto and self.num_queries >= self.period
+        if apply:
+            self.apply()
+
+    def _columns(self, snowflake, origin, variables):
+        """
+        :return: MAP FROM TABLE TO THE LIST OF es_columns OF variables IN THAT TABLE
+        """
+        output = {}
+        for v in variables:
+            names = {v.var, concat_field(origin, v.var)}
+            for table in [snowflake.fact_name] + [concat_field(snowflake.fact_name, p[0]) for p in snowflake.nested_paths]:
+                for name in names:
+                    for c in snowflake.namespace.columns.find(table, name):
+                        if c.jx_type in STRUCT:
+                            continue
+                        columns = output.setdefault(table, [])
+                        if c.es_column not in columns:
+                            columns.append(c.es_column)
+        return output
+
+    def advise(self):
+        """
+        :return: LIST OF {action, table, columns, index, reason}, WHERE action IS "add" OR "drop"
+        """
+        existing = self._existing()
+        with self.locker:
+            candidates = sorted(
+                ((k, u) for k, u in self.candidates.items() if u["seconds"] >= self.min_seconds),
+                key=lambda p: (-len(p[0][1]), -p[1]["seconds"])
+            )
+            used = list(self.candidates.keys())
+            num_queries = self.num_queries
+
+        report = []
+        covered = {t: list(indexes.values()) for t, indexes in existing.items()}
+        for (table, columns), usage in candidates:
+            # AN INDEX ON (a, b) ALSO SERVES QUERIES ON a
+            if any(tuple(c[:len(columns)]) == columns for c in covered.get(table, [])):
+                continue
+            covered.setdefault(table, []).append(columns)
+            report.append({
+                "action": "add",
+                "table": table,
+                "columns": list(columns),
+                "index": index_name(table, columns),
+                "reason": "used for " + " and ".join(sorted(usage["uses"])) +
+                          " by " + str(usage["count"]) + " queries taking " + str(round(usage["seconds"], 3)) + " seconds",
+            })
+
+        if num_queries >= self.period:
+            for table, indexes in existing.items():
+                for name, columns in indexes.items():
+                    if not name.endswith(ADVISED):
+                        continue
+                    if any(t == table and tuple(columns[:len(c)]) == c for t, c in used):
+                        continue
+                    report.append({
+                        "action": "drop",
+                        "table": table,
+                        "columns": list(columns),
+                        "index": name,
+                        "reason": "not used by the last " + str(num_queries) + " queries",
+                    })
+        report.sort(key=lambda r: r["action"])
+        return wrap(report)
+
+    def apply(self, report=None):
+        """
+        MAKE (AND DROP) THE ADVISED INDEXES, THEN START A NEW OBSERVATION WINDOW
+        :param report: FROM advise() (DEFAULT IS THE CURRENT ADVICE)
+        :return: THE report APPLIED
+        """
+        if report is None:
+            report = self.advise()
+        if report:
+            with self.container.db.transaction() as t:
+                for r in report:
+                    Log.note("{{action}} index {{index|quote}}: {{reason}}", action=r.action, index=r.index, reason=r.reason)
+                    if r.action == "add":
+                        t.execute(ConcatSQL(
+                            SQL("CREATE INDEX IF NOT EXISTS "),
+                            quote_column(r.index),
+                            SQL(" ON "),
+                            quote_column(r.table),
+                            sql_iso(sql_list([quote_column(c) for c in r.columns])),
+                        ))
+                    else:
+                        t.execute(ConcatSQL(SQL("DROP INDEX IF EXISTS "), quote_column(r.index)))
+        with self.locker:
+            self.candidates = {}
+            self.num_queries = 0
+        return report
+
+    def _existing(self):
+        """
+        :return: MAP FROM TABLE TO {index_name: list of columns}
+        """
+        output = {}
+        for table, name, column in self.container.db.query(INDEX_QUERY).data:
+            output.setdefault(table, {}).setdefault(name, []).append(column)
+        return output
+
+
+def index_name(table, columns):
+    return ".".join([table] + list(columns) + [ADVISED])
@@ -11,24 +11,29 @@
 
 from __future__ import absolute_import, division, unicode_literals
 
-from collections import Mapping
+from collections import Mapping, OrderedDict, deque
+from multiprocessing import Pool
 
 from jx_base import Column, generateGuid
 from jx_base.expressions import jx_expression
-from jx_sqlite import GUID, ORDER, PARENT, UID, get_if_type, get_jx_type, typed_column, untyped_column
+from jx_sqlite import GUID, ORDER, PARENT, UID, get_if_type, get_jx_type, typed_column, unique_name, untyped_column
 from jx_sqlite.base_table import BaseTable
+from jx_sqlite.dictionary import dictionary_table, encode, is_encoded, sql_encode
+from jx_sqlite.flatten import flatten_docs, flatten_typed, snapshot, untype
+from jx_sqlite.guid import bind_guid
 from jx_sqlite.expressions._utils import json_type_to_sql_type
 from mo_collections.queue import Queue
 from mo_dots import Data, Null, concat_field, listwrap, startswith_field, unwrap, unwraplist, wrap, \
     is_many
-from mo_future import text, first
-from mo_json import STRUCT, NESTED, OBJECT
+from mo_future import first, is_text, text
+from mo_json import STRING, STRUCT, NESTED, OBJECT, json2value
 from mo_logs import Log
 from mo_times import Date
-from mo_sql import SQL_AND, SQL_FROM, SQL_INNER_JOIN, SQL_NULL, SQL_SELECT, SQL_TRUE, SQL_UNION_ALL, SQL_WHERE, \
+from mo_sql import SQL, SQL_AND, SQL_AS, SQL_IN, SQL_IS_NOT_NULL, SQL_FROM, SQL_INNER_JOIN, SQL_NULL, SQL_SELECT, SQL_TRUE, SQL_UNION_ALL, SQL_WHERE, \
     sql_iso, sql_list, SQL_VALUES, SQL_INSERT, ConcatSQL, SQL_EQ, SQL_UPDATE, SQL_SET, SQL_ONE, SQL_DELETE, SQL_ON, \
     SQL_COMMA
-from jx_sqlite.sqlite import json_type_to_sqlite_type, quote_column, quote_value, sql_alias
+from jx_sqlite.sqlite import json_type_to_sqlite_type, quote_column, quote_value, sql_alias, bind_value, \
+    sql_insert_params
 
 
 class InsertTable(BaseTable):
@@ -41,6 +46,122 @@ class InsertTable(BaseTable):
             Log.error("Expecting a list of documents")
         doc_collection = self.flatten_many(docs)
         self._insert(doc_collection)
+        self.namespace.changed(self.name)
+
+    def insert_parallel(self, chunks, processes, typed=False):
+        """
+        FLATTEN chunks IN processes WORKER PROCESSES, WHILE THIS PROCESS CHANGES
+        THE SCHEMA, ASSIGNS THE UIDS AND WRITES THE ROWS
+        :param chunks: ITERABLE OF LISTS OF DOCUMENTS (OR THEIR JSON)
+        :param processes: NUMBER OF WORKER PROCESSES
+        :param typed: True IF THE DOCUMENTS ARE ENCODED BY mo_json.typed_encoder
+        :return: GENERATOR OF THE NUMBER OF DOCUMENTS WRITTEN, ONE PER CHUNK
+        """
+        snowflake = self.container.get_or_create_facts(self.name).snowflake
+        flatten = flatten_typed if typed else flatten_docs
+        pool = Pool(processes)
+        try:
+            pending = deque()
+            for chunk in chunks:
+                # EACH CHUNK GETS THE LATEST SCHEMA; ANY THAT IS STALE IS CAUGHT IN _write_flat()
+                pending.append((chunk, pool.apply_async(flatten, (snapshot(snowflake), chunk))))
+                if len(pending) > 2 * processes:
+                    chunk, result = pending.popleft()
+                    yield self._write_flat(snowflake, chunk, result.get(), typed)
+            while pending:
+                chunk, result = pending.popleft()
+                yield self._write_flat(snowflake, chunk, result.get(), typed)
+        finally:
+            pool.close()
+            pool.join()
+
+    def insert_typed(self, docs):
+        """
+        INSERT DOCUMENTS ALREADY ENCODED BY mo_json.typed_encoder, SO THE
+        TYPE OF EACH VALUE IS KNOWN, AND NEED NOT BE INFERRED
+        :param docs: LIST OF TYPED DOCUMENTS (OR THEIR JSON)
+        """
+        if not is_many(docs):
+            Log.error("Expecting a list of documents")
+        snowflake = self.container.get_or_create_facts(self.name).snowflake
+        self._write_flat(snowflake, docs, flatten_typed(snapshot(snowflake), docs), typed=True)
+
+    def _write_flat(self, snowflake, chunk, flat, typed=False):
+        """
+        :param chunk: THE DOCUMENTS
+        :param flat: flatten_docs(chunk), OR flatten_typed(chunk) IF typed
+        :return: NUMBER OF DOCUMENTS WRITTEN
+        """
+        if flat is None or not self._merge_schema(snowflake, flat):
+            docs = [json2value(d) if is_text(d) else d for d in chunk]
+            if typed:
+                docs = [untype(d) for d in docs]
+            self.insert(docs)
+            return len(chunk)
+
+        uids = self.container.reserve_uids(flat["count"])
+        with self.db.transaction() as t:
+            for nested_path, (columns, rows) in flat["tables"].items():
+                if not rows:
+                    continue
+                if nested_path == ".":
+                    meta_columns = [GUID, UID]
+                    rows = [(r[0], uids[r[1]]) + r[2:] for r in rows]
+                else:
+                    meta_columns = [UID, PARENT, ORDER]
+                    rows = [(uids[r[0]], uids[r[1]]) + r[2:] for r in rows]
+                table_name = concat_field(self.name, nested_path)
+                t.execute_many(
+                    sql_insert_params(table_name, meta_columns + columns),
+                    self._encode(t, table_name, columns, rows, len(meta_columns))
+                )
+                self.namespace.columns.observe(t, table_name, columns, rows, len(meta_columns))
+        self.namespace.changed(self.name)
+        return len(chunk)
+
+    def _merge_schema(self, snowflake, flat):
+        """
+        MAKE THE TABLES AND COLUMNS flat NEEDS
+        :return: False IF flat DOES NOT FIT THE SCHEMA
+        """
+        current = snapshot(snowflake)
+        required_changes = []
+        for nested_path in sorted(flat["nests"], key=len):
+            if nested_path[0] not in current["nested"]:
+                required_changes.append({"nest": Column(
+                    name=nested_path[0],
+                    jx_type=NESTED,
+                    es_type=json_type_to_sqlite_type.get(NESTED, NESTED),
+                    es_column=typed_column(nested_path[0], json_type_to_sql_type.get(NESTED)),
+                    es_index=concat_field(self.name, nested_path[1]),
+                    nested_path=nested_path[1:],
+                    last_updated=Date.now()
+                )})
+        for name, jx_type, nested_path in flat["columns"]:
+            existing = current["columns"].get((name, jx_type))
+            if existing:
+                if existing[1] != nested_path:
+                    return False
+                continue
+            required_changes.append({"add": Column(
+                name=name,
+                jx_type=jx_type,
+                es_type=json_type_to_sqlite_type.get(jx_type, jx_type),
+                es_column=typed_column(name, json_type_to_sql_type.get(jx_type)),
+                es_index=concat_field(self.name, nested_path[0]),
+                nested_path=nested_path,
+                last_updated=Date.now()
+            )})
+        if required_changes:
+            snowflake.change_schema(required_changes)
+
+        # NESTING MAY HAVE MOVED COLUMNS THE WORKER EXPECTED IN THE PARENT
+        located = set((es_column, nested_path[0]) for es_column, nested_path in snapshot(snowflake)["columns"].values())
+        for nested_path, (columns, _) in flat["tables"].items():
+            for es_column in columns:
+                if (es_column, nested_path) not in located:
+                    return False
+        return True
 
     def update(self, command):
         """
@@ -197,10 +318,295 @@ class InsertTable(BaseTable):
         )
 
         self.db.execute(command)
+        self.namespace.changed(self.name)
 
-    def upsert(self, doc, where):
-        self.delete(where)
-        self.insert([doc])
+    def update_many(self, records, key=GUID):
+        """
+        APPLY MANY PER-DOCUMENT CHANGES, WITH ONE UPDATE PER PROPERTY CHANGED
+        :param records: LIST OF {key: k, "set": s, "clear": c} WHERE s IS {property: value}
+                        AND c IS A LIST OF PROPERTIES TO REMOVE
+        :param key: NAME OF THE TOP-LEVEL PROPERTY THAT IDENTIFIES A DOCUMENT
+        """
+        if not is_many(records):
+            Log.error("Expecting a list of records")
+        snowflake = self.container.get_or_create_facts(self.name).snowflake
+
+        # MAP FROM key TO {name: (jx_type, value)}; LATER RECORDS WIN
+        changes = OrderedDict()
+        for record in records:
+            record = wrap(record)
+            k = record[key]
+            if k == None:
+                Log.error("Expecting every record to have {{key|quote}}", key=key)
+            change = changes.setdefault(k, {})
+            for name in listwrap(record["clear"]):
+                change[name] = (None, None)
+            for name, v in record.set.items():
+                # KEYS ARE PATHS; INNER OBJECTS ARE SET LEAF-BY-LEAF
+                leaves = [(concat_field(name, k), u) for k, u in v.leaves()] if get_jx_type(v) == OBJECT else [(name, v)]
+                for name, v in leaves:
+                    jx_type = get_jx_type(v)
+                    if jx_type == NESTED:
+                        Log.error("Deep update not supported")
+                    change[name] = (jx_type, v)
+        if not changes:
+            return
+
+        names = OrderedDict()  # MAP FROM PROPERTY NAME TO ITS MARKER IN THE TEMP TABLE
+        values = OrderedDict()  # MAP FROM (name, jx_type) TO ITS VALUE IN THE TEMP TABLE
+        for change in changes.values():
+            for name, (jx_type, _) in change.items():
+                names.setdefault(name, "m" + text(len(names)))
+                if jx_type:
+                    values.setdefault((name, jx_type), "v" + text(len(values)))
+
+        # ADD THE NEW COLUMNS IN ONE BATCH
+        for name in names:
+            if name == key or any(startswith_field(name, p[0]) for p in snowflake.nested_paths):
+                Log.error("Can not update {{name|quote}}", name=name)
+        required_changes = []
+        for name, jx_type in values:
+            c = snowflake.get_column(name, jx_type)
+            if c is None:
+                required_changes.append({"add": Column(
+                    name=name,
+                    jx_type=jx_type,
+                    es_type=json_type_to_sqlite_type.get(jx_type, jx_type),
+                    es_column=typed_column(name, json_type_to_sql_type.get(jx_type)),
+                    es_index=self.name,
+                    nested_path=["."],
+                    last_updated=Date.now()
+                )})
+        if required_changes:
+            snowflake.change_schema(required_changes)
+        key_column = self._key_column(snowflake, key)
+
+        temp_columns = ["key"] + list(names.values()) + list(values.values())
+        rows = []
+        for k, change in changes.items():
+            row = [bind_guid(k) if key_column == GUID else bind_value(k)]
+            row.extend(1 if name in change else None for name in names)
+            row.extend(
+                bind_value(change[name][1]) if change.get(name, (None,))[0] == jx_type else None
+                for name, jx_type in values
+            )
+            rows.append(tuple(row))
+
+        fact = quote_column(self.name)
+        temp_name = "temp_" + unique_name()
+        temp = quote_column(temp_name)
+        key_sql = quote_column("u", "key")
+        found = self.namespace.columns.get_es_column(self.name, key_column)
+        if found is not None:
+            key_sql = sql_encode(found, key_sql)
+        with self.db.transaction() as t:
+            t.execute(ConcatSQL(SQL("CREATE TEMP TABLE "), temp, sql_iso(sql_list(map(quote_column, temp_columns)))))
+            t.execute_many(sql_insert_params(temp_name, temp_columns), rows)
+            for c in snowflake.columns:
+                value = values.get((c.name, c.jx_type))
+                if value and is_encoded(c):
+                    # THE NEW STRINGS NEED CODES
+                    t.execute(ConcatSQL(
+                        SQL("INSERT OR IGNORE INTO "), quote_column(dictionary_table(c)), sql_iso(quote_column("value")),
+                        SQL_SELECT, quote_column(value), SQL_FROM, temp, SQL_WHERE, quote_column(value), SQL_IS_NOT_NULL
+                    ))
+            for name, marker in names.items():
+                # EVERY TYPED COLUMN OF name IS SET, SO A CHANGE OF TYPE CLEARS THE OLD VALUE
+                sets = [
+                    ConcatSQL(
+                        quote_column(c.es_column),
+                        SQL_EQ,
+                        sql_encode(c, quote_column("u", values[(name, c.jx_type)])) if (name, c.jx_type) in values else SQL_NULL
+                    )
+                    for c in snowflake.columns
+                    if c.name == name and c.jx_type not in STRUCT
+                ]
+                if not sets:
+                    continue
+                t.execute(ConcatSQL(
+                    SQL_UPDATE, fact, SQL_SET, sql_list(sets),
+                    SQL_FROM, sql_alias(temp, "u"),
+                    SQL_WHERE, quote_column(self.name, key_column), SQL_EQ, key_sql,
+                    SQL_AND, quote_column("u", marker), SQL_IS_NOT_NULL
+                ))
+            t.execute(ConcatSQL(SQL("DROP TABLE "), temp))
+        self.namespace.changed(self.name)
+
+    def dictionary_encode(self, name):
+        """
+        STORE THE STRINGS OF PROPERTY name AS INTEGER CODES, EACH STRING ONCE IN
+        A DICTIONARY TABLE. FOR LOW-CARDINALITY STRINGS THE TABLES ARE SMALLER,
+        AND FILTERS AND GROUPING WORK ON THE CODES; QUERIES DO NOT CHANGE
+        :param name: PROPERTY NAME (THE COLUMN IS MADE IF IT DOES NOT EXIST YET)
+        """
+        snowflake = self.container.get_or_create_facts(self.name).snowflake
+        column = None
+        for nested_path in [["."]] + snowflake.nested_paths:
+            column = column or self.namespace.columns.get_column(concat_field(self.name, nested_path[0]), name, STRING)
+        if column is None:
+            column = Column(
+                name=name,
+                jx_type=STRING,
+                es_type=json_type_to_sqlite_type[STRING],
+                es_column=typed_column(name, json_type_to_sql_type[STRING]),
+                es_index=self.name,
+                nested_path=["."],
+                last_updated=Date.now()
+            )
+            snowflake.change_schema([{"add": column}])
+            column = snowflake.get_column(name, STRING)
+        snowflake.encode_column(column)
+
+    def _key_column(self, snowflake, key):
+        """
+        :return: es_column OF THE TOP-LEVEL PROPERTY key
+        """
+        if key == GUID:
+            return GUID
+        found = [
+            c.es_column
+            for c in snowflake.columns
+            if c.name == key and c.jx_type not in STRUCT and len(c.nested_path) == 1
+        ]
+        if len(found) != 1:
+            Log.error("Expecting {{key|quote}} to be one column of the fact table", key=key)
+        return found[0]
+
+    def upsert(self, docs, key=GUID):
+        """
+        INSERT docs, REPLACING ANY EXISTING DOCUMENT WITH THE SAME key
+        THE FACT ROW IS UPDATED IN PLACE (IT KEEPS ITS UID); ITS NESTED ROWS ARE REPLACED
+        :param docs: LIST OF DOCUMENTS
+        :param key: NAME OF THE TOP-LEVEL PROPERTY THAT IDENTIFIES A DOCUMENT
+        """
+        if not is_many(docs):
+            Log.error("Expecting a list of documents")
+
+        # LAST DOCUMENT WITH A GIVEN key WINS
+        latest = OrderedDict()
+        for doc in docs:
+            k = wrap(doc)[key]
+            latest[object() if k == None else k] = doc
+        doc_collection = self.flatten_many(list(latest.values()))
+        snowflake = self.container.get_or_create_facts(self.name).snowflake
+
+        key_column = self._key_column(snowflake, key)
+
+        fact = doc_collection["."]
+        fact_columns = [GUID, UID] + [
+            c.es_column for c in fact.active_columns if c.es_column not in (GUID, UID)
+        ]
+        if key_column not in fact_columns:
+            fact_columns.append(key_column)
+        fact_rows = [tuple((bind_guid if c == GUID else bind_value)(row.get(c)) for c in fact_columns) for row in unwrap(fact.rows)]
+        if not fact_rows:
+            return
+        key_index = fact_columns.index(key_column)
+
+        # EVERY OTHER VALUE COLUMN IS REPLACED, SO PROPERTIES MISSING FROM THE NEW DOCUMENT ARE CLEARED
+        set_columns = [c for c in fact_columns if c not in (GUID, UID, key_column)]
+        cleared = [
+            c.es_column
+            for c in snowflake.columns
+            if c.jx_type not in STRUCT and len(c.nested_path) == 1 and c.es_column not in fact_columns
+        ]
+        updates = [ConcatSQL(quote_column(c), SQL("=?")) for c in set_columns] + [
+            ConcatSQL(quote_column(c), SQL_EQ, SQL_NULL) for c in cleared
+        ]
+        update = ConcatSQL(SQL_UPDATE, quote_column(self.name), SQL_SET, sql_list(updates), SQL_WHERE, quote_column(UID), SQL("=?"))
+        set_indexes = [fact_columns.index(c) for c in set_columns]
+        uid_to_value = {row[UID]: row.get(key_column) for row in unwrap(fact.rows)}
+
+        # THE EXISTING DOCUMENTS ARE FOUND BY JOINING TO THE NEW KEYS, SO key NEED NOT BE UNIQUE-INDEXED
+        keys = quote_column("temp_" + unique_name())
+        parents = quote_column("temp_" + unique_name())
+        with self.db.transaction() as t:
+            # AN ENCODED key IS MATCHED BY ITS CODE
+            fact_rows = self._encode(t, self.name, fact_columns, fact_rows)
+            uid_to_key = {r[1]: r[key_index] for r in fact_rows if r[key_index] is not None}
+            t.execute(ConcatSQL(SQL("CREATE TEMP TABLE "), keys, sql_iso(quote_column("key"))))
+            t.execute_many(
+                ConcatSQL(SQL_INSERT, keys, SQL_VALUES, sql_iso(SQL("?"))),
+                [(k,) for k in uid_to_key.values()]
+            )
+            t.execute(ConcatSQL(
+                SQL("CREATE TEMP TABLE "), parents, SQL_AS,
+                SQL_SELECT, sql_list([
+                    sql_alias(quote_column("f", key_column), "key"),
+                    sql_alias(quote_column("f", UID), UID)
+                ]),
+                SQL_FROM, sql_alias(quote_column(self.name), "f"),
+                SQL_INNER_JOIN, sql_alias(keys, "k"),
+                SQL_ON, quote_column("f", key_column), SQL_EQ, quote_column("k", "key")
+            ))
+            result = t.query(ConcatSQL(SQL_SELECT, quote_column("key"), SQL_COMMA, quote_column(UID), SQL_FROM, parents))
+            key_to_uid = {}
+            for k, uid in result.data:
+                if k in key_to_uid:
+                    value = first(uid_to_value[u] for u, v in uid_to_key.items() if v == k)
+                    Log.error(
+                        "Can not upsert: {{table|quote}} has more than one document with {{key}}={{value|quote}}",
+                        table=self.name,
+                        key=key,
+                        value=value,
+                    )
+                key_to_uid[k] = uid
+
+            # THE FACT ROWS THAT ALREADY EXIST KEEP THEIR UID; THEIR OLD NESTED ROWS GO
+            inserts = []
+            changes = []
+            for row in fact_rows:
+                uid = key_to_uid.get(row[key_index])
+                if uid is None:
+                    inserts.append(row)
+                else:
+                    changes.append(tuple(row[i] for i in set_indexes) + (uid,))
+            if inserts:
+                t.execute_many(sql_insert_params(self.name, fact_columns), inserts)
+            if changes and updates:
+                t.execute_many(update, changes)
+            self._delete_nested(t, parents)
+            t.execute(ConcatSQL(SQL("DROP TABLE "), keys))
+            t.execute(ConcatSQL(SQL("DROP TABLE "), parents))
+
+            for nested_path, details in doc_collection.items():
+                if nested_path == "." or not details.rows:
+                    continue
+                columns = [UID, PARENT, ORDER] + [c.es_column for c in details.active_columns]
+                rows = []
+                for row in unwrap(details.rows):
+                    row = [bind_value(row.get(c)) for c in columns]
+                    parent = key_to_uid.get(uid_to_key.get(row[1]))
+                    if parent is not None:
+                        row[1] = parent
+                    rows.append(tuple(row))
+                table_name = concat_field(self.name, nested_path)
+                t.execute_many(sql_insert_params(table_name, columns), self._encode(t, table_name, columns, rows))
+        self.namespace.changed(self.name)
+
+    def _delete_nested(self, t, parents):
+        """
+        DELETE THE NESTED ROWS BELOW THE GIVEN FACTS, ONE LEVEL AT A TIME
+        :param t: THE TRANSACTION
+        :param parents: (QUOTED) NAME OF A TEMP TABLE WITH THE UID OF EACH FACT
+        """
+        deleted = {".": parents}  # MAP FROM nested_path[0] TO TEMP TABLE OF ITS DELETED UIDS
+        for nested_path in self.snowflake.nested_paths:
+            table = quote_column(concat_field(self.name, nested_path[0]))
+            ids = deleted[nested_path[0]] = quote_column("temp_" + unique_name())
+            t.execute(ConcatSQL(
+                SQL("CREATE TEMP TABLE "), ids, SQL_AS,
+                SQL_SELECT, quote_column(UID),
+                SQL_FROM, table,
+                SQL_WHERE, quote_column(PARENT), SQL_IN, sql_iso(SQL_SELECT + quote_column(UID) + SQL_FROM + deleted[nested_path[1]])
+            ))
+            t.execute(ConcatSQL(
+                SQL_DELETE, SQL_FROM, table,
+                SQL_WHERE, quote_column(UID), SQL_IN, sql_iso(SQL_SELECT + quote_column(UID) + SQL_FROM + ids)
+            ))
+        for path, ids in deleted.items():
+            if path != ".":
+                t.execute(ConcatSQL(SQL("DROP TABLE "), ids))
 
     def flatten_many(self, docs, path="."):
         """
@@ -218,12 +624,13 @@ class InsertTable(BaseTable):
         # COLLECT AS MANY doc THAT DO NOT REQUIRE SCHEMA CHANGE
 
         _insertion = Data(
-            active_columns=Queue(),
+            active_columns=ActiveColumns(),
             rows=[]
         )
         doc_collection = {".": _insertion}
         # KEEP TRACK OF WHAT TABLE WILL BE MADE (SHORTLY)
         required_changes = []
+        nests = {}  # MAP FROM NAME TO NESTED COLUMN ALREADY REQUESTED FOR THIS CHUNK
         facts = self.container.get_or_create_facts(self.name)
         snowflake = facts.snowflake
 
@@ -256,21 +663,11 @@ class InsertTable(BaseTable):
                     continue
 
                 insertion = doc_collection[nested_path[0]]
-                if jx_type == NESTED:
-                    c = first(
-                        cc
-                        for cc in insertion.active_columns + snowflake.columns
-                        if cc.jx_type in STRUCT and untyped_column(cc.name)[0] == cname
-                    )
-                else:
-                    c = first(
-                        cc
-                        for cc in insertion.active_columns + snowflake.columns
-                        if cc.jx_type == jx_type and cc.name == cname
-                    )
-
-                if isinstance(c, list):
-                    Log.error("confused")
+                c = insertion.active_columns.get_column(cname, jx_type)
+                if c is None:
+                    c = snowflake.get_column(cname, jx_type)
+                if c is None and jx_type == NESTED:
+                    c = nests.get(cname)
 
                 if not c:
                     # WHAT IS THE NESTING LEVEL FOR THIS PATH?
@@ -290,6 +687,7 @@ class InsertTable(BaseTable):
                     )
                     if jx_type == NESTED:
                         snowflake.query_paths.append(c.es_column)
+                        nests[cname] = c
                         required_changes.append({'nest': c})
                     else:
                         insertion.active_columns.add(c)
@@ -332,7 +730,7 @@ class InsertTable(BaseTable):
                     deeper_nested_path = [cname] + nested_path
                     if not doc_collection.get(cname):
                         doc_collection[cname] = Data(
-                            active_columns=Queue(),
+                            active_columns=ActiveColumns(),
                             rows=[]
                         )
                     for i, r in enumerate(v):
@@ -341,13 +739,14 @@ class InsertTable(BaseTable):
                 elif jx_type == OBJECT:
                     _flatten(v, uid, parent_id, order, cname, nested_path, row=row)
                 elif c.jx_type:
+                    insertion.active_columns.add(c)  # EXISTING COLUMNS ARE ACTIVE TOO
                     row[c.es_column] = v
 
-        for doc in docs:
-            _flatten(doc, self.container.next_uid(), 0, 0, full_path=path, nested_path=["."], guid=generateGuid())
-            if required_changes:
-                snowflake.change_schema(required_changes)
-            required_changes = []
+        # FIRST PASS INFERS THE SCHEMA FOR ALL docs, WHICH IS THEN CHANGED IN ONE TRANSACTION
+        for doc, uid in zip(docs, self.container.reserve_uids(len(docs))):
+            _flatten(doc, uid, 0, 0, full_path=path, nested_path=["."], guid=generateGuid())
+        if required_changes:
+            snowflake.change_schema(required_changes)
 
         return doc_collection
 
@@ -355,7 +754,8 @@ class InsertTable(BaseTable):
         for nested_path, details in collection.items():
             active_columns = wrap(list(details.active_columns))
             rows = details.rows
-            num_rows = len(rows)
+            if not rows:
+                continue
             table_name = concat_field(self.name, nested_path)
 
             if table_name == self.name:
@@ -364,17 +764,60 @@ class InsertTable(BaseTable):
             else:
                 meta_columns = [UID, PARENT, ORDER]
 
-            all_columns = meta_columns + active_columns.es_column  # ONLY THE PRIMITIVE VALUE COLUMNS
-            command = ConcatSQL(
-                SQL_INSERT,
-                quote_column(table_name),
-                sql_iso(sql_list(map(quote_column, all_columns))),
-                SQL_VALUES,
-                sql_list(
-                    sql_iso(sql_list(quote_value(row.get(c)) for c in all_columns))
-                    for row in unwrap(rows)
-                )
-            )
+            es_columns = list(active_columns.es_column)  # ONLY THE PRIMITIVE VALUE COLUMNS
+            all_columns = meta_columns + es_columns
+            # ONE STATEMENT PER (table, columns), SO sqlite3 CAN REUSE THE PREPARED STATEMENT
+            command = sql_insert_params(table_name, all_columns)
+            rows = [tuple((bind_guid if c == GUID else bind_value)(row.get(c)) for c in all_columns) for row in unwrap(rows)]
 
             with self.db.transaction() as t:
-                t.execute(command)
+                t.execute_many(command, self._encode(t, table_name, es_columns, rows, len(meta_columns)))
+                self.namespace.columns.observe(t, table_name, es_columns, rows, len(meta_columns))
+
+    def _encode(self, t, table_name, es_columns, rows, offset=0):
+        """
+        :param t: THE TRANSACTION THAT INSERTS THE rows
+        :param rows: LIST OF TUPLES, WITH THE VALUE OF es_columns[i] AT row[offset + i]
+        :return: rows, WITH THE VALUES OF DICTIONARY-ENCODED COLUMNS REPLACED BY THEIR CODES
+        """
+        encoded = []
+        for i, es_column in enumerate(es_columns, offset):
+            column = self.namespace.columns.get_es_column(table_name, es_column)
+            if column is not None and is_encoded(column):
+                encoded.append((i, column))
+        if not encoded:
+            return rows
+
+        rows = [list(r) for r in rows]
+        for i, column in encoded:
+            codes = encode(t, column, set(r[i] for r in rows if r[i] is not None))
+            for r in rows:
+                r[i] = codes.get(r[i])
+        return [tuple(r) for r in rows]
+
+
+class ActiveColumns(Queue):
+    """
+    THE COLUMNS AN INSERTION WILL FILL, IN ORDER, INDEXED FOR O(1) LOOKUP
+    """
+
+    def __init__(self):
+        Queue.__init__(self)
+        self.typed = {}  # MAP FROM (name, jx_type) TO COLUMN
+        self.structs = {}  # MAP FROM untyped name TO STRUCT COLUMN
+
+    def add(self, column):
+        if column in self.set:
+            return self
+        Queue.add(self, column)
+        self.typed.setdefault((column.name, column.jx_type), column)
+        if column.jx_type in STRUCT:
+            self.structs.setdefault(untyped_column(column.name)[0], column)
+
+    def get_column(self, name, jx_type):
+        """
+        :return: COLUMN WITH name AND jx_type (OR STRUCT COLUMN FOR name IF jx_type IS NESTED), None IF NOT FOUND
+        """
+        if jx_type == NESTED:
+            return self.structs.get(name)
+        return self.typed.get((name, jx_type))
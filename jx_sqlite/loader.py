@@ -0,0 +1,118 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http:# mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+STREAM NEWLINE-DELIMITED JSON INTO A Container
+
+    python -m jx_sqlite.loader --db=my.sqlite --table=my_table docs.json.gz
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import gzip
+import io
+
+from mo_future import is_text, text
+from mo_json import json2value
+from mo_logs import Log, startup
+from mo_threads import MAIN_THREAD
+
+LOAD_CHUNK_SIZE = 1000  # DOCUMENTS PER insert()
+LOAD_REPORT_PERIOD = 10  # SECONDS BETWEEN PROGRESS NOTES
+
+
+def ilines(source):
+    """
+    :param source: FILENAME (ENDING IN .gz IF COMPRESSED), FILE-LIKE OBJECT, OR ITERABLE OF LINES
+    :return: GENERATOR OF (unicode) LINES, READ ONLY AS NEEDED
+    """
+    if is_text(source):
+        if source.endswith(".gz"):
+            stream = io.TextIOWrapper(gzip.open(source, "rb"), encoding="utf8")
+        else:
+            stream = io.open(source, "rt", encoding="utf8")
+        with stream:
+            for line in stream:
+                yield line
+        return
+
+    for line in source:
+        if not is_text(line):
+            line = line.decode("utf8")
+        yield line
+
+
+def json_texts(source):
+    """
+    :return: GENERATOR OF THE NON-BLANK LINES, NOT YET PARSED
+    """
+    for line in ilines(source):
+        line = line.strip()
+        if line:
+            yield line
+
+
+def json_lines(source):
+    """
+    :return: GENERATOR OF DOCUMENTS, ONE PER NON-BLANK LINE
+    """
+    for i, line in enumerate(ilines(source)):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json2value(line)
+        except Exception as e:
+            Log.error("Can not parse line {{line}}", line=i + 1, cause=e)
+
+
+def chunks(values, size):
+    """
+    :return: GENERATOR OF LISTS, EACH WITH (AT MOST) size values
+    """
+    chunk = []
+    for v in values:
+        chunk.append(v)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main():
+    settings = startup.argparse([
+        {"name": ["--db", "--filename"], "help": "sqlite file to load into", "dest": "filename", "required": True},
+        {"name": "--table", "help": "name of the fact table", "dest": "table", "required": True},
+        {"name": "--chunk", "help": "documents per transaction", "type": int, "dest": "chunk_size", "default": LOAD_CHUNK_SIZE},
+        {"name": "--processes", "help": "processes used to flatten documents", "type": int, "dest": "processes", "default": 1},
+        {"name": "--typed", "help": "documents are already typed, as by mo_json.typed_encoder", "action": "store_true", "dest": "typed"},
+        {"name": "source", "help": "file of newline-delimited JSON (.gz for gzip)"},
+    ])
+    Log.start()
+    try:
+        from jx_sqlite.container import Container
+
+        container = Container(db={"filename": settings.filename})
+        container.load(
+            settings.source,
+            settings.table,
+            chunk_size=settings.chunk_size,
+            processes=settings.processes,
+            typed=settings.typed,
+        )
+        container.db.close()
+    except Exception as e:
+        Log.error("Problem loading {{source}}", source=text(settings.source), cause=e)
+    finally:
+        MAIN_THREAD.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,26 +14,48 @@ from jx_base import Column, Table, jx_expression
 from jx_base.meta_columns import META_COLUMNS_DESC, META_COLUMNS_NAME, SIMPLE_METADATA_COLUMNS
 from jx_base.schema import Schema
 from jx_python import jx
-from jx_sqlite import untyped_column
+from jx_sqlite import COLUMNS_TABLE, TABLES_TABLE, untyped_column
+from jx_sqlite.dictionary import sql_column
 from jx_sqlite.expressions._utils import sql_type_to_json_type
-from mo_dots import Data, Null, coalesce, is_data, is_list, literal_field, startswith_field, tail_field, unwraplist, \
-    wrap
-from mo_json import STRUCT, IS_NULL
+from mo_dots import Data, Null, coalesce, concat_field, is_data, is_list, literal_field, startswith_field, tail_field, \
+    unwraplist, wrap
+from mo_future import text
+from mo_json import NESTED, STRUCT, IS_NULL, json2value, value2json
 from mo_json.typed_encoder import unnest_path, untyped
 from mo_logs import Log
+from mo_sql import SQL, SQL_DELETE, SQL_FROM, SQL_SELECT, SQL_UNION_ALL, SQL_WHERE, ConcatSQL, sql_iso, sql_list
 from mo_threads import Lock, Queue
 from mo_times.dates import Date
-from jx_sqlite.sqlite import sql_query
+from jx_sqlite.sqlite import quote_column, quote_value, sql_alias, sql_create, sql_eq, sql_insert_params
 
 DEBUG = False
 singlton = None
 COLUMN_LOAD_PERIOD = 10
 COLUMN_EXTRACT_PERIOD = 2 * 60
 ID = {"field": ["es_index", "es_column"], "version": "last_updated"}
+MAX_PARTITIONS = 100  # MOST DISTINCT VALUES KEPT FOR A COLUMN
 
 
 CACHE = {}  # MAP FROM id(db) TO ColumnList MANAGING THAT DB
 
+CATALOG_COLUMNS = ["es_index", "es_column", "name", "es_type", "jx_type", "count", "cardinality", "multi", "partitions", "last_updated"]
+
+# ONE ROW PER (TABLE, COLUMN), AND ONE ROW FOR EACH TABLE MISSING FROM THE CATALOG (fact IS NULL)
+CATALOG_QUERY = SQL(
+    "SELECT m.name, t.fact, t.nested_path, "
+    + ", ".join("c." + text(quote_column(c)) for c in CATALOG_COLUMNS[1:])
+    + " FROM sqlite_master AS m"
+    + " LEFT JOIN " + text(quote_column(TABLES_TABLE)) + " AS t ON t.name = m.name"
+    + " LEFT JOIN " + text(quote_column(COLUMNS_TABLE)) + " AS c ON c.es_index = t.name"
+    + " WHERE m.type = 'table'"
+    + " ORDER BY m.name"
+)
+
+STATS_UPDATE = SQL(
+    "UPDATE " + text(quote_column(COLUMNS_TABLE))
+    + " SET count=?, cardinality=?, partitions=?, last_updated=? WHERE es_index=? AND es_column=?"
+)
+
 
 class ColumnList(jx_base.Table, jx_base.Container):
     """
@@ -49,6 +71,13 @@ class ColumnList(jx_base.Table, jx_base.Container):
     def __init__(self, db):
         Table.__init__(self, META_COLUMNS_NAME)
         self.data = {}  # MAP FROM fact_name TO (abs_column_name to COLUMNS)
+        self._typed = {}  # MAP FROM fact_name TO ((abs_column_name, jx_type) to COLUMN)
+        self._structs = {}  # MAP FROM fact_name TO (untyped abs_column_name to STRUCT COLUMN)
+        self._es_columns = {}  # MAP FROM table_name TO (es_column TO COLUMN)
+        self._ranges = {}  # MAP FROM (table_name, es_column) TO (min, max) PAIR
+        # MAP FROM (table_name, es_column) TO SORTED LIST OF ALL DISTINCT VALUES (WHEN FEW)
+        # NOT Column.partitions, WHICH jx_base WOULD USE AS THE DOMAIN OF AN EDGE, EVEN WHEN STALE
+        self._partitions = {}
         self.locker = Lock()
         self._schema = None
         self.dirty = False
@@ -70,50 +99,172 @@ class ColumnList(jx_base.Table, jx_base.Container):
         return result
 
     def _load_from_database(self):
-        # FIND ALL TABLES
-        result = self.db.query(sql_query({
-            "from": "sqlite_master",
-            "where": {"eq": {"type": "table"}},
-            "orderby": "name"
-        }))
-        tables = wrap([{k: d for k, d in zip(result.header, row)} for row in result.data])
-        last_nested_path = ["."]
-        for table in tables:
-            if table.name.startswith("__"):
+        """
+        LOAD THE COLUMNS FROM THE CATALOG, IN ONE QUERY
+        TABLES MISSING FROM THE CATALOG ARE SCANNED, AND ADDED TO IT
+        """
+        try:
+            result = self.db.query(CATALOG_QUERY)
+        except Exception as e:
+            if "no such table" not in e:
+                Log.error("Can not load column catalog", cause=e)
+            with self.db.transaction() as t:
+                t.execute(sql_create(TABLES_TABLE, {"name": "TEXT", "fact": "TEXT", "nested_path": "TEXT"}, primary_key="name"))
+                t.execute(sql_create(
+                    COLUMNS_TABLE,
+                    {
+                        "es_index": "TEXT",
+                        "es_column": "TEXT",
+                        "name": "TEXT",
+                        "es_type": "TEXT",
+                        "jx_type": "TEXT",
+                        "count": "INTEGER",
+                        "cardinality": "INTEGER",
+                        "multi": "INTEGER",
+                        "partitions": "TEXT",
+                        "last_updated": "REAL",
+                    },
+                    primary_key=["es_index", "es_column"],
+                ))
+            result = self.db.query(CATALOG_QUERY)
+
+        missing = self._load(result.data)
+        if missing:
+            self._scan(missing)
+
+    def reload_facts(self, fact_name):
+        """
+        FORGET THE IN-MEMORY SCHEMA OF fact_name, AND LOAD IT AGAIN FROM THE CATALOG
+        FOR WHEN A TRANSACTION THAT CHANGED THE SCHEMA IS ROLLED BACK
+        """
+        with self.locker:
+            for nested_path in self._snowflakes[literal_field(fact_name)]:
+                self.remove_table(concat_field(fact_name, nested_path[0]))
+            self._snowflakes[literal_field(fact_name)] = []
+        result = self.db.query(CATALOG_QUERY)
+        self._load(row for row in result.data if row[1] == fact_name)
+
+    def _load(self, rows):
+        """
+        ADD THE COLUMNS OF THE CATALOG_QUERY rows
+        :return: NAMES OF THE TABLES MISSING FROM THE CATALOG
+        """
+        missing = []
+        for table_name, fact, nested_path, es_column, name, es_type, jx_type, count, cardinality, multi, partitions, last_updated in rows:
+            if table_name.startswith("__"):
+                continue
+            if fact is None:
+                if table_name not in missing:
+                    missing.append(table_name)
+                continue
+            nested_path = list(json2value(nested_path))
+            query_paths = self._snowflakes[literal_field(fact)]
+            if nested_path not in query_paths:
+                self._snowflakes[literal_field(fact)] = list(query_paths) + [nested_path]
+            if es_column is None:
                 continue
-            base_table, nested_path = tail_field(table.name)
+            if partitions:
+                self._partitions[(table_name, es_column)] = list(json2value(partitions))
+            self.add(Column(
+                name=name,
+                jx_type=jx_type,
+                nested_path=nested_path,
+                es_type=es_type,
+                es_column=es_column,
+                es_index=table_name,
+                count=count,
+                cardinality=cardinality,
+                multi=multi,
+                last_updated=Date(last_updated)
+            ))
+        return missing
+
+    def _scan(self, table_names):
+        """
+        FALLBACK FOR TABLES NOT IN THE CATALOG: USE PRAGMA table_info, THEN RECORD THEM
+        """
+        tables = []
+        columns = []
+        for table_name in table_names:
+            fact, nested_path = tail_field(table_name)
 
-            # FIND COMMON NESTED PATH SUFFIX
+            # THE PARENT IS THE DEEPEST KNOWN TABLE THAT IS A PREFIX
             if nested_path == ".":
-                last_nested_path = []
+                full_nested_path = ["."]
             else:
-                for i, p in enumerate(last_nested_path):
-                    if startswith_field(nested_path, p):
-                        last_nested_path = last_nested_path[i:]
-                        break
-                else:
-                    last_nested_path = []
-
-            full_nested_path = [nested_path] + last_nested_path
-            self._snowflakes[literal_field(base_table)] += [full_nested_path]
+                parent_path = ["."]
+                for p in self._snowflakes[literal_field(fact)]:
+                    if p[0] != "." and startswith_field(nested_path, p[0]) and len(p) >= len(parent_path):
+                        parent_path = p
+                full_nested_path = [nested_path] + list(parent_path)
+            self._snowflakes[literal_field(fact)] += [full_nested_path]
+            tables.append((table_name, fact, full_nested_path))
 
             # LOAD THE COLUMNS
-            details = self.db.about(table.name)
+            details = self.db.about(table_name)
 
             for cid, name, dtype, notnull, dfft_value, pk in details:
                 if name.startswith("__"):
                     continue
                 cname, ctype = untyped_column(name)
-                self.add(Column(
+                columns.append(self.add(Column(
                     name=cname,
                     jx_type=coalesce(sql_type_to_json_type.get(ctype), IS_NULL),
                     nested_path=full_nested_path,
                     es_type=dtype,
                     es_column=name,
-                    es_index=table.name,
+                    es_index=table_name,
                     last_updated=Date.now()
-                ))
-            last_nested_path = full_nested_path
+                )))
+
+        with self.db.transaction() as t:
+            for table_name, fact, full_nested_path in tables:
+                self.save_table(t, fact, full_nested_path)
+            t.execute_many(
+                sql_insert_params(COLUMNS_TABLE, CATALOG_COLUMNS),
+                [_catalog_row(c) for c in columns]
+            )
+
+    def save_table(self, t, fact_name, nested_path):
+        """
+        RECORD A NEW TABLE IN THE CATALOG
+        :param t: THE TRANSACTION THAT MAKES THE TABLE
+        """
+        table_name = concat_field(fact_name, nested_path[0])
+        t.execute(ConcatSQL(SQL_DELETE, SQL_FROM, quote_column(TABLES_TABLE), SQL_WHERE, sql_eq(name=table_name)))
+        t.execute_many(
+            sql_insert_params(TABLES_TABLE, ["name", "fact", "nested_path"]),
+            [(table_name, fact_name, value2json(nested_path))]
+        )
+
+    def save_column(self, t, column):
+        """
+        RECORD A NEW (OR CHANGED) COLUMN IN THE CATALOG
+        :param t: THE TRANSACTION THAT MAKES THE COLUMN
+        """
+        self.forget_column(t, column)
+        t.execute_many(sql_insert_params(COLUMNS_TABLE, CATALOG_COLUMNS), [_catalog_row(column)])
+
+    def forget_column(self, t, column):
+        """
+        REMOVE A COLUMN FROM THE CATALOG
+        :param t: THE TRANSACTION THAT DROPS THE COLUMN
+        """
+        t.execute(ConcatSQL(
+            SQL_DELETE, SQL_FROM, quote_column(COLUMNS_TABLE),
+            SQL_WHERE, sql_eq(es_index=column.es_index, es_column=column.es_column)
+        ))
+
+    def forget_facts(self, t, fact_name):
+        """
+        REMOVE ALL TABLES OF fact_name FROM THE CATALOG
+        :param t: THE TRANSACTION THAT DROPS THE TABLES
+        """
+        tables = ConcatSQL(
+            SQL("SELECT name"), SQL_FROM, quote_column(TABLES_TABLE), SQL_WHERE, sql_eq(fact=fact_name)
+        )
+        t.execute(ConcatSQL(SQL_DELETE, SQL_FROM, quote_column(COLUMNS_TABLE), SQL(" WHERE es_index IN "), sql_iso(tables)))
+        t.execute(ConcatSQL(SQL_DELETE, SQL_FROM, quote_column(TABLES_TABLE), SQL_WHERE, sql_eq(fact=fact_name)))
 
     def find(self, es_index, abs_column_name=None):
         with self.locker:
@@ -125,6 +276,23 @@ class ColumnList(jx_base.Table, jx_base.Container):
             else:
                 return self.data.get(es_index, {}).get(abs_column_name, [])
 
+    def get_column(self, es_index, name, jx_type):
+        """
+        O(1) LOOKUP, WITHOUT THE LOCK
+        :return: THE COLUMN WITH GIVEN name AND jx_type, OR THE STRUCT COLUMN
+                 FOR name IF jx_type IS NESTED (None IF NOT FOUND)
+        """
+        if jx_type == NESTED:
+            return self._structs.get(es_index, {}).get(name)
+        return self._typed.get(es_index, {}).get((name, jx_type))
+
+    def get_es_column(self, es_index, es_column):
+        """
+        O(1) LOOKUP, WITHOUT THE LOCK
+        :return: THE COLUMN OF TABLE es_index STORED IN es_column (None IF NOT FOUND)
+        """
+        return self._es_columns.get(es_index, {}).get(es_column)
+
     def extend(self, columns):
         self.dirty = True
         with self.locker:
@@ -146,7 +314,13 @@ class ColumnList(jx_base.Table, jx_base.Container):
             canonical = self._remove(column)
 
     def remove_table(self, table_name):
-        del self.data[table_name]
+        self.data.pop(table_name, None)
+        self._typed.pop(table_name, None)
+        self._structs.pop(table_name, None)
+        self._es_columns.pop(table_name, None)
+        for stats in (self._ranges, self._partitions):
+            for key in [k for k in stats if k[0] == table_name]:
+                del stats[key]
 
     def _add(self, column):
         """
@@ -172,6 +346,7 @@ class ColumnList(jx_base.Table, jx_base.Container):
                             canonical[key] = new_value
                 return canonical
         existing_columns.append(column)
+        self._index(column)
         return column
 
     def _remove(self, column):
@@ -184,8 +359,197 @@ class ColumnList(jx_base.Table, jx_base.Container):
         for i, canonical in enumerate(existing_columns):
             if canonical is column:
                 del existing_columns[i]
+                self._unindex(column)
                 return
 
+    def _index(self, column):
+        self._typed.setdefault(column.es_index, {}).setdefault((column.name, column.jx_type), column)
+        self._es_columns.setdefault(column.es_index, {})[column.es_column] = column
+        if column.jx_type in STRUCT:
+            self._structs.setdefault(column.es_index, {}).setdefault(untyped_column(column.name)[0], column)
+
+    def _unindex(self, column):
+        """
+        REMOVE column FROM THE INDEXES, PROMOTING ANY OTHER COLUMN WITH THE SAME KEY
+        """
+        columns_for_table = self.data.get(column.es_index, {})
+        es_columns = self._es_columns.get(column.es_index, {})
+        if es_columns.get(column.es_column) is column:
+            del es_columns[column.es_column]
+            self._ranges.pop((column.es_index, column.es_column), None)
+            self._partitions.pop((column.es_index, column.es_column), None)
+        typed = self._typed.get(column.es_index, {})
+        key = (column.name, column.jx_type)
+        if typed.get(key) is column:
+            del typed[key]
+            for c in columns_for_table.get(column.name, []):
+                if c.jx_type == column.jx_type:
+                    typed[key] = c
+                    break
+        if column.jx_type in STRUCT:
+            structs = self._structs.get(column.es_index, {})
+            name = untyped_column(column.name)[0]
+            if structs.get(name) is column:
+                del structs[name]
+                for cs in columns_for_table.values():
+                    for c in cs:
+                        if c.jx_type in STRUCT and untyped_column(c.name)[0] == name:
+                            structs.setdefault(name, c)
+
+    def observe(self, t, es_index, es_columns, rows, offset=0):
+        """
+        UPDATE THE STATISTICS (count, cardinality, RANGE AND PARTITIONS) OF
+        es_columns WITH THE rows JUST INSERTED, SO THEY NEED NO TABLE SCAN
+        COLUMNS WITH UNKNOWN STATISTICS (count IS None) ARE LEFT FOR refresh_stats()
+        :param t: THE TRANSACTION THAT INSERTS THE rows
+        :param es_index: THE TABLE
+        :param rows: LIST OF TUPLES, WITH THE VALUE OF es_columns[i] AT row[offset + i]
+        """
+        if not rows:
+            return
+        now = Date.now()
+        changed = []
+        with self.locker:
+            columns = self._es_columns.get(es_index, {})
+            for i, es_column in enumerate(es_columns, offset):
+                column = columns.get(es_column)
+                if column is None or column.count is None or column.jx_type in STRUCT:
+                    continue
+                values = [r[i] for r in rows if r[i] is not None]
+                if not values:
+                    continue
+                key = (es_index, es_column)
+                low, high = min(values), max(values)
+                old = self._ranges.get(key)
+                if old is not None:
+                    low, high = min(low, old[0]), max(high, old[1])
+                elif column.count:
+                    # THE EXISTING VALUES ARE NOT KNOWN, SO NEITHER IS THE RANGE
+                    low = high = None
+                if low is not None:
+                    self._ranges[key] = (low, high)
+
+                partitions = self._partitions.get(key)
+                if partitions is None and not column.count:
+                    partitions = []
+                column.count += len(values)
+                if partitions is not None:
+                    # ALL THE DISTINCT VALUES ARE KNOWN
+                    distinct = set(partitions)
+                    distinct.update(values)
+                    column.cardinality = len(distinct)
+                    if len(distinct) <= MAX_PARTITIONS:
+                        self._partitions[key] = sorted(distinct)
+                    else:
+                        self._partitions.pop(key, None)
+                else:
+                    # cardinality IS A LOWER BOUND UNTIL THE NEXT refresh_stats()
+                    column.cardinality = max(column.cardinality or 0, len(set(values)))
+                column.last_updated = now
+                changed.append(column)
+            self.dirty = True
+            updates = [self._stats_row(c) for c in changed]
+        if updates:
+            t.execute_many(STATS_UPDATE, updates)
+
+    def get_range(self, es_index, es_column):
+        """
+        :return: (min, max) OF THE VALUES IN THE COLUMN, None IF NOT KNOWN
+        """
+        return self._ranges.get((es_index, es_column))
+
+    def get_partitions(self, es_index, es_column):
+        """
+        :return: SORTED LIST OF THE DISTINCT VALUES IN THE COLUMN, None IF NOT KNOWN (OR TOO MANY)
+        """
+        return self._partitions.get((es_index, es_column))
+
+    def _stats_row(self, column):
+        partitions = self._partitions.get((column.es_index, column.es_column))
+        return (
+            column.count,
+            column.cardinality,
+            value2json(partitions) if partitions is not None else None,
+            Date(column.last_updated).unix,
+            column.es_index,
+            column.es_column,
+        )
+
+    def refresh_stats(self, fact_name):
+        """
+        SCAN THE TABLES OF fact_name FOR EXACT STATISTICS, CORRECTING THE DRIFT
+        observe() CAN NOT SEE (UPDATES, DELETES, AND COLUMNS WITH UNKNOWN STATISTICS)
+        """
+        updates = []
+        for nested_path in list(self._snowflakes[literal_field(fact_name)]):
+            table_name = concat_field(fact_name, nested_path[0])
+            with self.locker:
+                columns = [
+                    c
+                    for c in self._es_columns.get(table_name, {}).values()
+                    if c.jx_type not in STRUCT
+                ]
+            if not columns:
+                continue
+
+            # ONE SCAN FOR THE SIZE AND RANGE OF EVERY COLUMN
+            aggs = []
+            for c in columns:
+                column = quote_column(c.es_column)
+                value = sql_column(c)  # ENCODED COLUMNS ARE COUNTED BY CODE, BUT RANGE OVER THEIR VALUES
+                aggs.append(ConcatSQL(SQL("COUNT"), sql_iso(column)))
+                aggs.append(ConcatSQL(SQL("COUNT(DISTINCT "), column, SQL(")")))
+                aggs.append(ConcatSQL(SQL("MIN"), sql_iso(value)))
+                aggs.append(ConcatSQL(SQL("MAX"), sql_iso(value)))
+            row = self.db.query(ConcatSQL(SQL_SELECT, sql_list(aggs), SQL_FROM, quote_column(table_name))).data[0]
+            stats = [row[i:i + 4] for i in range(0, len(row), 4)]
+
+            # ONE MORE FOR THE DISTINCT VALUES OF THE LOW-CARDINALITY COLUMNS
+            partitions = {}
+            small = [i for i, (_, cardinality, _, _) in enumerate(stats) if cardinality <= MAX_PARTITIONS]
+            if small:
+                result = self.db.query(SQL_UNION_ALL.join(
+                    ConcatSQL(
+                        SQL_SELECT,
+                        sql_alias(quote_value(i), "i"),
+                        SQL(", "),
+                        sql_alias(sql_column(columns[i]), "v"),
+                        SQL_FROM,
+                        quote_column(table_name),
+                        SQL(" WHERE "),
+                        quote_column(columns[i].es_column),
+                        SQL(" IS NOT NULL GROUP BY "),
+                        quote_column(columns[i].es_column),
+                    )
+                    for i in small
+                ))
+                for i in small:
+                    partitions[i] = []
+                for i, v in result.data:
+                    partitions[i].append(v)
+
+            now = Date.now()
+            with self.locker:
+                for i, (c, (count, cardinality, low, high)) in enumerate(zip(columns, stats)):
+                    c.count = count
+                    c.cardinality = cardinality
+                    c.last_updated = now
+                    key = (table_name, c.es_column)
+                    if count:
+                        self._ranges[key] = (low, high)
+                    else:
+                        self._ranges.pop(key, None)
+                    if i in partitions:
+                        self._partitions[key] = sorted(partitions[i])
+                    else:
+                        self._partitions.pop(key, None)
+                    updates.append(self._stats_row(c))
+                self.dirty = True
+
+        if updates:
+            with self.db.transaction() as t:
+                t.execute_many(STATS_UPDATE, updates)
+
     def _update_meta(self):
         if not self.dirty:
             return
@@ -405,6 +769,21 @@ class ColumnList(jx_base.Table, jx_base.Container):
         )
 
 
+def _catalog_row(column):
+    return (
+        column.es_index,
+        column.es_column,
+        column.name,
+        column.es_type,
+        column.jx_type,
+        column.count,
+        column.cardinality,
+        column.multi,
+        value2json(column.partitions) if column.partitions != None else None,
+        Date(column.last_updated).unix if column.last_updated != None else None,
+    )
+
+
 def doc_to_column(doc):
     return Column(**wrap(untyped(doc)))
 
@@ -9,6 +9,7 @@
 from __future__ import absolute_import, division, unicode_literals
 
 from copy import copy
+from itertools import count
 
 import jx_base
 from jx_base import Facts
@@ -16,6 +17,8 @@ from jx_sqlite.meta_columns import ColumnList
 from jx_sqlite.schema import Schema
 from jx_sqlite.snowflake import Snowflake
 
+_next_version = count(1)  # next() IS ATOMIC, SO VERSIONS NEED NO LOCK
+
 
 class Namespace(jx_base.Namespace):
     """
@@ -24,13 +27,27 @@ class Namespace(jx_base.Namespace):
     def __init__(self, db):
         self.db = db
         self.columns = ColumnList(db)
+        self.versions = {}  # MAP FROM FACT NAME TO VERSION, CHANGES WITH EVERY WRITE
 
     def __copy__(self):
         output = object.__new__(Namespace)
         output.db = None
         output.columns = copy(self.columns)
+        output.versions = {}
         return output
 
+    def version(self, fact_name):
+        """
+        :return: A NUMBER THAT CHANGES WHENEVER THE FACT TABLE (OR ITS SCHEMA) CHANGES
+        """
+        return self.versions.get(fact_name, 0)
+
+    def changed(self, fact_name):
+        """
+        CALL AFTER ANY CHANGE TO THE DATA OR SCHEMA OF fact_name IS COMMITTED
+        """
+        self.versions[fact_name] = next(_next_version)
+
     def get_facts(self, fact_name):
         snowflake = Snowflake(fact_name, self)
         return Facts(self, snowflake)
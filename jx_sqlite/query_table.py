@@ -11,6 +11,8 @@
 
 from __future__ import absolute_import, division, unicode_literals
 
+from time import time
+
 import mo_json
 from jx_base import Column, Facts
 from jx_base.container import type2container
@@ -19,10 +21,12 @@ from jx_base.expressions import TupleOp, Variable, jx_expression
 from jx_base.language import is_op
 from jx_base.query import QueryOp
 from jx_python import jx
-from jx_sqlite import GUID, sql_aggs, unique_name, untyped_column
+from jx_sqlite import GUID, PARENT, UID, sql_aggs, unique_name, untyped_column
 from jx_sqlite.base_table import BaseTable
+from jx_sqlite.dictionary import sql_column
 from jx_sqlite.expressions._utils import SQLang
 from jx_sqlite.groupby_table import GroupbyTable
+from jx_sqlite.result_cache import query_key
 from mo_collections.matrix import Matrix, index_to_coordinate
 from mo_dots import Data, Null, coalesce, concat_field, is_list, listwrap, relative_field, startswith_field, unwrap, \
     unwraplist, wrap
@@ -30,8 +34,8 @@ from mo_future import text, transpose
 from mo_json import STRING, STRUCT
 from mo_logs import Log
 from mo_sql import SQL_FROM, SQL_ORDERBY, SQL_SELECT, SQL_WHERE, sql_count, sql_iso, sql_list, SQL_CREATE, \
-    SQL_AS, SQL_DELETE, ConcatSQL, JoinSQL, SQL_COMMA, SQL
-from jx_sqlite.sqlite import quote_column, sql_alias
+    SQL_AS, SQL_DELETE, SQL_IN, ConcatSQL, JoinSQL, SQL_COMMA, SQL
+from jx_sqlite.sqlite import quote_column, sql_alias, then
 
 
 class QueryTable(GroupbyTable, Facts):
@@ -51,9 +55,45 @@ class QueryTable(GroupbyTable, Facts):
         return bool(counter)
 
     def delete(self, where):
-        filter = SQLang[jx_expression(where)].to_sql(self.schema)
+        """
+        DELETE THE MATCHING DOCUMENTS, INCLUDING THEIR ROWS IN THE NESTED TABLES
+        """
+        filter = SQLang[jx_expression(where)].to_sql(self.schema)[0].sql.b
+        fact = quote_column(self.snowflake.fact_name)
+        deleted = quote_column("temp_" + unique_name())
         with self.db.transaction() as t:
-            t.execute(ConcatSQL(SQL_DELETE, SQL_FROM, quote_column(self.snowflake.fact_name), SQL_WHERE, filter))
+            t.execute(ConcatSQL(
+                SQL("CREATE TEMP TABLE "), deleted, SQL_AS,
+                SQL_SELECT, quote_column(UID), SQL_FROM, fact, SQL_WHERE, filter
+            ))
+            t.execute(ConcatSQL(
+                SQL_DELETE, SQL_FROM, fact,
+                SQL_WHERE, quote_column(UID), SQL_IN, sql_iso(SQL_SELECT + quote_column(UID) + SQL_FROM + deleted)
+            ))
+            self._delete_nested(t, deleted)
+            t.execute(ConcatSQL(SQL("DROP TABLE "), deleted))
+        self.namespace.changed(self.name)
+
+    def remove_orphans(self):
+        """
+        DELETE NESTED ROWS WHOSE PARENT IS GONE (delete() DID NOT ALWAYS CASCADE)
+        :return: NUMBER OF ROWS DELETED
+        """
+        total = 0
+        with self.db.transaction() as t:
+            # SHALLOWEST FIRST, SO THE CHILDREN OF ORPHANS ARE FOUND TOO
+            for nested_path in self.snowflake.nested_paths:
+                t.execute(ConcatSQL(
+                    SQL_DELETE, SQL_FROM, quote_column(concat_field(self.snowflake.fact_name, nested_path[0])),
+                    SQL_WHERE, quote_column(PARENT), SQL(" NOT IN "), sql_iso(
+                        SQL_SELECT + quote_column(UID) + SQL_FROM +
+                        quote_column(concat_field(self.snowflake.fact_name, nested_path[1]))
+                    )
+                ))
+                total += t.query(SQL("SELECT changes()")).data[0][0]
+        if total:
+            self.namespace.changed(self.name)
+        return total
 
     def vars(self):
         return set(self.schema.columns.keys())
@@ -75,7 +115,7 @@ class QueryTable(GroupbyTable, Facts):
             if len(c.nested_path) != 1:
                 continue
             column_names.append(c.name)
-            select.append(sql_alias(quote_column(c.es_column), c.name))
+            select.append(sql_alias(sql_column(c), c.name))
 
         where_sql = SQLang[jx_expression(filter)].to_sql(self.schema)[0].sql.b
         result = self.db.query(ConcatSQL(
@@ -86,16 +126,95 @@ class QueryTable(GroupbyTable, Facts):
 
         return wrap([{c: v for c, v in zip(column_names, r)} for r in result.data])
 
-    def query(self, query):
+    def query(self, query, stream=False):
         """
         :param query:  JSON Query Expression, SET `format="container"` TO MAKE NEW TABLE OF RESULT
+        :param stream: RETURN A GENERATOR OF LISTS OF DOCUMENTS, WITHOUT HOLDING THE WHOLE RESULT
+                       (ONLY FOR list FORMAT SET OPERATIONS)
         :return:
         """
+        query = self._wrap(query)
+        cache = self.container.cache
+        if stream or cache is None or query.format == "container":
+            start = time()
+            command, format_result, format_stream = self._query_op(query)
+            if stream:
+                if not format_stream:
+                    Log.error("Can only stream list format set operations (no edges, groupby or aggregates)")
+                return format_stream(self.db.query_iter(command))
+            output = format_result(self.db.query(command))
+            self._advise(query, time() - start)
+            return output
+
+        # GET VERSION BEFORE RUNNING, SO A CONCURRENT CHANGE CAN ONLY MAKE THE RESULT STALE
+        key = query_key(query)
+        version = self.namespace.version(self.name)
+        output = cache.get(key, version)
+        if output is None:
+            start = time()
+            command, format_result, _ = self._query_op(query)
+            output = format_result(self.db.query(command))
+            self._advise(query, time() - start)
+            cache.add(key, version, output)
+        return output
+
+    def _advise(self, query, duration):
+        try:
+            self.container.advisor.record(query, duration)
+        except Exception as e:
+            Log.warning("Index advisor could not record query", cause=e)
+
+    def query_async(self, query):
+        """
+        asyncio VERSION OF query()
+        :param query:  JSON Query Expression
+        :return: asyncio FUTURE, COMPLETED WHEN THE WORKER THREAD RETURNS THE RESULT
+        """
+        import asyncio
+
+        query = self._wrap(query)
+        cache = self.container.cache
+        key = version = None
+        if cache is not None and query.format != "container":
+            key = query_key(query)
+            version = self.namespace.version(self.name)
+            output = cache.get(key, version)
+            if output is not None:
+                future = asyncio.get_event_loop().create_future()
+                future.set_result(output)
+                return future
+
+        start = time()
+        command, format_result, _ = self._query_op(query)
+
+        def done(result):
+            output = format_result(result)
+            self._advise(query, time() - start)
+            if key is not None:
+                cache.add(key, version, output)
+            return output
+
+        return then(self.db.query_async(command), done)
+
+    def _wrap(self, query):
+        """
+        :param query:  JSON Query Expression
+        :return: NORMALIZED QueryOp
+        """
+        if is_op(query, QueryOp):
+            return query
         if not query.get('from'):
             query['from'] = self.name
         elif not startswith_field(query['from'], self.name):
             Log.error("Expecting table, or some nested table")
-        query = QueryOp.wrap(query, self.container, self.namespace)
+        return QueryOp.wrap(query, self.container, self.namespace)
+
+    def _query_op(self, query):
+        """
+        :param query:  JSON Query Expression
+        :return: (command, format_result, format_stream) TRIPLE (format_stream IS None IF NOT STREAMABLE)
+        """
+        query = self._wrap(query)
         new_table = "temp_" + unique_name()
 
         if query.format == "container":
@@ -115,36 +234,86 @@ class QueryTable(GroupbyTable, Facts):
             op, index_to_columns = self._edges_op(query, query.frum.schema)
             command = create_table + op
         else:
-            op = self._set_op(query)
-            return op
+            command, format_result, format_stream = self._set_op(query)
+            if query.format not in (None, "list"):
+                format_stream = None
+            return command, format_result, format_stream
+
+        def format_result(result):
+
+            if query.format == "container":
+                output = QueryTable(new_table, db=self.db, uid=self.uid, exists=True)
+            elif query.format == "cube" or (not query.format and query.edges):
+                column_names = [None] * (max(c.push_column for c in index_to_columns.values()) + 1)
+                for c in index_to_columns.values():
+                    column_names[c.push_column] = c.push_column_name
+
+                if len(query.edges) == 0 and len(query.groupby) == 0:
+                    data = {n: Data() for n in column_names}
+                    for s in index_to_columns.values():
+                        data[s.push_name][s.push_child] = unwrap(s.pull(result.data[0]))
+                    if is_list(query.select):
+                        select = [{"name": s.name} for s in query.select]
+                    else:
+                        select = {"name": query.select.name}
 
-        result = self.db.query(command)
+                    return Data(
+                        data=unwrap(data),
+                        select=select,
+                        meta={"format": "cube"}
+                    )
 
-        if query.format == "container":
-            output = QueryTable(new_table, db=self.db, uid=self.uid, exists=True)
-        elif query.format == "cube" or (not query.format and query.edges):
-            column_names = [None] * (max(c.push_column for c in index_to_columns.values()) + 1)
-            for c in index_to_columns.values():
-                column_names[c.push_column] = c.push_column_name
-
-            if len(query.edges) == 0 and len(query.groupby) == 0:
-                data = {n: Data() for n in column_names}
-                for s in index_to_columns.values():
-                    data[s.push_name][s.push_child] = unwrap(s.pull(result.data[0]))
-                if is_list(query.select):
-                    select = [{"name": s.name} for s in query.select]
-                else:
-                    select = {"name": query.select.name}
+                if not result.data:
+                    edges = []
+                    dims = []
+                    for i, e in enumerate(query.edges + query.groupby):
+                        allowNulls = coalesce(e.allowNulls, True)
+
+                        if e.domain.type == "set" and e.domain.partitions:
+                            domain = SimpleSetDomain(partitions=e.domain.partitions.name)
+                        elif e.domain.type == "range":
+                            domain = e.domain
+                        elif is_op(e.value, TupleOp):
+                            pulls = jx.sort([c for c in index_to_columns.values() if c.push_name == e.name],
+                                            "push_child").pull
+                            parts = [tuple(p(d) for p in pulls) for d in result.data]
+                            domain = SimpleSetDomain(partitions=jx.sort(set(parts)))
+                        else:
+                            domain = SimpleSetDomain(partitions=[])
+
+                        dims.append(1 if allowNulls else 0)
+                        edges.append(Data(
+                            name=e.name,
+                            allowNulls=allowNulls,
+                            domain=domain
+                        ))
+
+                    data = {}
+                    for si, s in enumerate(listwrap(query.select)):
+                        if s.aggregate == "count":
+                            data[s.name] = Matrix(dims=dims, zeros=0)
+                        else:
+                            data[s.name] = Matrix(dims=dims)
 
-                return Data(
-                    data=unwrap(data),
-                    select=select,
-                    meta={"format": "cube"}
-                )
+                    if is_list(query.select):
+                        select = [{"name": s.name} for s in query.select]
+                    else:
+                        select = {"name": query.select.name}
+
+                    return Data(
+                        meta={"format": "cube"},
+                        edges=edges,
+                        select=select,
+                        data={k: v.cube for k, v in data.items()}
+                    )
+
+                columns = None
 
-            if not result.data:
                 edges = []
                 dims = []
+                for g in query.groupby:
+                    g.is_groupby = True
+
                 for i, e in enumerate(query.edges + query.groupby):
                     allowNulls = coalesce(e.allowNulls, True)
 
@@ -152,29 +321,56 @@ class QueryTable(GroupbyTable, Facts):
                         domain = SimpleSetDomain(partitions=e.domain.partitions.name)
                     elif e.domain.type == "range":
                         domain = e.domain
+                    elif e.domain.type == "time":
+                        domain = wrap(mo_json.scrub(e.domain))
+                    elif e.domain.type == "duration":
+                        domain = wrap(mo_json.scrub(e.domain))
                     elif is_op(e.value, TupleOp):
-                        pulls = jx.sort([c for c in index_to_columns.values() if c.push_name == e.name],
-                                        "push_child").pull
+                        pulls = jx.sort([c for c in index_to_columns.values() if c.push_name == e.name], "push_child").pull
                         parts = [tuple(p(d) for p in pulls) for d in result.data]
                         domain = SimpleSetDomain(partitions=jx.sort(set(parts)))
                     else:
-                        domain = SimpleSetDomain(partitions=[])
+                        if not columns:
+                            columns = transpose(*result.data)
+                        parts = set(columns[i])
+                        if e.is_groupby and None in parts:
+                            allowNulls = True
+                        parts -= {None}
+
+                        if query.sort[i].sort == -1:
+                            domain = SimpleSetDomain(partitions=wrap(sorted(parts, reverse=True)))
+                        else:
+                            domain = SimpleSetDomain(partitions=jx.sort(parts))
 
-                    dims.append(1 if allowNulls else 0)
+                    dims.append(len(domain.partitions) + (1 if allowNulls else 0))
                     edges.append(Data(
                         name=e.name,
                         allowNulls=allowNulls,
                         domain=domain
                     ))
 
-                data = {}
+                data_cubes = {}
                 for si, s in enumerate(listwrap(query.select)):
                     if s.aggregate == "count":
-                        data[s.name] = Matrix(dims=dims, zeros=0)
+                        data_cubes[s.name] = Matrix(dims=dims, zeros=0)
                     else:
-                        data[s.name] = Matrix(dims=dims)
+                        data_cubes[s.name] = Matrix(dims=dims)
+
+                r2c = index_to_coordinate(dims)  # WORKS BECAUSE THE DATABASE SORTED THE EDGES TO CONFORM
+                for rownum, row in enumerate(result.data):
+                    coord = r2c(rownum)
+
+                    for i, s in enumerate(index_to_columns.values()):
+                        if s.is_edge:
+                            continue
+                        if s.push_child == ".":
+                            data_cubes[s.push_name][coord] = s.pull(row)
+                        else:
+                            data_cubes[s.push_name][coord][s.push_child] = s.pull(row)
 
-                if is_list(query.select):
+                if query.select == None:
+                    select = Null
+                elif is_list(query.select):
                     select = [{"name": s.name} for s in query.select]
                 else:
                     select = {"name": query.select.name}
@@ -183,165 +379,92 @@ class QueryTable(GroupbyTable, Facts):
                     meta={"format": "cube"},
                     edges=edges,
                     select=select,
-                    data={k: v.cube for k, v in data.items()}
+                    data={k: v.cube for k, v in data_cubes.items()}
                 )
+            elif query.format == "table" or (not query.format and query.groupby):
+                column_names = [None] * (max(c.push_column for c in index_to_columns.values()) + 1)
+                for c in index_to_columns.values():
+                    column_names[c.push_column] = c.push_column_name
+                data = []
+                for d in result.data:
+                    row = [None for _ in column_names]
+                    for s in index_to_columns.values():
+                        if s.push_child == ".":
+                            row[s.push_column] = s.pull(d)
+                        elif s.num_push_columns:
+                            tuple_value = row[s.push_column]
+                            if tuple_value == None:
+                                tuple_value = row[s.push_column] = [None] * s.num_push_columns
+                            tuple_value[s.push_child] = s.pull(d)
+                        elif row[s.push_column] == None:
+                            row[s.push_column] = Data()
+                            row[s.push_column][s.push_child] = s.pull(d)
+                        else:
+                            row[s.push_column][s.push_child] = s.pull(d)
+                    data.append(tuple(unwrap(r) for r in row))
 
-            columns = None
-
-            edges = []
-            dims = []
-            for g in query.groupby:
-                g.is_groupby = True
-
-            for i, e in enumerate(query.edges + query.groupby):
-                allowNulls = coalesce(e.allowNulls, True)
-
-                if e.domain.type == "set" and e.domain.partitions:
-                    domain = SimpleSetDomain(partitions=e.domain.partitions.name)
-                elif e.domain.type == "range":
-                    domain = e.domain
-                elif e.domain.type == "time":
-                    domain = wrap(mo_json.scrub(e.domain))
-                elif e.domain.type == "duration":
-                    domain = wrap(mo_json.scrub(e.domain))
-                elif is_op(e.value, TupleOp):
-                    pulls = jx.sort([c for c in index_to_columns.values() if c.push_name == e.name], "push_child").pull
-                    parts = [tuple(p(d) for p in pulls) for d in result.data]
-                    domain = SimpleSetDomain(partitions=jx.sort(set(parts)))
-                else:
-                    if not columns:
-                        columns = transpose(*result.data)
-                    parts = set(columns[i])
-                    if e.is_groupby and None in parts:
-                        allowNulls = True
-                    parts -= {None}
-
-                    if query.sort[i].sort == -1:
-                        domain = SimpleSetDomain(partitions=wrap(sorted(parts, reverse=True)))
-                    else:
-                        domain = SimpleSetDomain(partitions=jx.sort(parts))
-
-                dims.append(len(domain.partitions) + (1 if allowNulls else 0))
-                edges.append(Data(
-                    name=e.name,
-                    allowNulls=allowNulls,
-                    domain=domain
-                ))
-
-            data_cubes = {}
-            for si, s in enumerate(listwrap(query.select)):
-                if s.aggregate == "count":
-                    data_cubes[s.name] = Matrix(dims=dims, zeros=0)
-                else:
-                    data_cubes[s.name] = Matrix(dims=dims)
-
-            r2c = index_to_coordinate(dims)  # WORKS BECAUSE THE DATABASE SORTED THE EDGES TO CONFORM
-            for rownum, row in enumerate(result.data):
-                coord = r2c(rownum)
-
-                for i, s in enumerate(index_to_columns.values()):
-                    if s.is_edge:
-                        continue
-                    if s.push_child == ".":
-                        data_cubes[s.push_name][coord] = s.pull(row)
-                    else:
-                        data_cubes[s.push_name][coord][s.push_child] = s.pull(row)
-
-            if query.select == None:
-                select = Null
-            elif is_list(query.select):
-                select = [{"name": s.name} for s in query.select]
-            else:
-                select = {"name": query.select.name}
+                output = Data(
+                    meta={"format": "table"},
+                    header=column_names,
+                    data=data
+                )
+            elif query.format == "list" or (not query.edges and not query.groupby):
+                if not query.edges and not query.groupby and any(listwrap(query.select).aggregate):
+                    if is_list(query.select):
+                        data = Data()
+                        for c in index_to_columns.values():
+                            if c.push_child == ".":
+                                if data[c.push_name] == None:
+                                    data[c.push_name] = c.pull(result.data[0])
+                                elif is_list(data[c.push_name]):
+                                    data[c.push_name].append(c.pull(result.data[0]))
+                                else:
+                                    data[c.push_name] = [data[c.push_name], c.pull(result.data[0])]
+                            else:
+                                data[c.push_name][c.push_child] = c.pull(result.data[0])
 
-            return Data(
-                meta={"format": "cube"},
-                edges=edges,
-                select=select,
-                data={k: v.cube for k, v in data_cubes.items()}
-            )
-        elif query.format == "table" or (not query.format and query.groupby):
-            column_names = [None] * (max(c.push_column for c in index_to_columns.values()) + 1)
-            for c in index_to_columns.values():
-                column_names[c.push_column] = c.push_column_name
-            data = []
-            for d in result.data:
-                row = [None for _ in column_names]
-                for s in index_to_columns.values():
-                    if s.push_child == ".":
-                        row[s.push_column] = s.pull(d)
-                    elif s.num_push_columns:
-                        tuple_value = row[s.push_column]
-                        if tuple_value == None:
-                            tuple_value = row[s.push_column] = [None] * s.num_push_columns
-                        tuple_value[s.push_child] = s.pull(d)
-                    elif row[s.push_column] == None:
-                        row[s.push_column] = Data()
-                        row[s.push_column][s.push_child] = s.pull(d)
+                        output = Data(
+                            meta={"format": "value"},
+                            data=data
+                        )
                     else:
-                        row[s.push_column][s.push_child] = s.pull(d)
-                data.append(tuple(unwrap(r) for r in row))
-
-            output = Data(
-                meta={"format": "table"},
-                header=column_names,
-                data=data
-            )
-        elif query.format == "list" or (not query.edges and not query.groupby):
-            if not query.edges and not query.groupby and any(listwrap(query.select).aggregate):
-                if is_list(query.select):
-                    data = Data()
-                    for c in index_to_columns.values():
-                        if c.push_child == ".":
-                            if data[c.push_name] == None:
-                                data[c.push_name] = c.pull(result.data[0])
-                            elif is_list(data[c.push_name]):
-                                data[c.push_name].append(c.pull(result.data[0]))
+                        data = Data()
+                        for s in index_to_columns.values():
+                            if not data[s.push_child]:
+                                data[s.push_child] = s.pull(result.data[0])
                             else:
-                                data[c.push_name] = [data[c.push_name], c.pull(result.data[0])]
-                        else:
-                            data[c.push_name][c.push_child] = c.pull(result.data[0])
+                                data[s.push_child] += [s.pull(result.data[0])]
+                        output = Data(
+                            meta={"format": "value"},
+                            data=unwrap(data)
+                        )
+                else:
+                    data = []
+                    for rownum in result.data:
+                        row = Data()
+                        for c in index_to_columns.values():
+                            if c.push_child == ".":
+                                row[c.push_name] = c.pull(rownum)
+                            elif c.num_push_columns:
+                                tuple_value = row[c.push_name]
+                                if not tuple_value:
+                                    tuple_value = row[c.push_name] = [None] * c.num_push_columns
+                                tuple_value[c.push_child] = c.pull(rownum)
+                            else:
+                                row[c.push_name][c.push_child] = c.pull(rownum)
+
+                        data.append(row)
 
                     output = Data(
-                        meta={"format": "value"},
+                        meta={"format": "list"},
                         data=data
                     )
-                else:
-                    data = Data()
-                    for s in index_to_columns.values():
-                        if not data[s.push_child]:
-                            data[s.push_child] = s.pull(result.data[0])
-                        else:
-                            data[s.push_child] += [s.pull(result.data[0])]
-                    output = Data(
-                        meta={"format": "value"},
-                        data=unwrap(data)
-                    )
             else:
-                data = []
-                for rownum in result.data:
-                    row = Data()
-                    for c in index_to_columns.values():
-                        if c.push_child == ".":
-                            row[c.push_name] = c.pull(rownum)
-                        elif c.num_push_columns:
-                            tuple_value = row[c.push_name]
-                            if not tuple_value:
-                                tuple_value = row[c.push_name] = [None] * c.num_push_columns
-                            tuple_value[c.push_child] = c.pull(rownum)
-                        else:
-                            row[c.push_name][c.push_child] = c.pull(rownum)
-
-                    data.append(row)
+                Log.error("unknown format {{format}}", format=query.format)
 
-                output = Data(
-                    meta={"format": "list"},
-                    data=data
-                )
-        else:
-            Log.error("unknown format {{format}}", format=query.format)
+            return output
 
-        return output
+        return command, format_result, None
 
     def query_metadata(self, query):
         frum, query['from'] = query['from'], self
@@ -0,0 +1,100 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import, division, unicode_literals
+
+from collections import OrderedDict
+from copy import deepcopy
+from time import time
+
+from mo_dots import listwrap, wrap
+from mo_json import value2json
+from mo_threads import Lock
+
+
+class ResultCache(object):
+    """
+    LRU CACHE OF QUERY RESULTS, EACH VALID FOR ONE VERSION OF ITS FACT TABLE
+    EACH CALLER GETS ITS OWN COPY, SO CHANGING A RESULT DOES NOT CHANGE THE CACHE
+    """
+
+    def __init__(self, size, ttl=None):
+        """
+        :param size: MAXIMUM NUMBER OF RESULTS KEPT
+        :param ttl: SECONDS A RESULT IS KEPT (None FOR NO LIMIT)
+        """
+        self.size = size
+        self.ttl = ttl
+        self.locker = Lock("result cache")
+        self.results = OrderedDict()  # MAP FROM key TO (version, expires, result)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """
+        :return: THE RESULT, OR None IF NOT CACHED FOR THIS version
+        """
+        with self.locker:
+            entry = self.results.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            v, expires, result = entry
+            if v != version or (expires is not None and expires < time()):
+                self.misses += 1
+                return None
+            self.results[key] = entry  # MOST RECENTLY USED GOES LAST
+            self.hits += 1
+        return deepcopy(result)
+
+    def add(self, key, version, result):
+        expires = time() + self.ttl if self.ttl else None
+        result = deepcopy(result)
+        with self.locker:
+            self.results.pop(key, None)
+            self.results[key] = (version, expires, result)
+            while len(self.results) > self.size:
+                self.results.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.locker:
+            self.results = OrderedDict()
+
+    def stats(self):
+        with self.locker:
+            return wrap({
+                "size": len(self.results),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            })
+
+
+def query_key(query):
+    """
+    :param query: NORMALIZED QueryOp
+    :return: JSON THAT IS EQUAL FOR EQUIVALENT QUERIES
+    """
+    return value2json(
+        {
+            "from": query.frum.name,
+            "select": query.select,
+            "edges": query.edges,
+            "groupby": query.groupby,
+            "window": listwrap(query.window),
+            "where": query.where,
+            "sort": query.sort,
+            "limit": query.limit,
+            "format": query.format,
+        },
+        sort_keys=True,
+    )
@@ -33,6 +33,11 @@ from jx_sqlite.sqlite import quote_column, quote_value, sql_alias
 
 class SetOpTable(InsertTable):
     def _set_op(self, query):
+        """
+        :return: (sql, format_result, format_stream) TRIPLE WHERE
+                 format_result(result) CONVERTS THE QUERY RESULT TO THE REQUESTED FORMAT
+                 format_stream(chunks) CONVERTS A query_iter() STREAM TO A STREAM OF LISTS OF DOCUMENTS
+        """
         # GET LIST OF SELECTED COLUMNS
         vars_ = UNION([v.var for select in listwrap(query.select) for v in select.value.vars()])
         schema = self.schema
@@ -202,7 +207,6 @@ class SetOpTable(InsertTable):
             SQL_ORDERBY, sql_list(sorts),
             SQL_LIMIT, quote_value(query.limit)
         )
-        result = self.db.query(ordered_sql)
 
         def _accumulate_nested(rows, row, nested_doc_details, parent_doc_id, parent_id_coord):
             """
@@ -276,167 +280,209 @@ class SetOpTable(InsertTable):
                     return output
 
         cols = tuple([i for i in index_to_column.values() if i.push_name != None])
-        rows = list(reversed(unwrap(result.data)))
-        if rows:
-            row = rows.pop()
-            data = _accumulate_nested(rows, row, primary_doc_details, None, None)
-        else:
-            data = result.data
-
-        if query.format == "cube":
-            # for f, full_name in self.snowflake.tables:
-            #     if f != '.' or (test_dots(cols) and is_list(query.select)):
-            #         num_rows = len(result.data)
-            #         num_cols = MAX([c.push_column for c in cols]) + 1 if len(cols) else 0
-            #         map_index_to_name = {c.push_column: c.push_column_name for c in cols}
-            #         temp_data = [[None] * num_rows for _ in range(num_cols)]
-            #         for rownum, d in enumerate(result.data):
-            #             for c in cols:
-            #                 if c.push_child == ".":
-            #                     temp_data[c.push_column][rownum] = c.pull(d)
-            #                 else:
-            #                     column = temp_data[c.push_column][rownum]
-            #                     if column is None:
-            #                         column = temp_data[c.push_column][rownum] = {}
-            #                     column[c.push_child] = c.pull(d)
-            #         output = Data(
-            #             meta={"format": "cube"},
-            #             data={n: temp_data[c] for c, n in map_index_to_name.items()},
-            #             edges=[{
-            #                 "name": "rownum",
-            #                 "domain": {
-            #                     "type": "rownum",
-            #                     "min": 0,
-            #                     "max": num_rows,
-            #                     "interval": 1
-            #                 }
-            #             }]
-            #         )
-            #         return output
-
-            if is_list(query.select) or is_op(query.select.value, LeavesOp):
-                num_rows = len(data)
-                temp_data = {c.push_column_name: [None] * num_rows for c in cols}
-                for rownum, d in enumerate(data):
-                    for c in cols:
-                        temp_data[c.push_column_name][rownum] = d[c.push_name]
-                return Data(
-                    meta={"format": "cube"},
-                    data=temp_data,
-                    edges=[{
-                        "name": "rownum",
-                        "domain": {
-                            "type": "rownum",
-                            "min": 0,
-                            "max": num_rows,
-                            "interval": 1
-                        }
-                    }]
-                )
-            else:
-                num_rows = len(data)
-                map_index_to_name = {c.push_column: c.push_column_name for c in cols}
-                temp_data = [data]
-
-                return Data(
-                    meta={"format": "cube"},
-                    data={n: temp_data[c] for c, n in map_index_to_name.items()},
-                    edges=[{
-                        "name": "rownum",
-                        "domain": {
-                            "type": "rownum",
-                            "min": 0,
-                            "max": num_rows,
-                            "interval": 1
-                        }
-                    }]
-                )
 
-        elif query.format == "table":
-            # for f, _ in self.snowflake.tables:
-            #     if frum.endswith(f):
-            #         num_column = MAX([c.push_column for c in cols]) + 1
-            #         header = [None] * num_column
-            #         for c in cols:
-            #             header[c.push_column] = c.push_column_name
-            #
-            #         output_data = []
-            #         for d in result.data:
-            #             row = [None] * num_column
-            #             for c in cols:
-            #                 set_column(row, c.push_column, c.push_child, c.pull(d))
-            #             output_data.append(row)
-            #
-            #         return Data(
-            #             meta={"format": "table"},
-            #             header=header,
-            #             data=output_data
-            #         )
-            if is_list(query.select) or is_op(query.select.value, LeavesOp):
-                column_names = [None] * (max(c.push_column for c in cols) + 1)
-                for c in cols:
-                    column_names[c.push_column] = c.push_column_name
-
-                temp_data = []
-                for rownum, d in enumerate(data):
-                    row = [None] * len(column_names)
+        def format_stream(chunks):
+            return self._stream_set_op(
+                chunks,
+                primary_doc_details,
+                _accumulate_nested,
+                cols,
+                is_list(query.select) or is_op(query.select.value, LeavesOp)
+            )
+
+        def format_result(result):
+            rows = list(reversed(unwrap(result.data)))
+            if rows:
+                row = rows.pop()
+                data = _accumulate_nested(rows, row, primary_doc_details, None, None)
+            else:
+                data = result.data
+
+            if query.format == "cube":
+                # for f, full_name in self.snowflake.tables:
+                #     if f != '.' or (test_dots(cols) and is_list(query.select)):
+                #         num_rows = len(result.data)
+                #         num_cols = MAX([c.push_column for c in cols]) + 1 if len(cols) else 0
+                #         map_index_to_name = {c.push_column: c.push_column_name for c in cols}
+                #         temp_data = [[None] * num_rows for _ in range(num_cols)]
+                #         for rownum, d in enumerate(result.data):
+                #             for c in cols:
+                #                 if c.push_child == ".":
+                #                     temp_data[c.push_column][rownum] = c.pull(d)
+                #                 else:
+                #                     column = temp_data[c.push_column][rownum]
+                #                     if column is None:
+                #                         column = temp_data[c.push_column][rownum] = {}
+                #                     column[c.push_child] = c.pull(d)
+                #         output = Data(
+                #             meta={"format": "cube"},
+                #             data={n: temp_data[c] for c, n in map_index_to_name.items()},
+                #             edges=[{
+                #                 "name": "rownum",
+                #                 "domain": {
+                #                     "type": "rownum",
+                #                     "min": 0,
+                #                     "max": num_rows,
+                #                     "interval": 1
+                #                 }
+                #             }]
+                #         )
+                #         return output
+
+                if is_list(query.select) or is_op(query.select.value, LeavesOp):
+                    num_rows = len(data)
+                    temp_data = {c.push_column_name: [None] * num_rows for c in cols}
+                    for rownum, d in enumerate(data):
+                        for c in cols:
+                            temp_data[c.push_column_name][rownum] = d[c.push_name]
+                    return Data(
+                        meta={"format": "cube"},
+                        data=temp_data,
+                        edges=[{
+                            "name": "rownum",
+                            "domain": {
+                                "type": "rownum",
+                                "min": 0,
+                                "max": num_rows,
+                                "interval": 1
+                            }
+                        }]
+                    )
+                else:
+                    num_rows = len(data)
+                    map_index_to_name = {c.push_column: c.push_column_name for c in cols}
+                    temp_data = [data]
+
+                    return Data(
+                        meta={"format": "cube"},
+                        data={n: temp_data[c] for c, n in map_index_to_name.items()},
+                        edges=[{
+                            "name": "rownum",
+                            "domain": {
+                                "type": "rownum",
+                                "min": 0,
+                                "max": num_rows,
+                                "interval": 1
+                            }
+                        }]
+                    )
+
+            elif query.format == "table":
+                # for f, _ in self.snowflake.tables:
+                #     if frum.endswith(f):
+                #         num_column = MAX([c.push_column for c in cols]) + 1
+                #         header = [None] * num_column
+                #         for c in cols:
+                #             header[c.push_column] = c.push_column_name
+                #
+                #         output_data = []
+                #         for d in result.data:
+                #             row = [None] * num_column
+                #             for c in cols:
+                #                 set_column(row, c.push_column, c.push_child, c.pull(d))
+                #             output_data.append(row)
+                #
+                #         return Data(
+                #             meta={"format": "table"},
+                #             header=header,
+                #             data=output_data
+                #         )
+                if is_list(query.select) or is_op(query.select.value, LeavesOp):
+                    column_names = [None] * (max(c.push_column for c in cols) + 1)
                     for c in cols:
-                        row[c.push_column] = d[c.push_name]
-                    temp_data.append(row)
+                        column_names[c.push_column] = c.push_column_name
+
+                    temp_data = []
+                    for rownum, d in enumerate(data):
+                        row = [None] * len(column_names)
+                        for c in cols:
+                            row[c.push_column] = d[c.push_name]
+                        temp_data.append(row)
+
+                    return Data(
+                        meta={"format": "table"},
+                        header=column_names,
+                        data=temp_data
+                    )
+                else:
+                    column_names = listwrap(query.select).name
+                    return Data(
+                        meta={"format": "table"},
+                        header=column_names,
+                        data=[[d] for d in data]
+                    )
 
-                return Data(
-                    meta={"format": "table"},
-                    header=column_names,
-                    data=temp_data
-                )
             else:
-                column_names = listwrap(query.select).name
-                return Data(
-                    meta={"format": "table"},
-                    header=column_names,
-                    data=[[d] for d in data]
-                )
+                # for f, _ in self.snowflake.tables:
+                #     if frum.endswith(f) or (test_dots(cols) and is_list(query.select)):
+                #         data = []
+                #         for d in result.data:
+                #             row = Data()
+                #             for c in cols:
+                #                 if c.push_child == ".":
+                #                     row[c.push_name] = c.pull(d)
+                #                 elif c.num_push_columns:
+                #                     tuple_value = row[c.push_name]
+                #                     if not tuple_value:
+                #                         tuple_value = row[c.push_name] = [None] * c.num_push_columns
+                #                     tuple_value[c.push_child] = c.pull(d)
+                #                 else:
+                #                     row[c.push_name][c.push_child] = c.pull(d)
+                #
+                #             data.append(row)
+                #
+                #         return Data(
+                #             meta={"format": "list"},
+                #             data=data
+                #         )
+
+                if is_list(query.select) or is_op(query.select.value, LeavesOp):
+                    temp_data = []
+                    for rownum, d in enumerate(data):
+                        row = {}
+                        for c in cols:
+                            row[c.push_column_name] = d[c.push_name]
+                        temp_data.append(row)
+                    return Data(
+                        meta={"format": "list"},
+                        data=temp_data
+                    )
+                else:
+                    return Data(
+                        meta={"format": "list"},
+                        data=data
+                    )
 
-        else:
-            # for f, _ in self.snowflake.tables:
-            #     if frum.endswith(f) or (test_dots(cols) and is_list(query.select)):
-            #         data = []
-            #         for d in result.data:
-            #             row = Data()
-            #             for c in cols:
-            #                 if c.push_child == ".":
-            #                     row[c.push_name] = c.pull(d)
-            #                 elif c.num_push_columns:
-            #                     tuple_value = row[c.push_name]
-            #                     if not tuple_value:
-            #                         tuple_value = row[c.push_name] = [None] * c.num_push_columns
-            #                     tuple_value[c.push_child] = c.pull(d)
-            #                 else:
-            #                     row[c.push_name][c.push_child] = c.pull(d)
-            #
-            #             data.append(row)
-            #
-            #         return Data(
-            #             meta={"format": "list"},
-            #             data=data
-            #         )
-
-            if is_list(query.select) or is_op(query.select.value, LeavesOp):
-                temp_data = []
-                for rownum, d in enumerate(data):
-                    row = {}
-                    for c in cols:
-                        row[c.push_column_name] = d[c.push_name]
-                    temp_data.append(row)
-                return Data(
-                    meta={"format": "list"},
-                    data=temp_data
-                )
-            else:
-                return Data(
-                    meta={"format": "list"},
-                    data=data
-                )
+        return ordered_sql, format_result, format_stream
+
+    def _stream_set_op(self, chunks, primary_doc_details, accumulate_nested, cols, is_leaves):
+        """
+        ASSEMBLE DOCUMENTS FROM A STREAM OF ROW CHUNKS
+        ALL ROWS OF ONE DOCUMENT ARE CONTIGUOUS (ORDERED BY UID), SO A DOCUMENT
+        IS COMPLETE WHEN THE NEXT ONE STARTS
+        :return: GENERATOR OF LISTS OF list-FORMAT DOCUMENTS
+        """
+        id_coord = primary_doc_details['id_coord']
+
+        def assemble(doc_rows):
+            rows = list(reversed(doc_rows))
+            docs = accumulate_nested(rows, rows.pop(), primary_doc_details, None, None)
+            if is_leaves:
+                return [{c.push_column_name: d[c.push_name] for c in cols} for d in docs]
+            return docs
+
+        doc_rows = []
+        for chunk in chunks:
+            docs = []
+            for row in chunk:
+                if doc_rows and row[id_coord] != doc_rows[0][id_coord]:
+                    docs.extend(assemble(doc_rows))
+                    doc_rows = []
+                doc_rows.append(row)
+            if docs:
+                yield docs
+        if doc_rows:
+            yield assemble(doc_rows)
 
     def _make_sql_for_one_nest_in_set_op(
         self,
@@ -9,16 +9,35 @@
 from __future__ import absolute_import, division, unicode_literals
 
 import jx_base
-from jx_sqlite import quoted_ORDER, quoted_PARENT, quoted_UID, untyped_column
+from jx_sqlite import PARENT, UID, quoted_ORDER, quoted_PARENT, quoted_UID, untyped_column
+from jx_sqlite.dictionary import DICTIONARY_PREFIX, DICTIONARY_TYPE, dictionary_table, is_encoded, sql_create_dictionary
 from jx_sqlite.expressions._utils import SQL_NESTED_TYPE
 from jx_sqlite.schema import Schema
-from jx_sqlite.sqlite import quote_column
+from jx_sqlite.sqlite import quote_column, quote_value
 from jx_sqlite.table import Table
-from mo_dots import concat_field, wrap
-from mo_future import text
-from mo_json import NESTED
+from mo_dots import concat_field, is_list, startswith_field, wrap
+from mo_future import first
+from mo_json import NESTED, STRING, STRUCT
 from mo_logs import Log
-from mo_sql import SQL_FROM, SQL_LIMIT, SQL_SELECT, SQL_STAR, SQL_ZERO, sql_iso, sql_list, SQL_CREATE, SQL_AS
+from mo_sql import SQL, SQL_CREATE, SQL_FROM, SQL_GT, SQL_INSERT, SQL_IS_NOT_NULL, SQL_LIMIT, SQL_OR, \
+    SQL_ORDERBY, SQL_SELECT, SQL_SPACE, SQL_WHERE, SQL_ZERO, ConcatSQL, sql_count, sql_iso, sql_list
+from mo_times import Date
+
+REBUILD_BATCH = 100000  # ROWS COPIED PER STATEMENT WHEN REBUILDING A LARGE TABLE
+
+
+def sql_parent_index(table):
+    """
+    :return: SQL TO INDEX THE CHILD ROWS OF table BY PARENT, IN ORDER, SO EACH
+             JOIN TO THE PARENT IS A RANGE SCAN, NOT A TABLE SCAN
+    """
+    return ConcatSQL(
+        SQL("CREATE INDEX IF NOT EXISTS "),
+        quote_column(table + "." + PARENT),
+        SQL(" ON "),
+        quote_column(table),
+        sql_iso(sql_list([quoted_PARENT, quoted_ORDER])),
+    )
 
 
 class Snowflake(jx_base.Snowflake):
@@ -37,31 +56,58 @@ class Snowflake(jx_base.Snowflake):
 
     def change_schema(self, required_changes):
         """
-        ACCEPT A LIST OF CHANGES
+        ACCEPT A LIST OF CHANGES, AND APPLY THEM ALL IN ONE TRANSACTION
         :param required_changes:
         :return: None
         """
         required_changes = wrap(required_changes)
-        for required_change in required_changes:
-            if required_change.add:
-                self._add_column(required_change.add)
-            elif required_change.nest:
-                self._nest_column(required_change.nest)
-
-    def _add_column(self, column):
-        cname = column.name
-        if column.jx_type == NESTED:
-            # WE ARE ALSO NESTING
-            self._nest_column(column, [cname]+column.nested_path)
+        try:
+            added = []
+            with self.namespace.db.transaction() as t:
+                for required_change in required_changes:
+                    if required_change.add:
+                        self._add_column(required_change.add, t)
+                        added.append(required_change.add)
+                    elif required_change.nest:
+                        self._nest_column(required_change.nest, t)
+            for column in added:
+                self.namespace.columns.add(column)
+        except Exception as e:
+            # THE ROLLBACK DOES NOT UNDO THE CHANGES MADE TO THE IN-MEMORY SCHEMA
+            self.namespace.columns.reload_facts(self.fact_name)
+            if "duplicate column name" not in e:
+                Log.error("Can not change schema", cause=e)
+            # ANOTHER THREAD ADDED SOME OF THESE COLUMNS FIRST, SO APPLY THE CHANGES ONE AT A TIME
+            for required_change in required_changes:
+                if required_change.add:
+                    self._add_column(required_change.add)
+                elif required_change.nest:
+                    self._nest_column(required_change.nest)
+        self.namespace.changed(self.fact_name)
 
+    def _add_column(self, column, t=None):
+        """
+        :param t: ADD THE COLUMN AS PART OF THIS TRANSACTION (CALLER WILL ADD column TO THE ColumnList)
+        """
         table = concat_field(self.fact_name, column.nested_path[0])
 
+        if t is not None:
+            if column.jx_type == NESTED:
+                # WE ARE ALSO NESTING
+                self._nest_column(column, t)
+            if column.count is None and column.jx_type not in STRUCT:
+                # A NEW COLUMN IS EMPTY, SO ColumnList.observe() CAN KEEP ITS STATISTICS
+                column.count = column.cardinality = 0
+            t.execute(
+                "ALTER TABLE" + quote_column(table) +
+                "ADD COLUMN" + quote_column(column.es_column) + column.es_type
+            )
+            self.namespace.columns.save_column(t, column)
+            return
+
         try:
             with self.namespace.db.transaction() as t:
-                t.execute(
-                    "ALTER TABLE" + quote_column(table) +
-                    "ADD COLUMN" + quote_column(column.es_column) + column.es_type
-                )
+                self._add_column(column, t)
             self.namespace.columns.add(column)
         except Exception as e:
             if "duplicate column name" in e:
@@ -79,10 +125,9 @@ class Snowflake(jx_base.Snowflake):
 
     def _drop_column(self, column):
         # DROP COLUMN BY RENAMING IT, WITH __ PREFIX TO HIDE IT
-        cname = column.name
-        if column.jx_type == "nested":
+        if column.jx_type == NESTED:
             # WE ARE ALSO NESTING
-            self._nest_column(column, [cname]+column.nested_path)
+            self._nest_column(column)
 
         table = concat_field(self.fact_name, column.nested_path[0])
 
@@ -91,26 +136,30 @@ class Snowflake(jx_base.Snowflake):
                 "ALTER TABLE" + quote_column(table) +
                 "RENAME COLUMN" + quote_column(column.es_column) + " TO " + quote_column("__" + column.es_column)
             )
+            self.namespace.columns.forget_column(t, column)
         self.namespace.columns.remove(column)
+        self.namespace.changed(self.fact_name)
+
+    def _nest_column(self, column, t=None):
+        """
+        :param t: NEST THE COLUMN AS PART OF THIS TRANSACTION
+        """
+        if t is None:
+            with self.namespace.db.transaction() as t:
+                return self._nest_column(column, t)
 
-    def _nest_column(self, column):
         new_path, type_ = untyped_column(column.es_column)
         if type_ != SQL_NESTED_TYPE:
             Log.error("only nested types can be nested")
         destination_table = concat_field(self.fact_name, new_path)
         existing_table = concat_field(self.fact_name, column.nested_path[0])
 
-        # FIND THE INNER COLUMNS WE WILL BE MOVING
-        moving_columns = []
-        for c in self.columns:
-            if destination_table != column.es_index and column.es_column == c.es_column:
-                moving_columns.append(c)
-                c.nested_path = new_path
+        nested_path = [new_path] + column.nested_path
 
         # TODO: IF THERE ARE CHILD TABLES, WE MUST UPDATE THEIR RELATIONS TOO?
 
         # LOAD THE COLUMNS
-        data = self.namespace.db.about(destination_table)
+        data = t.query("PRAGMA table_info" + sql_iso(quote_column(destination_table))).data
         if not data:
             # DEFINE A NEW TABLE
             command = (
@@ -122,36 +171,176 @@ class Snowflake(jx_base.Snowflake):
                     "FOREIGN KEY " + sql_iso(quoted_PARENT) + " REFERENCES " + quote_column(existing_table) + sql_iso(quoted_UID)
                 ]))
             )
-            with self.namespace.db.transaction() as t:
-                t.execute(command)
-                self.add_table([new_path]+column.nested_path)
+            t.execute(command)
+            t.execute(sql_parent_index(destination_table))
+            self.namespace.columns.save_table(t, self.fact_name, nested_path)
+            if nested_path not in self.query_paths:
+                self.add_table(nested_path)
+
+        # FIND THE INNER COLUMNS WE WILL BE MOVING
+        moving_columns = [
+            c
+            for c in self.namespace.columns.find(existing_table)
+            if c.jx_type not in STRUCT and startswith_field(c.name, new_path)
+        ]
 
         # TEST IF THERE IS ANY DATA IN THE NEW NESTED ARRAY
         if not moving_columns:
             return
 
-        column.es_index = destination_table
-        with self.namespace.db.transaction() as t:
+        # EACH PARENT WITH A VALUE GETS ONE CHILD ROW, KEYED BY THE PARENT'S __id__
+        # (ALL __id__ COME FROM THE SAME SEQUENCE, SO IT IS NOT USED BY ANY OTHER CHILD)
+        for c in moving_columns:
             t.execute(
                 "ALTER TABLE " + quote_column(destination_table) +
-                " ADD COLUMN " + quote_column(column.es_column) + " " + column.es_type
+                " ADD COLUMN " + quote_column(c.es_column) + " " + c.es_type
             )
+        moved = [quote_column(c.es_column) for c in moving_columns]
+        t.execute(
+            SQL_INSERT + quote_column(destination_table) +
+            sql_iso(sql_list([quoted_UID, quoted_PARENT, quoted_ORDER] + moved)) +
+            SQL_SELECT + sql_list([quoted_UID, quoted_UID, SQL_ZERO] + moved) +
+            SQL_FROM + quote_column(existing_table) +
+            SQL_WHERE + SQL_OR.join(sql_iso(m + SQL_IS_NOT_NULL) for m in moved)
+        )
 
-            # Deleting parent columns
-            for col in moving_columns:
-                column = col.es_column
-                tmp_table = "tmp_" + existing_table
-                columns = list(map(text, t.query(SQL_SELECT + SQL_STAR + SQL_FROM + quote_column(existing_table) + SQL_LIMIT + SQL_ZERO).header))
+        self._rebuild_table(t, existing_table, set(c.es_column for c in moving_columns))
+
+        for c in moving_columns:
+            self.namespace.columns.forget_column(t, c)
+            self.namespace.columns.remove(c)
+            if is_encoded(c):
                 t.execute(
-                    "ALTER TABLE " + quote_column(existing_table) +
-                    " RENAME TO " + quote_column(tmp_table)
+                    "ALTER TABLE " + quote_column(dictionary_table(c)) +
+                    " RENAME TO " + quote_column(DICTIONARY_PREFIX + destination_table + "." + c.es_column)
                 )
-                t.execute(
-                    SQL_CREATE + quote_column(existing_table) + SQL_AS +
-                    SQL_SELECT + sql_list([quote_column(c) for c in columns if c != column]) +
-                    SQL_FROM + quote_column(tmp_table)
+            c.es_index = destination_table
+            c.nested_path = nested_path
+            c.last_updated = Date.now()
+            self.namespace.columns.add(c)
+            self.namespace.columns.save_column(t, c)
+
+    def encode_column(self, column):
+        """
+        STORE THE VALUES OF THE STRING column AS INTEGER CODES, WITH EACH STRING
+        ONCE IN A DICTIONARY TABLE (SEE jx_sqlite.dictionary)
+        """
+        if is_encoded(column):
+            return
+        if column.jx_type != STRING:
+            Log.error("Can only encode strings, not {{column|quote}}", column=column.es_column)
+
+        table = concat_field(self.fact_name, column.nested_path[0])
+        dictionary = quote_column(dictionary_table(column))
+        old = "__" + column.es_column
+        with self.namespace.db.transaction() as t:
+            t.execute(sql_create_dictionary(column))
+            t.execute(
+                "ALTER TABLE" + quote_column(table) +
+                "RENAME COLUMN" + quote_column(column.es_column) + " TO " + quote_column(old)
+            )
+            t.execute(
+                "ALTER TABLE" + quote_column(table) +
+                "ADD COLUMN" + quote_column(column.es_column) + DICTIONARY_TYPE
+            )
+            # CODES ARE GIVEN IN VALUE ORDER
+            t.execute(
+                "INSERT INTO" + dictionary + "(value)" +
+                SQL_SELECT + quote_column(old) + SQL_FROM + quote_column(table) +
+                SQL_WHERE + quote_column(old) + SQL_IS_NOT_NULL +
+                " GROUP BY " + quote_column(old)
+            )
+            t.execute(
+                "UPDATE" + quote_column(table) + "SET" + quote_column(column.es_column) + "= d.code" +
+                SQL_FROM + dictionary + " AS d" +
+                SQL_WHERE + "d.value =" + quote_column(table, old)
+            )
+            self._rebuild_table(t, table, {old})
+            column.es_type = DICTIONARY_TYPE
+            column.last_updated = Date.now()
+            self.namespace.columns.save_column(t, column)
+        self.namespace.changed(self.fact_name)
+
+    def _rebuild_table(self, t, table, drop):
+        """
+        REMOVE THE drop COLUMNS FROM table, COPYING THE DATA ONCE
+        KEEPS THE PRIMARY KEY, UNIQUE AND FOREIGN KEY CONSTRAINTS, AND THE INDEXES NOT ON drop COLUMNS
+        :param t: TRANSACTION
+        :param table: NAME OF THE TABLE
+        :param drop: SET OF es_column TO REMOVE
+        """
+        details = t.query("PRAGMA table_info" + sql_iso(quote_column(table))).data
+        keep = [(name, dtype, notnull, dflt, pk) for _, name, dtype, notnull, dflt, pk in details if name not in drop]
+        primary_key = [name for name, _, _, _, pk in sorted(keep, key=lambda k: k[4]) if pk]
+
+        definition = []
+        for name, dtype, notnull, dflt, pk in keep:
+            acc = [quote_column(name), SQL_SPACE, SQL(dtype)]
+            if pk and len(primary_key) == 1:
+                # A SINGLE INTEGER PRIMARY KEY REMAINS THE rowid ALIAS
+                acc.append(SQL(" PRIMARY KEY"))
+            if notnull:
+                acc.append(SQL(" NOT NULL"))
+            if dflt is not None:
+                acc.append(SQL(" DEFAULT " + dflt))
+            definition.append(ConcatSQL(*acc))
+        if len(primary_key) > 1:
+            definition.append("PRIMARY KEY " + sql_iso(sql_list(map(quote_column, primary_key))))
+
+        indexes = []
+        for _, index_name, unique, origin, _ in t.query("PRAGMA index_list" + sql_iso(quote_column(table))).data:
+            index_columns = [name for _, _, name in t.query("PRAGMA index_info" + sql_iso(quote_column(index_name))).data]
+            if origin == "pk" or any(name in drop for name in index_columns):
+                continue
+            if origin == "u":
+                definition.append("UNIQUE " + sql_iso(sql_list(map(quote_column, index_columns))))
+            else:
+                indexes.append(first(first(t.query(
+                    SQL("SELECT sql FROM sqlite_master WHERE type='index' AND name=") + quote_value(index_name)
+                ).data)))
+
+        foreign_keys = {}
+        for id_, _, other, from_, to, _, _, _ in t.query("PRAGMA foreign_key_list" + sql_iso(quote_column(table))).data:
+            foreign_keys.setdefault((id_, other), []).append((from_, to))
+        for (_, other), pairs in sorted(foreign_keys.items()):
+            if any(from_ in drop for from_, _ in pairs):
+                continue
+            definition.append(
+                "FOREIGN KEY " + sql_iso(sql_list(quote_column(f) for f, _ in pairs)) +
+                " REFERENCES " + quote_column(other) + sql_iso(sql_list(quote_column(o) for _, o in pairs))
+            )
+
+        tmp_table = "__rebuild__" + table
+        columns = sql_list(quote_column(name) for name, _, _, _, _ in keep)
+        t.execute(SQL_CREATE + quote_column(tmp_table) + sql_iso(sql_list(definition)))
+
+        total = first(first(t.query(SQL_SELECT + sql_count("*") + SQL_FROM + quote_column(table)).data))
+        if primary_key == [UID] and total > REBUILD_BATCH:
+            # COPY IN __id__ ORDER, ONE BATCH AT A TIME, SO WE CAN REPORT PROGRESS
+            done, last = 0, None
+            while done < total:
+                t.query(
+                    SQL_INSERT + quote_column(tmp_table) + SQL_SELECT + columns +
+                    SQL_FROM + quote_column(table) +
+                    (SQL_WHERE + quoted_UID + SQL_GT + quote_value(last) if last is not None else SQL_SPACE) +
+                    SQL_ORDERBY + quoted_UID + SQL_LIMIT + quote_value(REBUILD_BATCH)
                 )
-                t.execute("DROP TABLE " + quote_column(tmp_table))
+                last = first(first(t.query(SQL_SELECT + "MAX" + sql_iso(quoted_UID) + SQL_FROM + quote_column(tmp_table)).data))
+                done = min(done + REBUILD_BATCH, total)
+                Log.note("Rebuilding {{table|quote}}: {{done}} of {{total}} rows copied", table=table, done=done, total=total)
+        else:
+            t.execute(SQL_INSERT + quote_column(tmp_table) + SQL_SELECT + columns + SQL_FROM + quote_column(table))
+
+        t.execute("DROP TABLE " + quote_column(table))
+        t.execute("ALTER TABLE " + quote_column(tmp_table) + " RENAME TO " + quote_column(table))
+        for index in indexes:
+            t.execute(SQL(index))
+
+    def get_column(self, name, jx_type):
+        """
+        :return: FACT COLUMN WITH name AND jx_type (OR STRUCT COLUMN FOR name IF jx_type IS NESTED), None IF NOT FOUND
+        """
+        return self.namespace.columns.get_column(self.fact_name, name, jx_type)
 
     def add_table(self, nested_path):
         query_paths = self.namespace.columns._snowflakes[self.fact_name]
@@ -182,3 +371,10 @@ class Snowflake(jx_base.Snowflake):
     def query_paths(self):
         return self.namespace.columns._snowflakes[self.fact_name]
 
+    @property
+    def nested_paths(self):
+        """
+        :return: nested_path OF EVERY NESTED TABLE, SHALLOWEST FIRST
+        """
+        return sorted((list(p) for p in self.query_paths if is_list(p) and p[0] != "."), key=len)
+
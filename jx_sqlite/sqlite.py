@@ -13,10 +13,11 @@ from __future__ import absolute_import, division, unicode_literals
 import os
 import re
 import sys
-from collections import Mapping, namedtuple
+from collections import Mapping, OrderedDict, namedtuple
+from time import time
 
 from jx_base import jx_expression
-from mo_dots import Data, coalesce, unwraplist, listwrap, wrap
+from mo_dots import Data, coalesce, unwrap, unwraplist, listwrap, wrap
 from mo_files import File
 from mo_future import allocate_lock as _allocate_lock, text, first, is_text, zip_longest, binary_type
 from mo_json import BOOLEAN, INTEGER, NESTED, NUMBER, OBJECT, STRING
@@ -24,10 +25,11 @@ from mo_kwargs import override
 from mo_logs import Log
 from mo_logs.exceptions import ERROR, Except, get_stacktrace, format_trace
 from mo_logs.strings import quote
-from mo_math.stats import percentile
-from mo_threads import Lock, Queue, Thread, Till
-from mo_times import Date, Duration, Timer
+from mo_threads import Lock, Queue, THREAD_STOP, Thread, Till
+from mo_times import Date, Duration
 from pyLibrary import convert
+from jx_sqlite import aggregates
+from jx_sqlite.stats import Stats
 from mo_sql import (
     DB,
     SQL,
@@ -55,14 +57,19 @@ from mo_sql import (
     SQL_DOT,
     SQL_LT, SQL_SPACE, SQL_AS, SQL_LIMIT)
 
-DEBUG = True
-TRACE = True
+DEBUG = False
+TRACE = False
 
 FORMAT_COMMAND = "Running command from \"{{file}}:{{line}}\"\n{{command|limit(1000)|indent}}"
 DOUBLE_TRANSACTION_ERROR = (
     "You can not query outside a transaction you have open already"
 )
 TOO_LONG_TO_HOLD_TRANSACTION = 10
+READ_POOL_SIZE = 4  # DEFAULT NUMBER OF READ-ONLY CONNECTIONS FOR FILE DATABASES
+STREAM_CHUNK_SIZE = 1000  # DEFAULT NUMBER OF ROWS PER query_iter() CHUNK
+MAX_PENDING = 2 ** 16  # MAXIMUM COMMANDS WAITING FOR THE WORKER (MOSTLY query_async() CALLERS)
+MAX_GROUP = 1000  # MAXIMUM TRANSACTIONS IN ONE GROUP COMMIT
+REGEXP_CACHE_SIZE = 1000  # MAXIMUM COMPILED REGEXP PATTERNS KEPT
 
 _sqlite3 = None
 _load_extension_warning_sent = False
@@ -107,6 +114,10 @@ class Sqlite(DB):
         get_trace=None,
         upgrade=True,
         load_functions=False,
+        read_pool_size=READ_POOL_SIZE,
+        stats=False,
+        trace_sample=0.01,
+        group_commit=None,
         debug=False,
         kwargs=None,
     ):
@@ -116,6 +127,11 @@ class Sqlite(DB):
         :param get_trace: GET THE STACK TRACE AND THREAD FOR EVERY DB COMMAND (GOOD FOR DEBUGGING)
         :param upgrade: REPLACE PYTHON sqlite3 DLL WITH MORE RECENT ONE, WITH MORE FUNCTIONS (NOT WORKING)
         :param load_functions: LOAD EXTENDED MATH FUNCTIONS (MAY REQUIRE upgrade)
+        :param read_pool_size: NUMBER OF READ-ONLY CONNECTIONS SERVING TRANSACTIONLESS SELECT (filename ONLY, USES WAL)
+        :param stats: COLLECT LATENCY, ROW, QUEUE AND TRANSACTION STATISTICS (SEE stats())
+        :param trace_sample: WHEN COLLECTING stats, FRACTION OF COMMANDS THAT CAPTURE THEIR STACK TRACE
+        :param group_commit: SECONDS TO HOLD A COMMIT OPEN SO TRANSACTIONS FROM OTHER THREADS CAN SHARE
+                             ITS PHYSICAL COMMIT (None TO COMMIT EACH TRANSACTION IMMEDIATELY)
         :param kwargs:
         """
         global _upgraded
@@ -142,13 +158,19 @@ class Sqlite(DB):
         self.debug and Log.note(
             "Sqlite version {{version}}", version=_sqlite3.sqlite_version
         )
+        self.read_connections = []  # READ-ONLY CONNECTIONS, ONE PER READER THREAD
+        self.functions_loaded = False  # SO NEW READ-ONLY CONNECTIONS GET THE SAME FUNCTIONS
+        self.regexp_created = False
+        self.wal = False  # True IF OTHER CONNECTIONS CAN READ WHILE THE WRITER HOLDS A TRANSACTION
         try:
             if db == None:
-                self.db = _sqlite3.connect(
-                    database=coalesce(self.filename, ":memory:"),
-                    check_same_thread=False,
-                    isolation_level=None,
-                )
+                self.db = _connect(coalesce(self.filename, ":memory:"))
+                if self.filename:
+                    # WAL LETS THE READERS CONTINUE WHILE THE WRITER HOLDS A TRANSACTION
+                    self.db.execute("PRAGMA journal_mode=WAL")
+                    self.wal = True
+                    for _ in range(read_pool_size or 0):
+                        self.read_connections.append(self._open_reader())
             else:
                 self.db = db
         except Exception as e:
@@ -157,14 +179,18 @@ class Sqlite(DB):
             )
         self.upgrade = upgrade
         load_functions and self._load_functions()
+        self.functions_loaded = bool(load_functions)
+        # MEDIAN, PERCENTILE, VARIANCE, ETC ARE ALWAYS AVAILABLE
+        aggregates.register(self.db)
 
         self.locker = Lock()
         self.available_transactions = []  # LIST OF ALL THE TRANSACTIONS BEING MANAGED
         self.queue = Queue(
-            "sql commands"
+            "sql commands", max=MAX_PENDING
         )  # HOLD (command, result, signal, stacktrace) TUPLES
 
         self.get_trace = coalesce(get_trace, TRACE)
+        self._stats = Stats(enabled=stats, trace_sample=trace_sample)
         self.closed = False
 
         # WORKER VARIABLES
@@ -173,34 +199,26 @@ class Sqlite(DB):
             None
         )  # USE THIS TO HELP BLAME current_transaction FOR HANGING ON TOO LONG
         self.too_long = None
+        self.transaction_start = None  # WHEN THE CURRENT TRANSACTION BEGAN
+        self.group_commit = group_commit
+        self.group = None  # COMMITTED (BUT NOT YET DURABLE) COMMAND ITEMS, None IF NO PHYSICAL TRANSACTION
+        self.group_deadline = None  # WHEN THE group MUST BE COMMITTED
         self.delayed_queries = []
         self.delayed_transactions = []
         self.worker = Thread.run("sqlite db thread", self._worker)
 
+        # READER VARIABLES
+        self.read_queue = Queue("sql reads", max=MAX_PENDING) if self.read_connections else None
+        self.readers = [
+            Thread.run("sqlite read thread " + text(i), self._reader, reader)
+            for i, reader in enumerate(self.read_connections)
+        ]
+
         self.debug and Log.note(
             "Sqlite version {{version}}",
             version=self.query("select sqlite_version()").data[0][0],
         )
 
-    def _enhancements(self):
-        def regex(pattern, value):
-            return 1 if re.match(pattern + "$", value) else 0
-
-        con = self.db.create_function("regex", 2, regex)
-
-        class Percentile(object):
-            def __init__(self, percentile):
-                self.percentile = percentile
-                self.acc = []
-
-            def step(self, value):
-                self.acc.append(value)
-
-            def finalize(self):
-                return percentile(self.acc, self.percentile)
-
-        con.create_aggregate("percentile", 2, Percentile)
-
     def transaction(self):
         thread = Thread.current()
         parent = None
@@ -222,34 +240,136 @@ class Sqlite(DB):
         details = self.query("PRAGMA table_info" + sql_iso(quote_column(table_name)))
         return details.data
 
+    def stats(self, clear=False):
+        """
+        :param clear: RESET THE STATISTICS AFTER READING THEM
+        :return: STATISTICS COLLECTED SINCE START (OR LAST clear), EMPTY IF NOT ENABLED
+            statements - LATENCY HISTOGRAM, ROWS RETURNED AND A SAMPLE TRACE FOR EACH STATEMENT SHAPE
+            queue_wait - HISTOGRAM OF TIME SPENT WAITING FOR A CONNECTION
+            transactions - HISTOGRAM OF TIME EACH TRANSACTION HELD THE WRITER
+        """
+        output = wrap(self._stats.as_dict())
+        if clear:
+            self._stats.clear()
+        return output
+
     def query(self, command):
         """
         WILL BLOCK CALLING THREAD UNTIL THE command IS COMPLETED
         :param command: COMMAND FOR SQLITE
         :return: list OF RESULTS
         """
+        if self.read_queue is not None and _is_read(command):
+            return self._send(command, self.read_queue)
+        return self._send(command, self.queue)
+
+    def query_async(self, command):
+        """
+        asyncio VERSION OF query(), NO THREAD IS BLOCKED WHILE WAITING
+        :param command: COMMAND FOR SQLITE
+        :return: asyncio FUTURE, COMPLETED BY THE WORKER THREAD
+        """
+        if self.read_queue is not None and _is_read(command):
+            return self._send_async(command, self.read_queue, None)
+        return self._send_async(command, self.queue, None)
+
+    def query_iter(self, command, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        WILL BLOCK CALLING THREAD UNTIL EACH CHUNK IS READY
+        THE NEXT CHUNK IS NOT FETCHED UNTIL THE CALLER ASKS FOR IT, SO AT
+        MOST chunk_size ROWS ARE HELD IN MEMORY
+        A FILE DATABASE STREAMS A SELECT ON A READ-ONLY CONNECTION OF ITS OWN, SO
+        THE STREAM SEES ONE SNAPSHOT (THE LAST COMMIT BEFORE IT STARTED) AND DOES
+        NOT HOLD THE WRITER. AN IN-MEMORY DATABASE HAS ONLY THE WRITER, SO ITS
+        STREAM IS NOT A SNAPSHOT: CHANGES COMMITTED BEFORE IT ENDS MAY BE SEEN
+        :param command: COMMAND FOR SQLITE
+        :param chunk_size: MAXIMUM NUMBER OF ROWS IN EACH CHUNK
+        :return: GENERATOR OF LISTS OF ROWS
+        """
+        if self.wal and _is_read(command):
+            return self._read_iter(command, chunk_size)
+        return self._write_iter(command, chunk_size)
+
+    def _read_iter(self, command, chunk_size):
+        if self.closed:
+            Log.error("database is closed")
+        reader = self._open_reader()
+        try:
+            fetch = Fetch(command, None, chunk_size)
+            while True:
+                result = Data()
+                start = time() if self._stats.enabled else None
+                try:
+                    _fetch(reader, fetch, result)
+                except Exception as e:
+                    Log.error("Problem with Sqlite call\n{{command|limit(1000)|indent}}", command=command, cause=e)
+                if start is not None:
+                    self._stats.command(coalesce(fetch.command, "FETCH"), None, start, time(), len(result.data))
+                cursor = result.cursor or None
+                if result.data:
+                    yield unwrap(result.data)
+                if cursor is None:
+                    return
+                fetch = Fetch(None, cursor, chunk_size)
+        finally:
+            # ALSO RELEASES THE CURSOR, IF THE CALLER STOPPED EARLY
+            reader.close()
+
+    def _write_iter(self, command, chunk_size):
+        cursor = None
+        fetch = Fetch(command, None, chunk_size)
+        try:
+            while True:
+                result = self._send(fetch, self.queue)
+                cursor = result.cursor or None
+                if result.data:
+                    yield unwrap(result.data)
+                if cursor is None:
+                    return
+                fetch = Fetch(None, cursor, chunk_size)
+        finally:
+            if cursor is not None and not self.closed:
+                # CALLER STOPPED EARLY, RELEASE THE CURSOR
+                self._send(Fetch(None, cursor, 0), self.queue)
+
+    def _send(self, command, queue):
         if self.closed:
             Log.error("database is closed")
 
         signal = _allocate_lock()
         signal.acquire()
         result = Data()
-        trace = get_stacktrace(1) if self.get_trace else None
+        trace = get_stacktrace(2) if self.get_trace or self._stats.sample() else None
 
-        if self.get_trace:
-            current_thread = Thread.current()
-            with self.locker:
-                for t in self.available_transactions:
-                    if t.thread is current_thread:
-                        Log.error(DOUBLE_TRANSACTION_ERROR)
+        current_thread = Thread.current()
+        with self.locker:
+            for t in self.available_transactions:
+                if t.thread is current_thread:
+                    Log.error(DOUBLE_TRANSACTION_ERROR)
 
-        self.queue.add(CommandItem(command, result, signal, trace, None))
+        queued = time() if self._stats.enabled else None
+        queue.add(CommandItem(command, result, signal, trace, None, queued))
         signal.acquire()
 
         if result.exception:
             Log.error("Problem with Sqlite call", cause=result.exception)
         return result
 
+    def _send_async(self, command, queue, transaction):
+        # NO DOUBLE_TRANSACTION_ERROR CHECK: COROUTINES SHARE A THREAD, AND
+        # AWAITING DOES NOT STOP THE TRANSACTION OWNER FROM FINISHING
+        import asyncio
+
+        if self.closed:
+            Log.error("database is closed")
+
+        result = Data()
+        signal = _AsyncSignal(asyncio.get_event_loop(), result)
+        trace = get_stacktrace(2) if self.get_trace or self._stats.sample() else None
+        queued = time() if self._stats.enabled else None
+        queue.add(CommandItem(command, result, signal, trace, transaction, queued))
+        return signal.future
+
     def close(self):
         """
         OPTIONAL COMMIT-AND-CLOSE
@@ -259,9 +379,11 @@ class Sqlite(DB):
         self.closed = True
         signal = _allocate_lock()
         signal.acquire()
-        self.queue.add(CommandItem(COMMIT, None, signal, None, None))
+        self.queue.add(CommandItem(COMMIT, None, signal, None, None, None))
         signal.acquire()
         self.worker.please_stop.go()
+        for r in self.readers:
+            r.please_stop.go()
         return
 
     def __enter__(self):
@@ -270,7 +392,20 @@ class Sqlite(DB):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
-    def _load_functions(self):
+    def _open_reader(self):
+        """
+        :return: NEW READ-ONLY CONNECTION, WITH THE SAME FUNCTIONS AS THE WRITER
+        """
+        reader = _connect(self.filename)
+        reader.execute("PRAGMA query_only=1")
+        aggregates.register(reader)
+        if self.functions_loaded:
+            self._load_functions([reader])
+        if self.regexp_created:
+            reader.create_function("REGEXP", 2, _regexp)
+        return reader
+
+    def _load_functions(self, connections=None):
         global _load_extension_warning_sent
         library_loc = File.new_instance(sys.modules[__name__].__file__, "../..")
         full_path = File.new_instance(
@@ -289,10 +424,11 @@ class Sqlite(DB):
                     )
 
                 full_path = file.abspath
-                self.db.enable_load_extension(True)
-                self.db.execute(text(
-                    SQL_SELECT + "load_extension" + sql_iso(quote_value(full_path))
-                ))
+                for db in connections or [self.db] + self.read_connections:
+                    db.enable_load_extension(True)
+                    db.execute(text(
+                        SQL_SELECT + "load_extension" + sql_iso(quote_value(full_path))
+                    ))
         except Exception as e:
             if not _load_extension_warning_sent:
                 _load_extension_warning_sent = True
@@ -303,11 +439,9 @@ class Sqlite(DB):
                 )
 
     def create_new_functions(self):
-        def regexp(pattern, item):
-            reg = re.compile(pattern)
-            return reg.search(item) is not None
-
-        self.db.create_function("REGEXP", 2, regexp)
+        self.regexp_created = True
+        for db in [self.db] + self.read_connections:
+            db.create_function("REGEXP", 2, _regexp)
 
     def show_transactions_blocked_warning(self):
         blocker = self.last_command_item
@@ -319,8 +453,8 @@ class Sqlite(DB):
             "is blocked by {{blocker_thread|json}} at\n"
             "{{blocker_trace|indent}}"
             "this message brought to you by....",
-            blocker_trace=format_trace(blocker.trace),
-            blocked_trace=format_trace(blocked.trace),
+            blocker_trace=format_trace(blocker.trace or []),
+            blocked_trace=format_trace(blocked.trace or []),
             blocker_thread=blocker.transaction.thread.name
             if blocker.transaction is not None
             else None,
@@ -330,7 +464,7 @@ class Sqlite(DB):
         )
 
     def _close_transaction(self, command_item):
-        query, result, signal, trace, transaction = command_item
+        query, result, signal, trace, transaction, _ = command_item
 
         transaction.end_of_life = True
         with self.locker:
@@ -344,10 +478,17 @@ class Sqlite(DB):
             assert old_length - 1 == len(self.transaction_stack)
             assert old_trans
             assert old_trans not in self.transaction_stack
+        deferred = False
         if not self.transaction_stack:
             # NESTED TRANSACTIONS NOT ALLOWED IN sqlite3
-            self.debug and Log.note(FORMAT_COMMAND, command=query)
-            self.db.execute(query)
+            if self.group_commit:
+                deferred = self._end_grouped(command_item)
+            else:
+                self.debug and Log.note(FORMAT_COMMAND, command=query)
+                self.db.execute(query)
+            if self._stats.enabled and self.transaction_start is not None:
+                self._stats.transaction(time() - self.transaction_start)
+            self.transaction_start = None
 
         has_been_too_long = False
         with self.locker:
@@ -369,14 +510,78 @@ class Sqlite(DB):
                 del self.delayed_queries[:]
         if has_been_too_long:
             Log.note("Transaction blockage cleared")
+        return deferred
+
+    def _begin(self):
+        """
+        START A TRANSACTION, OR A SAVEPOINT IN THE OPEN group
+        """
+        if self.group is None:
+            self.debug and Log.note(FORMAT_COMMAND, command=BEGIN)
+            self.db.execute(BEGIN)
+            if self.group_commit:
+                self.group = []
+        if self.group_commit:
+            self.db.execute(SAVEPOINT)
+        self.transaction_start = time() if self._stats.enabled else None
+
+    def _end_grouped(self, command_item):
+        """
+        END THE SAVEPOINT OF A TRANSACTION IN THE group
+        :return: True IF THE CALLER MUST WAIT FOR THE GROUP COMMIT
+        """
+        query = command_item.command
+        self.debug and Log.note(FORMAT_COMMAND, command=query)
+        if query == COMMIT:
+            self.db.execute(RELEASE)
+            self.group.append(command_item)
+            if self.group_deadline is None:
+                self.group_deadline = Till(seconds=self.group_commit)
+            if len(self.group) >= MAX_GROUP:
+                self._commit_group()
+            return True
+
+        # ONLY THIS TRANSACTION'S CHANGES ARE UNDONE
+        self.db.execute(ROLLBACK_TO)
+        self.db.execute(RELEASE)
+        if not self.group:
+            self.db.execute(ROLLBACK)
+            self.group = None
+        return False
+
+    def _commit_group(self):
+        """
+        COMMIT THE PHYSICAL TRANSACTION, AND RELEASE ALL THE TRANSACTIONS WAITING ON IT
+        """
+        group, self.group, self.group_deadline = self.group, None, None
+        if group is None:
+            return
+        try:
+            self.debug and Log.note(FORMAT_COMMAND, command=COMMIT)
+            self.db.execute(COMMIT)
+        except Exception as e:
+            err = Except(context=ERROR, template="Group commit failed", cause=Except.wrap(e))
+            for c in group:
+                c.result.exception = c.transaction.exception = err
+            try:
+                self.db.execute(ROLLBACK)
+            except Exception:
+                pass
+        finally:
+            for c in group:
+                c.is_done.release()
 
     def _worker(self, please_stop):
         try:
             # MAIN EXECUTION LOOP
             while not please_stop:
-                command_item = self.queue.pop(till=please_stop)
+                deadline = None if self.transaction_stack else self.group_deadline
+                if deadline:
+                    self._commit_group()
+                    continue
+                command_item = self.queue.pop(till=please_stop | deadline)
                 if command_item is None:
-                    break
+                    continue
                 try:
                     self._process_command_item(command_item)
                 except Exception as e:
@@ -387,105 +592,146 @@ class Sqlite(DB):
                 Log.warning("Problem with sql", cause=e)
         finally:
             self.closed = True
+            self._commit_group()
             self.debug and Log.note("Database is closed")
             self.db.close()
 
-    def _process_command_item(self, command_item):
-        query, result, signal, trace, transaction = command_item
-
-        with Timer("SQL Timing", verbose=self.debug):
-            if transaction is None:
-                # THIS IS A TRANSACTIONLESS QUERY, DELAY IT IF THERE IS A CURRENT TRANSACTION
-                if self.transaction_stack:
-                    with self.locker:
-                        if self.too_long is None:
-                            self.too_long = Till(seconds=TOO_LONG_TO_HOLD_TRANSACTION)
-                            self.too_long.then(self.show_transactions_blocked_warning)
-                        self.delayed_queries.append(command_item)
-                    return
-            elif self.transaction_stack and self.transaction_stack[-1] not in [
-                transaction,
-                transaction.parent,
-            ]:
-                # THIS TRANSACTION IS NOT THE CURRENT TRANSACTION, DELAY IT
-                with self.locker:
-                    if self.too_long is None:
-                        self.too_long = Till(seconds=TOO_LONG_TO_HOLD_TRANSACTION)
-                        self.too_long.then(self.show_transactions_blocked_warning)
-                    self.delayed_transactions.append(command_item)
-                return
-            else:
-                # ENSURE THE CURRENT TRANSACTION IS UP TO DATE FOR THIS query
-                if not self.transaction_stack:
-                    # sqlite3 ALLOWS ONLY ONE TRANSACTION AT A TIME
-                    self.debug and Log.note(FORMAT_COMMAND, command=BEGIN)
-                    self.db.execute(BEGIN)
-                    self.transaction_stack.append(transaction)
-                elif transaction is not self.transaction_stack[-1]:
-                    self.transaction_stack.append(transaction)
-                elif transaction.exception and query is not ROLLBACK:
+    def _reader(self, db, please_stop):
+        """
+        EXECUTE TRANSACTIONLESS READS ON A READ-ONLY CONNECTION
+        WAL MODE GIVES EACH READ A CONSISTENT SNAPSHOT OF THE LAST COMMIT
+        """
+        try:
+            while not please_stop:
+                command_item = self.read_queue.pop(till=please_stop)
+                if command_item is None or command_item is THREAD_STOP:
+                    break
+                query, result, signal, trace, _, queued = command_item
+                try:
+                    self.debug and Log.note(FORMAT_COMMAND, command=query)
+                    start = time() if self._stats.enabled else None
+                    _fill_result(db.execute(text(query)), result)
+                    if start is not None:
+                        self._stats.command(query, queued, start, time(), len(result.data), trace)
+                except Exception as e:
                     result.exception = Except(
                         context=ERROR,
-                        template="Not allowed to continue using a transaction that failed",
-                        cause=transaction.exception,
+                        template="Bad call to Sqlite while " + FORMAT_COMMAND,
+                        params={"command": query},
                         trace=trace,
+                        cause=Except.wrap(e),
                     )
+                finally:
                     signal.release()
-                    return
-
-                try:
-                    transaction.do_all()
-                except Exception as e:
-                    # DEAL WITH ERRORS IN QUEUED COMMANDS
-                    # WE WILL UNWRAP THE OUTER EXCEPTION TO GET THE CAUSE
-                    err = Except(
-                        context=ERROR,
-                        template="Bad call to Sqlite3 while " + FORMAT_COMMAND,
-                        params={"command": e.params.current.command},
-                        cause=e.cause,
-                        trace=e.params.current.trace,
-                    )
-                    transaction.exception = result.exception = err
+        except Exception as e:
+            if not please_stop:
+                Log.warning("Problem with sql reader", cause=e)
+        finally:
+            db.close()
 
-                    if query in [COMMIT, ROLLBACK]:
-                        self._close_transaction(
-                            CommandItem(ROLLBACK, result, signal, trace, transaction)
-                        )
+    def _process_command_item(self, command_item):
+        query, result, signal, trace, transaction, queued = command_item
 
-                    signal.release()
-                    return
+        if transaction is None:
+            # THIS IS A TRANSACTIONLESS QUERY, DELAY IT IF THERE IS A CURRENT TRANSACTION
+            if self.transaction_stack:
+                with self.locker:
+                    if self.too_long is None:
+                        self.too_long = Till(seconds=TOO_LONG_TO_HOLD_TRANSACTION)
+                        self.too_long.then(self.show_transactions_blocked_warning)
+                    self.delayed_queries.append(command_item)
+                return
+            # DO NOT LET IT SEE (OR COMMIT) CHANGES THAT ARE NOT YET DURABLE
+            self._commit_group()
+        elif self.transaction_stack and self.transaction_stack[-1] not in [
+            transaction,
+            transaction.parent,
+        ]:
+            # THIS TRANSACTION IS NOT THE CURRENT TRANSACTION, DELAY IT
+            with self.locker:
+                if self.too_long is None:
+                    self.too_long = Till(seconds=TOO_LONG_TO_HOLD_TRANSACTION)
+                    self.too_long.then(self.show_transactions_blocked_warning)
+                self.delayed_transactions.append(command_item)
+            return
+        else:
+            # ENSURE THE CURRENT TRANSACTION IS UP TO DATE FOR THIS query
+            if not self.transaction_stack:
+                # sqlite3 ALLOWS ONLY ONE TRANSACTION AT A TIME
+                self._begin()
+                self.transaction_stack.append(transaction)
+            elif transaction is not self.transaction_stack[-1]:
+                self.transaction_stack.append(transaction)
+            elif transaction.exception and query is not ROLLBACK:
+                result.exception = Except(
+                    context=ERROR,
+                    template="Not allowed to continue using a transaction that failed",
+                    cause=transaction.exception,
+                    trace=trace,
+                )
+                signal.release()
+                return
 
             try:
-                # DEAL WITH END-OF-TRANSACTION MESSAGES
-                if query in [COMMIT, ROLLBACK]:
-                    self._close_transaction(command_item)
-                    return
-
-                # EXECUTE QUERY
-                self.last_command_item = command_item
-                self.debug and Log.note(FORMAT_COMMAND, command=query)
-                curr = self.db.execute(text(query))
-                result.meta.format = "table"
-                result.header = (
-                    [d[0] for d in curr.description] if curr.description else None
-                )
-                result.data = curr.fetchall()
-                if self.debug and result.data:
-                    csv = convert.table2csv(list(result.data))
-                    Log.note("Result:\n{{data|limit(100)|indent}}", data=csv)
+                transaction.do_all()
             except Exception as e:
-                e = Except.wrap(e)
+                # DEAL WITH ERRORS IN QUEUED COMMANDS
+                # WE WILL UNWRAP THE OUTER EXCEPTION TO GET THE CAUSE
                 err = Except(
                     context=ERROR,
-                    template="Bad call to Sqlite while " + FORMAT_COMMAND,
-                    params={"command": query},
-                    trace=trace,
-                    cause=e,
+                    template="Bad call to Sqlite3 while " + FORMAT_COMMAND,
+                    params={"command": e.params.current.command},
+                    cause=e.cause,
+                    trace=e.params.current.trace,
+                )
+                transaction.exception = result.exception = err
+
+                if query in [COMMIT, ROLLBACK]:
+                    self._close_transaction(
+                        CommandItem(ROLLBACK, result, signal, trace, transaction, None)
+                    )
+
+                signal.release()
+                return
+
+        deferred = False
+        try:
+            # DEAL WITH END-OF-TRANSACTION MESSAGES
+            if query in [COMMIT, ROLLBACK]:
+                deferred = self._close_transaction(command_item)
+                return
+
+            # EXECUTE QUERY
+            self.last_command_item = command_item
+            self.debug and Log.note(FORMAT_COMMAND, command=query)
+            start = time() if self._stats.enabled else None
+            if isinstance(query, Fetch):
+                _fetch(self.db, query, result)
+            else:
+                _fill_result(self.db.execute(text(query)), result)
+            if start is not None:
+                self._stats.command(
+                    coalesce(query.command, "FETCH") if isinstance(query, Fetch) else query,
+                    queued, start, time(), len(result.data), trace
                 )
-                result.exception = err
-                if transaction:
-                    transaction.exception = err
-            finally:
+            if self.debug and result.data:
+                csv = convert.table2csv(list(result.data))
+                Log.note("Result:\n{{data|limit(100)|indent}}", data=csv)
+        except Exception as e:
+            e = Except.wrap(e)
+            err = Except(
+                context=ERROR,
+                template="Bad call to Sqlite while " + FORMAT_COMMAND,
+                params={"command": query},
+                trace=trace,
+                cause=e,
+            )
+            result.exception = err
+            if transaction:
+                transaction.exception = err
+        finally:
+            if not deferred:
+                # GROUPED COMMITS ARE RELEASED BY _commit_group()
                 signal.release()
 
 
@@ -524,9 +770,21 @@ class Transaction(object):
     def execute(self, command):
         if self.end_of_life:
             Log.error("Transaction is dead")
-        trace = get_stacktrace(1) if self.db.get_trace else None
+        trace = get_stacktrace(1) if self.db.get_trace or self.db._stats.sample() else None
+        with self.locker:
+            self.todo.append(CommandItem(command, None, None, trace, self, None))
+
+    def execute_many(self, command, rows):
+        """
+        RUN command ONCE FOR EACH TUPLE IN rows, AS BOUND PARAMETERS
+        :param command: SQL WITH ? PLACEHOLDERS
+        :param rows: LIST OF PARAMETER TUPLES (SEE bind_value)
+        """
+        if self.end_of_life:
+            Log.error("Transaction is dead")
+        trace = get_stacktrace(1) if self.db.get_trace or self.db._stats.sample() else None
         with self.locker:
-            self.todo.append(CommandItem(command, None, None, trace, self))
+            self.todo.append(CommandItem(ManyCommand(command, rows), None, None, trace, self, None))
 
     def do_all(self):
         # ENSURE PARENT TRANSACTION IS UP TO DATE
@@ -542,9 +800,17 @@ class Transaction(object):
                 self.complete = len(self.todo)
 
             # RUN THEM
+            stats = self.db._stats
             for c in todo:
-                self.db.debug and Log.note(FORMAT_COMMAND, command=c.command, file=c.trace[0]['file'], line=c.trace[0]['line'])
-                self.db.db.execute(text(c.command))
+                self.db.debug and Log.note(FORMAT_COMMAND, command=c.command)
+                start = time() if stats.enabled else None
+                if isinstance(c.command, ManyCommand):
+                    self.db.db.executemany(text(c.command.command), c.command.rows)
+                else:
+                    self.db.db.execute(text(c.command))
+                if start is not None:
+                    command = c.command.command if isinstance(c.command, ManyCommand) else c.command
+                    stats.command(command, None, start, time(), 0, c.trace)
         except Exception as e:
             Log.error("problem running commands", current=c, cause=e)
 
@@ -555,13 +821,21 @@ class Transaction(object):
         signal = _allocate_lock()
         signal.acquire()
         result = Data()
-        trace = get_stacktrace(1) if self.db.get_trace else None
-        self.db.queue.add(CommandItem(query, result, signal, trace, self))
+        trace = get_stacktrace(1) if self.db.get_trace or self.db._stats.sample() else None
+        queued = time() if self.db._stats.enabled else None
+        self.db.queue.add(CommandItem(query, result, signal, trace, self, queued))
         signal.acquire()
         if result.exception:
             Log.error("Problem with Sqlite call", cause=result.exception)
         return result
 
+    def query_async(self, query):
+        """
+        asyncio VERSION OF query()
+        :return: asyncio FUTURE, COMPLETED BY THE WORKER THREAD
+        """
+        return self.db._send_async(query, self.db.queue, self)
+
     def rollback(self):
         self.query(ROLLBACK)
 
@@ -570,10 +844,138 @@ class Transaction(object):
 
 
 CommandItem = namedtuple(
-    "CommandItem", ("command", "result", "is_done", "trace", "transaction")
+    "CommandItem", ("command", "result", "is_done", "trace", "transaction", "queued")
 )
+ManyCommand = namedtuple("ManyCommand", ("command", "rows"))
+
+
+class _AsyncSignal(object):
+    """
+    TAKES THE PLACE OF THE is_done LOCK FOR query_async()
+    THE WORKER'S release() COMPLETES THE FUTURE ON ITS EVENT LOOP
+    """
+
+    __slots__ = ["loop", "future", "result"]
+
+    def __init__(self, loop, result):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.result = result
+
+    def release(self):
+        try:
+            self.loop.call_soon_threadsafe(self._done)
+        except RuntimeError:
+            pass  # LOOP IS CLOSED, NOBODY IS WAITING
+
+    def _done(self):
+        if self.future.cancelled():
+            return
+        if self.result.exception:
+            self.future.set_exception(Except(
+                context=ERROR,
+                template="Problem with Sqlite call",
+                cause=self.result.exception
+            ))
+        else:
+            self.future.set_result(self.result)
+
+
+def then(future, func):
+    """
+    :param future: asyncio FUTURE
+    :param func: FUNCTION TO APPLY TO THE RESULT
+    :return: asyncio FUTURE FOR func(future.result())
+    """
+    import asyncio
+
+    output = asyncio.get_event_loop().create_future()
+
+    def done(f):
+        if output.cancelled():
+            return
+        if f.cancelled():
+            output.cancel()
+            return
+        e = f.exception()
+        if e is not None:
+            output.set_exception(e)
+            return
+        try:
+            output.set_result(func(f.result()))
+        except Exception as e:
+            output.set_exception(Except.wrap(e))
+
+    future.add_done_callback(done)
+    return output
+
+
+Fetch = namedtuple("Fetch", ("command", "cursor", "size"))  # ONE CHUNK OF A query_iter() STREAM
 
 _simple_word = re.compile(r"^\w+$", re.UNICODE)
+_read_only = re.compile(r"^\s*SELECT\b", re.UNICODE | re.IGNORECASE)
+
+
+def _connect(filename):
+    return _sqlite3.connect(
+        database=filename,
+        check_same_thread=False,
+        isolation_level=None,
+    )
+
+
+def _is_read(command):
+    """
+    :return: True IF command CAN BE SENT TO A READ-ONLY CONNECTION
+    """
+    return bool(_read_only.match(text(command)))
+
+
+_compiled_patterns = OrderedDict()  # LRU OF pattern -> COMPILED REGEX
+_compiled_patterns_locker = _allocate_lock()
+
+
+def _compile(pattern):
+    with _compiled_patterns_locker:
+        compiled = _compiled_patterns.pop(pattern, None)
+        if compiled is None:
+            compiled = re.compile(pattern)
+            if len(_compiled_patterns) >= REGEXP_CACHE_SIZE:
+                _compiled_patterns.popitem(last=False)
+        _compiled_patterns[pattern] = compiled
+    return compiled
+
+
+def _regexp(pattern, item):
+    """
+    THE REGEXP FUNCTION, CALLED FOR EVERY ROW
+    """
+    if item is None:
+        return None
+    return _compile(pattern).search(item) is not None
+
+
+def _fill_result(curr, result):
+    result.meta.format = "table"
+    result.header = [d[0] for d in curr.description] if curr.description else None
+    result.data = curr.fetchall()
+
+
+def _fetch(db, fetch, result):
+    """
+    RUN fetch.command (OR CONTINUE fetch.cursor) FOR THE NEXT fetch.size ROWS
+    result.cursor IS None WHEN THE STREAM IS EXHAUSTED
+    """
+    curr = fetch.cursor
+    if curr is None:
+        curr = db.execute(text(fetch.command))
+        result.header = [d[0] for d in curr.description] if curr.description else None
+    result.data = curr.fetchmany(fetch.size) if fetch.size else []
+    if len(result.data) < fetch.size or not fetch.size:
+        curr.close()
+        result.cursor = None
+    else:
+        result.cursor = curr
 
 
 def quote_column(*path):
@@ -622,6 +1024,34 @@ def quote_value(value):
         return SQL(text(value))
 
 
+def bind_value(value):
+    """
+    :return: value AS A BOUND PARAMETER, SAME MEANING AS quote_value(value)
+    """
+    if isinstance(value, (Mapping, list)):
+        return "."
+    elif isinstance(value, Date):
+        return value.unix
+    elif isinstance(value, Duration):
+        return value.seconds
+    elif value == None:
+        return None
+    return value
+
+
+def sql_insert_params(table, columns):
+    """
+    :return: INSERT WITH ONE ? PLACEHOLDER PER COLUMN, FOR USE WITH execute_many
+    """
+    return ConcatSQL(
+        SQL_INSERT,
+        quote_column(table),
+        sql_iso(sql_list(map(quote_column, columns))),
+        SQL_VALUES,
+        sql_iso(sql_list([SQL("?")] * len(columns))),
+    )
+
+
 def quote_list(values):
     return sql_iso(sql_list(map(quote_value, values)))
 
@@ -734,6 +1164,9 @@ def sql_insert(table, records):
 BEGIN = "BEGIN"
 COMMIT = "COMMIT"
 ROLLBACK = "ROLLBACK"
+SAVEPOINT = "SAVEPOINT grouped"
+RELEASE = "RELEASE SAVEPOINT grouped"
+ROLLBACK_TO = "ROLLBACK TO SAVEPOINT grouped"
 
 
 def _upgrade():
@@ -0,0 +1,177 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import, division, unicode_literals
+
+import re
+from math import log
+from random import random
+
+from mo_future import text
+from mo_threads import Lock
+
+NUM_BUCKETS = 32  # BUCKET i HOLDS DURATIONS BELOW 2^i MICROSECONDS
+MAX_SHAPE_LENGTH = 1000
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r"(?<![\w$.\"])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+_list_of_params = re.compile(r"\?(?:\s*,\s*\?)+")
+_whitespace = re.compile(r"\s+")
+
+
+def statement_shape(command):
+    """
+    :param command: SQL
+    :return: THE SQL WITH LITERALS REPLACED BY ?, SO SIMILAR STATEMENTS SHARE STATISTICS
+    """
+    shape = _string_literal.sub("?", text(command))
+    shape = _number_literal.sub("?", shape)
+    shape = _list_of_params.sub("?, ...", shape)
+    shape = _whitespace.sub(" ", shape).strip()
+    return shape[:MAX_SHAPE_LENGTH]
+
+
+class Histogram(object):
+    """
+    LOG2 HISTOGRAM OF DURATIONS, IN SECONDS
+    """
+
+    __slots__ = ["count", "total", "min", "max", "buckets"]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * NUM_BUCKETS
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+        micros = duration * 1000000
+        if micros < 1:
+            self.buckets[0] += 1
+        else:
+            self.buckets[min(int(log(micros, 2)) + 1, NUM_BUCKETS - 1)] += 1
+
+    def percentile(self, percent):
+        """
+        :return: UPPER BOUND (IN SECONDS) OF THE BUCKET HOLDING THE GIVEN PERCENTILE
+        """
+        if not self.count:
+            return None
+        limit = self.count * percent
+        acc = 0
+        for i, b in enumerate(self.buckets):
+            acc += b
+            if acc >= limit:
+                return min(2 ** i / 1000000, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+        }
+
+
+class ShapeStats(object):
+    __slots__ = ["latency", "rows", "trace"]
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.rows = 0
+        self.trace = None
+
+
+class Stats(object):
+    """
+    INSTRUMENTATION FOR THE sqlite WORKER
+    CALLERS CHECK enabled BEFORE CALLING, SO DISABLED STATS COST ONE ATTRIBUTE LOOKUP
+    """
+
+    def __init__(self, enabled=False, trace_sample=0):
+        """
+        :param enabled: COLLECT STATISTICS
+        :param trace_sample: FRACTION OF COMMANDS THAT CAPTURE THE CALLER STACK
+        """
+        self.enabled = enabled
+        self.trace_sample = trace_sample
+        self.locker = Lock("sqlite stats")
+        self.shapes = {}  # MAP FROM STATEMENT SHAPE TO ShapeStats
+        self.queue_wait = Histogram()
+        self.transactions = Histogram()
+
+    def sample(self):
+        """
+        :return: True IF THIS COMMAND SHOULD CAPTURE ITS STACK TRACE
+        """
+        return self.enabled and self.trace_sample and random() < self.trace_sample
+
+    def command(self, command, queued, start, end, rows, trace=None):
+        """
+        RECORD ONE EXECUTED STATEMENT
+        :param command: THE SQL
+        :param queued: TIME THE COMMAND WAS QUEUED (None IF NOT QUEUED)
+        :param start: TIME EXECUTION STARTED
+        :param end: TIME EXECUTION ENDED
+        :param rows: NUMBER OF ROWS RETURNED
+        :param trace: STACK TRACE, IF SAMPLED
+        """
+        shape = statement_shape(command)
+        with self.locker:
+            s = self.shapes.get(shape)
+            if s is None:
+                s = self.shapes[shape] = ShapeStats()
+            s.latency.add(end - start)
+            s.rows += rows
+            if trace:
+                s.trace = trace
+            if queued is not None:
+                self.queue_wait.add(start - queued)
+
+    def transaction(self, duration):
+        """
+        RECORD HOW LONG A TRANSACTION HELD THE WRITER
+        """
+        with self.locker:
+            self.transactions.add(duration)
+
+    def as_dict(self):
+        with self.locker:
+            return {
+                "statements": [
+                    {
+                        "shape": shape,
+                        "latency": s.latency.as_dict(),
+                        "rows": s.rows,
+                        "trace": s.trace,
+                    }
+                    for shape, s in sorted(self.shapes.items(), key=lambda p: -p[1].latency.total)
+                ],
+                "queue_wait": self.queue_wait.as_dict(),
+                "transactions": self.transactions.as_dict(),
+            }
+
+    def clear(self):
+        with self.locker:
+            self.shapes = {}
+            self.queue_wait = Histogram()
+            self.transactions = Histogram()
@@ -0,0 +1,96 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+FILE SIZE, GROUPING AND FILTERING, WITH AND WITHOUT DICTIONARY ENCODING
+OF LOW-CARDINALITY STRINGS
+
+    export PYTHONPATH=.:vendor
+    python -m tests.benchmarks.dictionary
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+
+from mo_files import TempDirectory
+from mo_logs import Log, constants
+from mo_times import Timer
+
+from jx_sqlite.container import Container
+from jx_sqlite.loader import chunks
+from jx_sqlite.sqlite import Sqlite
+
+NUM_DOCS = 200000
+PLATFORMS = ["linux64-shippable-qr", "windows10-64-shippable", "macosx1014-64-shippable", "android-hw-p2-8-0-arm7"]
+BRANCHES = ["mozilla-central", "autoland", "mozilla-beta", "try"]
+SUITES = 300  # DISTINCT TEST SUITES
+ENCODED = ["platform", "branch", "suite"]
+QUERIES = 10
+
+
+def fill(container, encode):
+    facts = container.get_or_create_facts("docs")
+    if encode:
+        for name in ENCODED:
+            facts.dictionary_encode(name)
+    docs = (
+        {
+            "platform": PLATFORMS[i % len(PLATFORMS)],
+            "branch": BRANCHES[(i // 7) % len(BRANCHES)],
+            "suite": "mochitest-browser-chrome-" + str((i * 7919) % SUITES),
+            "duration": i % 1000,
+        }
+        for i in range(NUM_DOCS)
+    )
+    for chunk in chunks(docs, 10000):
+        facts.insert(chunk)
+
+
+def run(container):
+    table = container.get_table("docs")
+    with Timer("group", silent=True) as group:
+        for _ in range(QUERIES):
+            table.query({"select": {"aggregate": "count"}, "groupby": ["branch", "suite"], "limit": 10000, "format": "list"})
+    with Timer("filter", silent=True) as filter:
+        for i in range(QUERIES):
+            table.query({
+                "select": {"value": "duration", "aggregate": "sum"},
+                "where": {"eq": {"suite": "mochitest-browser-chrome-" + str(i)}},
+                "format": "list"
+            })
+    return QUERIES / group.duration.seconds, QUERIES / filter.duration.seconds
+
+
+def main():
+    constants.set({"jx_sqlite": {"sqlite": {"DEBUG": False}}})
+    with TempDirectory() as temp:
+        for encode in [False, True]:
+            filename = (temp / (("encoded" if encode else "plain") + ".sqlite")).abspath
+            db = Sqlite(filename=filename, get_trace=False)
+            try:
+                container = Container(db=db)
+                fill(container, encode)
+                group, filter = run(container)
+            finally:
+                db.close()
+            Log.note(
+                "{{name}}  {{size}} bytes  groupby {{group|round(places=3)}} queries/sec  filter {{filter|round(places=3)}} queries/sec",
+                name="encoded" if encode else "plain  ",
+                size=os.path.getsize(filename),
+                group=group,
+                filter=filter,
+            )
+
+
+if __name__ == "__main__":
+    try:
+        Log.start()
+        main()
+    finally:
+        Log.stop()
@@ -0,0 +1,74 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+FILE SIZE AND LOOKUP BY _id, WITH GUIDS AS UNINDEXED TEXT AND AS INDEXED BLOBS
+
+    export PYTHONPATH=.:vendor
+    python -m tests.benchmarks.guid
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+
+from mo_files import TempDirectory
+from mo_logs import Log, constants
+from mo_sql import SQL
+from mo_times import Timer
+
+from jx_sqlite.container import Container
+from jx_sqlite.loader import chunks
+from jx_sqlite.sqlite import Sqlite
+
+NUM_DOCS = 100000
+QUERIES = 200
+
+TEXT_GUIDS = SQL(
+    "UPDATE docs SET _id=LOWER(SUBSTR(HEX(_id),1,8)||'-'||SUBSTR(HEX(_id),9,4)||'-'||"
+    "SUBSTR(HEX(_id),13,4)||'-'||SUBSTR(HEX(_id),17,4)||'-'||SUBSTR(HEX(_id),21))"
+)
+
+
+def main():
+    constants.set({"jx_sqlite": {"sqlite": {"DEBUG": False}}})
+    with TempDirectory() as temp:
+        for binary in [False, True]:
+            filename = (temp / (("binary" if binary else "text") + ".sqlite")).abspath
+            db = Sqlite(filename=filename, get_trace=False)
+            try:
+                container = Container(db=db)
+                facts = container.get_or_create_facts("docs")
+                for chunk in chunks(({"a": i} for i in range(NUM_DOCS)), 10000):
+                    facts.insert(chunk)
+                if not binary:
+                    # AS STORED BEFORE GUIDS WERE BINARY
+                    with db.transaction() as t:
+                        t.execute(SQL('DROP INDEX "docs._id.unique"'))
+                        t.execute(TEXT_GUIDS)
+                table = container.get_table("docs")
+                ids = table.query({"select": "_id", "limit": QUERIES, "format": "list"}).data
+                with Timer("lookup", silent=True) as lookup:
+                    for i in ids:
+                        table.query({"select": "a", "where": {"eq": {"_id": i}}, "format": "list"})
+            finally:
+                db.close()
+            Log.note(
+                "{{name}}  {{size}} bytes  lookup {{lookup|round(places=3)}} queries/sec",
+                name="binary" if binary else "text  ",
+                size=os.path.getsize(filename),
+                lookup=QUERIES / lookup.duration.seconds,
+            )
+
+
+if __name__ == "__main__":
+    try:
+        Log.start()
+        main()
+    finally:
+        Log.stop()
@@ -0,0 +1,90 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+REASSEMBLY OF DEEP DOCUMENTS, WITH AND WITHOUT THE PARENT INDEX ON NESTED TABLES
+
+    export PYTHONPATH=.:vendor
+    python -m tests.benchmarks.nested_join
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_files import TempDirectory
+from mo_logs import Log, constants
+from mo_sql import SQL
+from mo_times import Timer
+
+from jx_sqlite import PARENT
+from jx_sqlite.container import Container
+from jx_sqlite.loader import chunks
+from jx_sqlite.sqlite import Sqlite, quote_column
+from jx_sqlite.snowflake import sql_parent_index
+
+NUM_DOCS = 20000
+CHILDREN = 5
+GRANDCHILDREN = 3
+DOCS_PER_QUERY = 10
+QUERIES = 200
+TABLES = ["docs.n", "docs.n.m"]
+
+# THE SHAPE OF JOIN SetOpTable MAKES TO PUT DOCUMENTS BACK TOGETHER
+QUERY = (
+    'SELECT p.__id__, p."a.$n", c.__order__, c."n.b.$n", g.__order__, g."n.m.c.$n"'
+    ' FROM docs AS p'
+    ' LEFT JOIN "docs.n" AS c ON c.__parent__ = p.__id__'
+    ' LEFT JOIN "docs.n.m" AS g ON g.__parent__ = c.__id__'
+    ' WHERE p."a.$n" >= {{start}} AND p."a.$n" < {{end}}'
+    ' ORDER BY p.__id__, c.__order__, g.__order__'
+)
+
+
+def fill(container):
+    facts = container.get_or_create_facts("docs")
+    docs = (
+        {"a": i, "n": [{"b": j, "m": [{"c": k} for k in range(GRANDCHILDREN)]} for j in range(CHILDREN)]}
+        for i in range(NUM_DOCS)
+    )
+    for chunk in chunks(docs, 1000):
+        facts.insert(chunk)
+
+
+def run(db):
+    with Timer("reassemble", silent=True) as timer:
+        for i in range(QUERIES):
+            start = (i * 7919) % (NUM_DOCS - DOCS_PER_QUERY)
+            db.query(SQL(QUERY.replace("{{start}}", str(start)).replace("{{end}}", str(start + DOCS_PER_QUERY))))
+    return QUERIES / timer.duration.seconds
+
+
+def main():
+    constants.set({"jx_sqlite": {"sqlite": {"DEBUG": False}}})
+    with TempDirectory() as temp:
+        db = Sqlite(filename=(temp / "bench.sqlite").abspath, get_trace=False)
+        try:
+            fill(Container(db=db))
+
+            with db.transaction() as t:
+                for table in TABLES:
+                    t.execute(SQL("DROP INDEX ") + quote_column(table + "." + PARENT))
+            Log.note("without parent index  {{rate|round(places=3)}} queries/sec", rate=run(db))
+
+            with db.transaction() as t:
+                for table in TABLES:
+                    t.execute(sql_parent_index(table))
+            Log.note("with parent index     {{rate|round(places=3)}} queries/sec", rate=run(db))
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    try:
+        Log.start()
+        main()
+    finally:
+        Log.stop()
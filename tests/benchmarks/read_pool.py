@@ -0,0 +1,75 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+READ THROUGHPUT OF TRANSACTIONLESS QUERIES, BY NUMBER OF CALLING THREADS
+
+    export PYTHONPATH=.:vendor
+    python -m tests.benchmarks.read_pool
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_files import TempDirectory
+from mo_logs import Log, constants
+from mo_threads import Thread
+from mo_times import Timer
+
+from jx_sqlite.sqlite import Sqlite, sql_create, sql_insert
+
+NUM_ROWS = 200000
+QUERIES_PER_THREAD = 20
+THREADS = [1, 2, 4, 8]
+QUERY = "SELECT value % 97, COUNT(1), SUM(value) FROM data GROUP BY value % 97"
+
+
+def fill(db):
+    with db.transaction() as t:
+        t.execute(sql_create("data", {"value": "INTEGER"}))
+    batch = 10000
+    for start in range(0, NUM_ROWS, batch):
+        with db.transaction() as t:
+            t.execute(sql_insert("data", [{"value": i} for i in range(start, start + batch)]))
+
+
+def run(db, num_threads):
+    def worker(please_stop):
+        for _ in range(QUERIES_PER_THREAD):
+            db.query(QUERY)
+
+    with Timer("{{num}} threads", param={"num": num_threads}, silent=True) as timer:
+        threads = [Thread.run("reader " + str(i), worker) for i in range(num_threads)]
+        for t in threads:
+            t.join()
+    return num_threads * QUERIES_PER_THREAD / timer.duration.seconds
+
+
+def main():
+    constants.set({"jx_sqlite": {"sqlite": {"DEBUG": False}}})
+    for pool_size in [0, max(THREADS)]:
+        with TempDirectory() as temp:
+            db = Sqlite(filename=(temp / "bench.sqlite").abspath, read_pool_size=pool_size, get_trace=False)
+            try:
+                fill(db)
+                for num_threads in THREADS:
+                    Log.note(
+                        "read_pool_size={{pool}}  threads={{threads}}  {{rate|round(places=3)}} queries/sec",
+                        pool=pool_size,
+                        threads=num_threads,
+                        rate=run(db, num_threads),
+                    )
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    try:
+        Log.start()
+        main()
+    finally:
+        Log.stop()
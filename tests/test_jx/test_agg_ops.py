@@ -67,7 +67,6 @@ class TestAggOps(BaseTestCase):
         }
         self.utils.execute_tests(test)
 
-    @skipIf(global_settings.use == "sqlite", "not expected to pass yet")
     def test_median(self):
         test = {
             "data": [{"a": i**2} for i in range(30)],
@@ -150,7 +149,6 @@ class TestAggOps(BaseTestCase):
         }
         self.utils.execute_tests(test, places=1.5)  # 1.5 approx +/- 3%
 
-    @skipIf(global_settings.use == "sqlite", "not expected to pass yet")
     def test_stats(self):
         test = {
             "data": [{"a": i**2} for i in range(30)],
@@ -322,7 +320,6 @@ class TestAggOps(BaseTestCase):
         }
         self.utils.execute_tests(test, tjson=True)
 
-    @skipIf(global_settings.use == "sqlite", "sqlite does not have a median function")
     def test_median_on_value(self):
         test = {
             "data": [i**2 for i in range(30)],
@@ -1622,7 +1622,6 @@ class TestEdge1(BaseTestCase):
         }
         self.utils.execute_tests(test)
 
-    @skipIf(global_settings.use == "sqlite", "no median support")
     def test_percentile(self):
         test = {
             "data": [
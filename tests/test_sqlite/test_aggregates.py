@@ -0,0 +1,58 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_math.randoms import Random
+from mo_math.stats import percentile
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.aggregates import DIGEST_BUFFER, TDigest
+from jx_sqlite.sqlite import Sqlite, sql_create, sql_insert
+
+
+class TestAggregates(FuzzyTestCase):
+
+    def test_exact_when_small(self):
+        values = [i ** 2 for i in range(30)]
+        digest = TDigest()
+        for v in values:
+            digest.add(v)
+        for p in [0, 0.1, 0.5, 0.9, 1]:
+            self.assertAlmostEqual(digest.percentile(p), percentile(values, p), places=6)
+
+    def test_bounded_memory(self):
+        values = [Random.float() for _ in range(50000)]
+        digest = TDigest()
+        for v in values:
+            digest.add(v)
+        self.assertLess(len(digest.centroids) + len(digest.buffer), 2 * DIGEST_BUFFER)
+        for p in [0.01, 0.5, 0.99]:
+            self.assertAlmostEqual(digest.percentile(p), percentile(values, p), delta=0.01)
+
+    def test_sql_aggregates(self):
+        db = Sqlite()
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"g": "INTEGER", "a": "INTEGER"}))
+                t.execute(sql_insert("data", [{"g": i % 3, "a": i ** 2} for i in range(30)]))
+
+            result = db.query(
+                "SELECT MEDIAN(a), PERCENTILE(a, 0.9), VAR_POP(a), STDDEV_POP(a) FROM data"
+            )
+            self.assertAlmostEqual(result.data[0], [210.5, 681.3, 67479.93889, 259.76901064], places=4)
+
+            # SKETCHES OF EACH GROUP MERGE INTO A SKETCH OF THE WHOLE
+            result = db.query(
+                "SELECT TDIGEST_PERCENTILE(TDIGEST_MERGE(s), 0.5) FROM"
+                " (SELECT TDIGEST(a) AS s FROM data GROUP BY g)"
+            )
+            self.assertAlmostEqual(result.data[0][0], 210.5)
+        finally:
+            db.close()
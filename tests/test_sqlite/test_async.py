@@ -0,0 +1,93 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import asyncio
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+from jx_sqlite.sqlite import Sqlite, sql_create, sql_insert
+
+
+class TestAsync(FuzzyTestCase):
+
+    def test_many_pending(self):
+        db = Sqlite()
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"value": "INTEGER"}))
+                t.execute(sql_insert("data", [{"value": i} for i in range(10)]))
+
+            async def run():
+                return await asyncio.gather(*(
+                    db.query_async("SELECT SUM(value) + " + str(i) + " FROM data")
+                    for i in range(2000)
+                ))
+
+            results = asyncio.get_event_loop().run_until_complete(run())
+            self.assertEqual([r.data[0][0] for r in results], [45 + i for i in range(2000)])
+        finally:
+            db.close()
+
+    def test_error(self):
+        db = Sqlite()
+        try:
+            async def run():
+                await db.query_async("SELECT * FROM no_such_table")
+
+            self.assertRaises("no such table", asyncio.get_event_loop().run_until_complete, run())
+        finally:
+            db.close()
+
+    def test_transaction(self):
+        db = Sqlite()
+        try:
+            async def run():
+                t = db.transaction()
+                t.execute(sql_create("data", {"value": "INTEGER"}))
+                t.execute(sql_insert("data", {"value": 42}))
+                result = await t.query_async("SELECT value FROM data")
+                await t.query_async("COMMIT")
+                return result
+
+            result = asyncio.get_event_loop().run_until_complete(run())
+            self.assertEqual(result.data, [(42,)])
+            self.assertEqual(db.query("SELECT value FROM data").data, [(42,)])
+        finally:
+            db.close()
+
+    def test_query_table(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("async")
+        table.insert([{"a": i, "b": "x"} for i in range(5)])
+
+        async def run():
+            return await table.query_async({"select": {"aggregate": "sum", "value": "a"}, "groupby": "b", "format": "list"})
+
+        result = asyncio.get_event_loop().run_until_complete(run())
+        self.assertAlmostEqual(result.data, [{"b": "x", "a": 10}])
+
+    def test_query_table_is_cached(self):
+        container = Container(db={}, cache_size=10)
+        table = container.get_or_create_facts("async")
+        table.insert([{"a": i, "b": "x"} for i in range(5)])
+        query = {"select": {"aggregate": "sum", "value": "a"}, "groupby": "b", "format": "list"}
+
+        async def run():
+            return [await table.query_async(dict(query)), await table.query_async(dict(query))]
+
+        first, second = asyncio.get_event_loop().run_until_complete(run())
+        self.assertAlmostEqual(first.data, [{"b": "x", "a": 10}])
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(container.cache.stats(), {"hits": 1, "misses": 1})
+        self.assertEqual(table.query(dict(query)), first)
+        self.assertEqual(container.cache.stats(), {"hits": 2, "misses": 1})
+        self.assertEqual(container.advisor.num_queries, 1)
@@ -0,0 +1,35 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times import Date
+
+from jx_sqlite.sqlite import Sqlite, bind_value, sql_create, sql_insert_params
+
+
+class TestBoundInsert(FuzzyTestCase):
+
+    def test_execute_many(self):
+        db = Sqlite()
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"a": "TEXT", "b": "REAL", "c": "TINYINT"}))
+                t.execute_many(
+                    sql_insert_params("data", ["a", "b", "c"]),
+                    [
+                        tuple(bind_value(v) for v in row)
+                        for row in [("it's", Date("2020-01-01"), True), (None, 2.5, False)]
+                    ]
+                )
+            result = db.query("SELECT a, b, c FROM data ORDER BY b DESC")
+            self.assertEqual(result.data, [("it's", Date("2020-01-01").unix, 1), (None, 2.5, 0)])
+        finally:
+            db.close()
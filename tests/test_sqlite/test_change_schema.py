@@ -0,0 +1,88 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from jx_base import Column
+from mo_json import NUMBER
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times import Date
+
+from jx_sqlite.container import Container
+from jx_sqlite.sqlite import Sqlite
+
+
+class TestChangeSchema(FuzzyTestCase):
+
+    def test_one_transaction_per_chunk(self):
+        db = Sqlite(stats=True)
+        container = Container(db=db)
+        table = container.get_or_create_facts("wide")
+        container.next_uid()  # ALLOCATE THE FIRST BLOCK OF IDS
+        db.stats(clear=True)
+
+        docs = [{"k" + str(i): i, "s": str(i)} for i in range(20)]
+        table.insert(docs)
+
+        # ONE TO CHANGE THE SCHEMA, ONE TO INSERT THE ROWS
+        self.assertEqual(db.stats().transactions.count, 2)
+        result = table.query({"select": ["k3", "k17", "s"], "where": {"eq": {"s": "17"}}, "format": "list"})
+        self.assertEqual(result.data, [{"k17": 17, "s": "17"}])
+
+    def test_nested_in_chunk(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("nested")
+        table.insert([{"a": [{"b": i}, {"b": i + 1}]} for i in range(3)])
+        result = container.db.query(SQL("SELECT COUNT(1) FROM \"nested.a\""))
+        self.assertEqual(result.data[0][0], 6)
+
+    def test_nest_existing_column(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("moved")
+        table.insert([{"a": i, "b": str(i)} for i in range(3)])
+        table.insert([{"a": [{"c": 2}, {"c": 3}], "b": "n"}])
+        db = container.db
+
+        # PARENT KEEPS ITS KEY AND LOSES THE MOVED COLUMN
+        parent = db.about("moved")
+        self.assertEqual([(name, pk) for _, name, _, _, _, pk in parent], [("__id__", 1), ("_id", 0), ("b.$s", 0)])
+        self.assertEqual(db.query(SQL("SELECT COUNT(1) FROM moved")).data[0][0], 4)
+
+        # OLD VALUES ARE NOW CHILD ROWS
+        result = db.query(SQL('SELECT p."b.$s", c."a.$n" FROM "moved.a" c JOIN moved p ON p.__id__=c.__parent__ WHERE c."a.$n" IS NOT NULL ORDER BY 1'))
+        self.assertEqual(result.data, [("0", 0), ("1", 1), ("2", 2)])
+        self.assertEqual(table.snowflake.get_column("a", "number"), None)
+
+    def test_nest_after_concurrent_add(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("moved")
+        table.insert([{"a": 1}])
+        with container.db.transaction() as t:
+            # ANOTHER WRITER ADDS THE COLUMN FIRST
+            t.execute(SQL('ALTER TABLE moved ADD COLUMN "z.$n" REAL'))
+            container.ns.columns.save_column(t, Column(
+                name="z",
+                jx_type=NUMBER,
+                nested_path=["."],
+                es_type="REAL",
+                es_column="z.$n",
+                es_index="moved",
+                last_updated=Date.now()
+            ))
+        table.insert([{"a": [{"b": 2}, {"b": 3}], "z": 1}])
+        db = container.db
+
+        self.assertEqual([name for _, name, _, _, _, _ in db.about("moved")], ["__id__", "_id", "z.$n"])
+        result = db.query(SQL('SELECT p."z.$n", c."a.$n", c."a.b.$n" FROM "moved.a" c JOIN moved p ON p.__id__=c.__parent__ ORDER BY c.__id__'))
+        self.assertEqual(result.data, [(None, 1, None), (1, None, 2), (1, None, 3)])
+        self.assertEqual(
+            sorted(c.es_column for c in container.ns.columns.find("moved.a")),
+            ["a.$n", "a.b.$n"]
+        )
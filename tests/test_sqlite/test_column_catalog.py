@@ -0,0 +1,89 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import tempfile
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+from jx_sqlite.meta_columns import ColumnList
+from jx_sqlite.sqlite import Sqlite, sql_create, sql_insert
+
+
+def column_summary(columns, fact_name):
+    return sorted(
+        (c.es_index, c.es_column, c.name, c.jx_type, tuple(c.nested_path))
+        for c in columns.find(fact_name)
+    )
+
+
+class TestColumnCatalog(FuzzyTestCase):
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_reload_from_catalog(self):
+        db = Sqlite(filename=self.filename)
+        container = Container(db=db)
+        table = container.get_or_create_facts("catalog")
+        table.insert([{"a": 1, "b": "x", "c": [{"d": 2}, {"d": 3}]}])
+        expected = column_summary(container.ns.columns, "catalog")
+        db.close()
+
+        db = Sqlite(filename=self.filename)
+        pragmas = []
+        about = db.about
+        db.about = lambda table_name: pragmas.append(table_name) or about(table_name)
+        columns = ColumnList(db)
+        try:
+            self.assertEqual(pragmas, [])
+            self.assertEqual(column_summary(columns, "catalog"), expected)
+            self.assertEqual(list(columns._snowflakes["catalog"]), [["."], ["c", "."]])
+        finally:
+            db.close()
+
+    def test_unknown_table_is_scanned(self):
+        db = Sqlite(filename=self.filename)
+        Container(db=db)
+        with db.transaction() as t:
+            t.execute(sql_create("outside", {"_id": "TEXT", "v.$n": "REAL"}))
+            t.execute(sql_insert("outside", {"_id": "1", "v.$n": 2}))
+        db.close()
+
+        db = Sqlite(filename=self.filename)
+        try:
+            columns = ColumnList(db)
+            self.assertEqual(
+                [(c.es_column, c.name, c.jx_type) for c in columns.find("outside") if c.es_column == "v.$n"],
+                [("v.$n", "v", "number")]
+            )
+            # THE SCAN IS RECORDED, SO THE NEXT LOAD NEEDS NO PRAGMA
+            catalog = db.query(SQL("SELECT es_column FROM __columns__ WHERE es_index='outside' ORDER BY es_column"))
+            self.assertEqual([r[0] for r in catalog.data], ["_id", "v.$n"])
+        finally:
+            db.close()
+
+    def test_remove_facts(self):
+        db = Sqlite(filename=self.filename)
+        try:
+            container = Container(db=db)
+            container.get_or_create_facts("gone").insert([{"a": 1}])
+            container.remove_facts("gone")
+            catalog = db.query(SQL("SELECT COUNT(1) FROM __columns__ WHERE es_index='gone'"))
+            self.assertEqual(catalog.data[0][0], 0)
+        finally:
+            db.close()
@@ -0,0 +1,41 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_json import NUMBER, STRING
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+
+
+class TestColumnIndex(FuzzyTestCase):
+
+    def test_index_follows_schema(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("indexed")
+        table.insert([{"a": 1, "b": "x"}, {"a": "y", "b": "z"}])
+        snowflake = table.snowflake
+
+        a_number = snowflake.get_column("a", NUMBER)
+        self.assertEqual(a_number.es_column, "a.$n")
+        self.assertEqual(snowflake.get_column("a", STRING).es_column, "a.$s")
+        self.assertIsNone(snowflake.get_column("c", NUMBER))
+
+        snowflake._drop_column(a_number)
+        self.assertIsNone(snowflake.get_column("a", NUMBER))
+        self.assertEqual(snowflake.get_column("a", STRING).es_column, "a.$s")
+
+    def test_repeated_insert(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("indexed")
+        table.insert([{"a": 1, "b": "x"}])
+        table.insert([{"a": 2, "b": "y"}])
+        result = table.query({"select": ["a", "b"], "sort": "a", "format": "table"})
+        self.assertEqual(result.data, [[1, "x"], [2, "y"]])
@@ -0,0 +1,108 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import tempfile
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Till
+
+from jx_sqlite.container import Container
+from jx_sqlite.meta_columns import MAX_PARTITIONS
+from jx_sqlite.sqlite import Sqlite
+
+
+def stats(container, table, es_column):
+    columns = container.ns.columns
+    for c in columns.find(table):
+        if c.es_column == es_column:
+            return {
+                "count": c.count,
+                "cardinality": c.cardinality,
+                "partitions": columns.get_partitions(table, es_column),
+                "range": columns.get_range(table, es_column),
+            }
+
+
+class TestColumnStats(FuzzyTestCase):
+
+    def test_insert_keeps_stats(self):
+        container = Container(db={})
+        facts = container.get_or_create_facts("data")
+        facts.insert([{"a": i, "b": "x" + str(i % 3)} for i in range(10)])
+        facts.insert([{"a": 20, "n": [{"c": 1}, {"c": 2}, {}]}])
+
+        self.assertEqual(stats(container, "data", "a.$n"), {"count": 11, "cardinality": 11, "range": (0, 20)})
+        self.assertEqual(stats(container, "data", "b.$s"), {
+            "count": 10,
+            "cardinality": 3,
+            "partitions": ["x0", "x1", "x2"],
+            "range": ("x0", "x2"),
+        })
+        self.assertEqual(stats(container, "data.n", "n.c.$n"), {"count": 2, "partitions": [1, 2], "range": (1, 2)})
+
+    def test_typed_insert_keeps_stats(self):
+        container = Container(db={})
+        container.load(['{"a": ' + str(i) + '}' for i in range(7)], "data", chunk_size=3)
+        self.assertEqual(stats(container, "data", "a.$n"), {"count": 7, "cardinality": 7, "range": (0, 6)})
+
+    def test_too_many_partitions(self):
+        container = Container(db={})
+        facts = container.get_or_create_facts("data")
+        facts.insert([{"a": i} for i in range(MAX_PARTITIONS + 1)])
+        result = stats(container, "data", "a.$n")
+        self.assertEqual(result["cardinality"], MAX_PARTITIONS + 1)
+        self.assertIsNone(result["partitions"])
+
+    def test_refresh_after_delete(self):
+        container = Container(db={})
+        facts = container.get_or_create_facts("data")
+        facts.insert([{"a": i, "b": "x" + str(i % 3)} for i in range(10)])
+        facts.delete({"gte": {"a": 5}})
+        self.assertEqual(stats(container, "data", "a.$n")["count"], 10)  # DELETES ARE NOT SEEN
+
+        container.ns.columns.refresh_stats("data")
+        self.assertEqual(stats(container, "data", "a.$n"), {"count": 5, "cardinality": 5, "partitions": [0, 1, 2, 3, 4], "range": (0, 4)})
+
+    def test_stats_are_saved(self):
+        handle, filename = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        try:
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            container.get_or_create_facts("data").insert([{"b": "x" + str(i % 3)} for i in range(10)])
+            db.close()
+
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            self.assertEqual(stats(container, "data", "b.$s"), {"count": 10, "cardinality": 3, "partitions": ["x0", "x1", "x2"]})
+            container.get_or_create_facts("data").insert([{"b": "x3"}])
+            self.assertEqual(stats(container, "data", "b.$s"), {"count": 11, "cardinality": 4, "partitions": ["x0", "x1", "x2", "x3"]})
+            db.close()
+        finally:
+            os.remove(filename)
+
+    def test_background_refresh(self):
+        container = Container(db={}, stats_period=0.1)
+        try:
+            facts = container.get_or_create_facts("data")
+            facts.insert([{"a": i} for i in range(10)])
+            with container.db.transaction() as t:
+                t.execute(SQL('DELETE FROM data WHERE "a.$n" < 5'))
+            container.ns.changed("data")
+
+            timeout = Till(seconds=10)
+            while stats(container, "data", "a.$n")["count"] != 5 and not timeout:
+                Till(seconds=0.1).wait()
+            self.assertEqual(stats(container, "data", "a.$n"), {"count": 5, "range": (5, 9)})
+        finally:
+            container.stats_thread.stop()
@@ -0,0 +1,47 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+
+
+def count(db, table):
+    return db.query(SQL('SELECT COUNT(1) FROM "' + table + '"')).data[0][0]
+
+
+class TestDelete(FuzzyTestCase):
+
+    def test_cascade(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("docs")
+        table.insert([{"a": i, "n": [{"b": i, "m": [{"c": i}, {"c": -i}]}]} for i in range(4)])
+
+        table.delete({"lt": {"a": 2}})
+
+        db = container.db
+        self.assertEqual([count(db, t) for t in ["docs", "docs.n", "docs.n.m"]], [2, 2, 4])
+        result = db.query(SQL('SELECT DISTINCT "n.b.$n" FROM "docs.n" ORDER BY 1'))
+        self.assertEqual([r[0] for r in result.data], [2, 3])
+
+    def test_remove_orphans(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("docs")
+        table.insert([{"a": i, "n": [{"b": i, "m": [{"c": i}]}]} for i in range(4)])
+        db = container.db
+        with db.transaction() as t:
+            # THE OLD, NON-CASCADING, DELETE
+            t.execute(SQL('DELETE FROM docs WHERE "a.$n" < 3'))
+
+        self.assertEqual(table.remove_orphans(), 6)
+        self.assertEqual([count(db, t) for t in ["docs", "docs.n", "docs.n.m"]], [1, 1, 1])
+        self.assertEqual(table.remove_orphans(), 0)
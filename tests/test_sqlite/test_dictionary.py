@@ -0,0 +1,152 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import tempfile
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+from jx_sqlite.dictionary import DICTIONARY_TYPE
+from jx_sqlite.sqlite import Sqlite
+
+DOCS = [{"a": i, "b": "x" + str(i % 3) if i % 4 else None, "c": "" if i == 5 else "y"} for i in range(12)]
+
+QUERIES = [
+    {"select": "a", "where": {"eq": {"b": "x1"}}},
+    {"select": "a", "where": {"ne": {"b": "x1"}}},
+    {"select": "a", "where": {"in": {"b": ["x0", "x2", "z"]}}},
+    {"select": "a", "where": {"prefix": {"b": "x"}}},
+    {"select": "a", "where": {"missing": "b"}},
+    {"select": "a", "where": {"exists": "c"}},
+    {"select": "a", "where": {"eq": {"b": "none"}}},
+    {"select": ["a", "b"], "where": {"gt": {"a": 6}}},
+    {"select": {"aggregate": "count"}, "groupby": "b"},
+    {"select": {"value": "a", "aggregate": "sum"}, "groupby": ["b", "c"]},
+]
+
+
+class TestDictionary(FuzzyTestCase):
+
+    def test_queries_do_not_change(self):
+        plain = Container(db={})
+        plain.get_or_create_facts("data").insert(DOCS)
+        encoded = Container(db={})
+        facts = encoded.get_or_create_facts("data")
+        facts.insert(DOCS[:6])
+        facts.dictionary_encode("b")
+        facts.dictionary_encode("c")
+        facts.insert(DOCS[6:])
+
+        for c in encoded.ns.columns.find("data"):
+            if c.name in ("b", "c"):
+                self.assertEqual(c.es_type, DICTIONARY_TYPE)
+        self.assertEqual(
+            encoded.db.query(SQL('SELECT value FROM "__dictionary__.data.b.$s" ORDER BY code')).data,
+            [("x0",), ("x1",), ("x2",)]
+        )
+
+        for query in QUERIES:
+            query = dict(query, format="list", limit=100)
+            if "groupby" not in query:
+                query["sort"] = "a"
+            expected = plain.get_table("data").query(query).data
+            self.assertEqual(encoded.get_table("data").query(query).data, expected)
+
+    def test_edges_and_groupby_order(self):
+        results = []
+        for encode in [False, True]:
+            container = Container(db={})
+            facts = container.get_or_create_facts("data")
+            if encode:
+                facts.dictionary_encode("p")
+            for i, p in enumerate(["x", "b", "m", "x", "z", "a", None]):
+                # ONE AT A TIME, SO THE CODES ARE NOT IN THE ORDER OF THE VALUES
+                facts.insert([{"p": p, "a": i}])
+            table = container.get_table("data")
+            results.append([
+                table.query({"select": {"aggregate": "count"}, "edges": ["p"], "format": "list"}).data,
+                table.query({"select": {"aggregate": "count"}, "groupby": ["p"], "format": "list"}).data,
+            ])
+        plain, encoded = results
+        self.assertEqual(plain[0], [
+            {"p": "a", "count": 1},
+            {"p": "b", "count": 1},
+            {"p": "m", "count": 1},
+            {"p": "x", "count": 2},
+            {"p": "z", "count": 1},
+            {"count": 1},
+        ])
+        self.assertEqual(encoded, plain)
+        self.assertEqual([r["p"] for r in encoded[1]], [None, "a", "b", "m", "x", "z"])
+
+    def test_updates(self):
+        container = Container(db={})
+        facts = container.get_or_create_facts("data")
+        facts.dictionary_encode("b")
+        facts.insert([{"_id": "k" + str(i), "b": "x" + str(i)} for i in range(3)])
+        facts.upsert([{"_id": "k1", "b": "new"}, {"_id": "k3", "b": "x0"}])
+        facts.update_many([{"_id": "k2", "set": {"b": "newer"}}])
+
+        result = container.get_table("data").query({"select": ["_id", "b"], "sort": "_id", "format": "list"})
+        self.assertEqual(result.data, [
+            {"_id": "k0", "b": "x0"},
+            {"_id": "k1", "b": "new"},
+            {"_id": "k2", "b": "newer"},
+            {"_id": "k3", "b": "x0"},
+        ])
+
+        container.ns.columns.refresh_stats("data")
+        self.assertEqual(container.ns.columns.get_partitions("data", "b.$s"), ["new", "newer", "x0"])
+
+    def test_nested(self):
+        container = Container(db={})
+        facts = container.get_or_create_facts("data")
+        facts.insert([{"a": i, "n": [{"s": "p" + str(i % 2)}, {"s": "q"}]} for i in range(3)])
+        facts.dictionary_encode("n.s")
+        facts.insert([{"a": 3, "n": [{"s": "r"}]}])
+
+        result = container.db.query(SQL(
+            'SELECT p."a.$n", c.__order__, d.value FROM "data.n" c'
+            ' JOIN data p ON p.__id__ = c.__parent__'
+            ' JOIN "__dictionary__.data.n.n.s.$s" d ON d.code = c."n.s.$s"'
+            ' ORDER BY 1, 2'
+        ))
+        self.assertEqual(result.data, [
+            (0, 0, "p0"), (0, 1, "q"),
+            (1, 0, "p1"), (1, 1, "q"),
+            (2, 0, "p0"), (2, 1, "q"),
+            (3, 0, "r"),
+        ])
+
+    def test_reopen(self):
+        handle, filename = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        try:
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            facts = container.get_or_create_facts("data")
+            facts.dictionary_encode("b")
+            facts.insert([{"b": "x" + str(i % 2)} for i in range(4)])
+            db.close()
+
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            container.get_or_create_facts("data").insert([{"b": "x2"}])
+            result = container.get_table("data").query({"select": "b", "sort": "b", "format": "list"})
+            self.assertEqual(result.data, ["x0", "x0", "x1", "x1", "x2"])
+
+            container.remove_facts("data")
+            self.assertEqual(db.query(SQL("SELECT name FROM sqlite_master WHERE name LIKE '__dictionary__%'")).data, [])
+            db.close()
+        finally:
+            os.remove(filename)
@@ -0,0 +1,68 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_files import TempDirectory
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Thread
+
+from jx_sqlite.sqlite import Sqlite, sql_create, sql_insert
+
+
+class TestGroupCommit(FuzzyTestCase):
+
+    def test_transactions_share_commit(self):
+        with TempDirectory() as temp:
+            db = Sqlite(filename=(temp / "test.sqlite").abspath, group_commit=0.5)
+            try:
+                with db.transaction() as t:
+                    t.execute(sql_create("data", {"value": "INTEGER"}))
+
+                statements = []
+                db.db.set_trace_callback(statements.append)
+
+                def writer(value, please_stop):
+                    with db.transaction() as t:
+                        t.execute(sql_insert("data", {"value": value}))
+
+                threads = [Thread.run("writer " + str(i), writer, i) for i in range(10)]
+                for thread in threads:
+                    thread.join()
+                db.db.set_trace_callback(None)
+
+                # ALL TEN START WELL WITHIN ONE 0.5s WINDOW
+                self.assertLessEqual(statements.count("COMMIT"), 2)
+                self.assertEqual(db.query("SELECT COUNT(1) FROM data").data[0][0], 10)
+            finally:
+                db.close()
+
+    def test_failure_is_isolated(self):
+        db = Sqlite(group_commit=0.5)
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"value": "INTEGER"}))
+
+            def good(please_stop):
+                with db.transaction() as t:
+                    t.execute(sql_insert("data", {"value": 1}))
+
+            def bad(please_stop):
+                with db.transaction() as t:
+                    t.execute(sql_insert("data", {"value": 2}))
+                    t.execute("INSERT INTO missing VALUES (1)")
+
+            first = Thread.run("good", good)
+            second = Thread.run("bad", bad)
+            first.join()
+            self.assertRaises("no such table", second.join)
+
+            self.assertEqual(db.query("SELECT value FROM data").data, [(1,)])
+        finally:
+            db.close()
@@ -0,0 +1,147 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import tempfile
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite import container as container_module
+from jx_sqlite.container import Container
+from jx_sqlite.guid import bind_guid, quote_guid
+from jx_sqlite.sqlite import Sqlite
+
+GUID = "0a1b2c3d-0000-4000-8000-00000000000a"
+
+
+class TestGuid(FuzzyTestCase):
+
+    def test_only_guids_are_binary(self):
+        self.assertEqual(bind_guid(GUID), b"\x0a\x1b\x2c\x3d\x00\x00\x40\x00\x80\x00\x00\x00\x00\x00\x00\x0a")
+        self.assertEqual(quote_guid(GUID).sql, "X'0a1b2c3d00004000800000000000000a'")
+        for value in [GUID.upper(), GUID + "\n", "k1", ""]:
+            self.assertEqual(bind_guid(value), value)
+
+    def test_stored_as_blob(self):
+        container = Container(db={})
+        facts = container.get_or_create_facts("data")
+        facts.insert([{"a": i} for i in range(3)] + [{"_id": GUID, "a": 3}, {"_id": "k4", "a": 4}])
+
+        result = container.db.query(SQL('SELECT TYPEOF(_id), LENGTH(_id) FROM data ORDER BY "a.$n"'))
+        self.assertEqual(result.data, [("blob", 16)] * 4 + [("text", 2)])
+
+        result = container.get_table("data").query({"select": ["_id", "a"], "sort": "a", "format": "list"})
+        self.assertEqual(result.data[3:], [{"_id": GUID, "a": 3}, {"_id": "k4", "a": 4}])
+        self.assertEqual(len(set(r["_id"] for r in result.data)), 5)
+
+    def test_lookup(self):
+        container = Container(db={})
+        container.get_or_create_facts("data").insert([{"a": i} for i in range(3)] + [{"_id": GUID, "a": 3}, {"_id": "k4", "a": 4}])
+        table = container.get_table("data")
+
+        for where, expected in [
+            ({"eq": {"_id": GUID}}, [3]),
+            ({"eq": {"_id": "k4"}}, [4]),
+            ({"eq": {"_id": GUID.upper()}}, []),
+            ({"in": {"_id": [GUID, "k4", "k5"]}}, [3, 4]),
+            ({"prefix": {"_id": GUID[:8]}}, [3]),
+            ({"missing": "_id"}, []),
+        ]:
+            result = table.query({"select": "a", "where": where, "sort": "a", "format": "list"})
+            self.assertEqual(result.data, expected)
+
+        plan = container.db.query(SQL("EXPLAIN QUERY PLAN SELECT * FROM data WHERE _id = X'00'")).data
+        self.assertIn("USING INDEX", plan[0][-1])
+
+    def test_edges(self):
+        container = Container(db={})
+        container.get_or_create_facts("data").insert([{"a": i} for i in range(3)] + [{"_id": GUID, "a": 3}, {"_id": "k4", "a": 4}])
+        table = container.get_table("data")
+        ids = table.query({"select": "_id", "format": "list"}).data
+
+        result = table.query({"select": {"aggregate": "count"}, "edges": ["_id"], "format": "list"})
+        self.assertEqual(sorted(r["_id"] for r in result.data if r["_id"] != None), sorted(ids))
+        for r in result.data:
+            self.assertEqual(r["count"], 0 if r["_id"] == None else 1)
+
+        result = table.query({"select": {"aggregate": "count"}, "groupby": ["_id"], "format": "list"})
+        self.assertEqual([r["_id"] for r in result.data], sorted(ids))
+
+    def test_unique(self):
+        container = Container(db={})
+        facts = container.get_or_create_facts("data")
+        facts.insert([{"_id": GUID, "a": 1}])
+        self.assertRaises("UNIQUE constraint failed", facts.insert, [{"_id": GUID, "a": 2}])
+
+        facts.upsert([{"_id": GUID, "a": 3}])
+        facts.update_many([{"_id": GUID, "set": {"b": "x"}}])
+        result = container.get_table("data").query({"select": ["_id", "a", "b"], "format": "list"})
+        self.assertEqual(result.data, [{"_id": GUID, "a": 3, "b": "x"}])
+
+    def test_text_guids_are_converted(self):
+        handle, filename = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        try:
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            container.get_or_create_facts("data").insert([{"a": 1}, {"_id": "k2", "a": 2}])
+            with db.transaction() as t:
+                # AS MADE BEFORE GUIDS WERE BINARY
+                t.execute(SQL('DROP INDEX "data._id.unique"'))
+                t.execute(SQL("UPDATE data SET _id='" + GUID + "' WHERE TYPEOF(_id)='blob'"))
+            db.close()
+
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            result = db.query(SQL('SELECT TYPEOF(_id) FROM data ORDER BY "a.$n"'))
+            self.assertEqual(result.data, [("blob",), ("text",)])
+            result = container.get_table("data").query({"select": "a", "where": {"eq": {"_id": GUID}}, "format": "list"})
+            self.assertEqual(result.data, [1])
+            result = db.query(SQL("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='data'"))
+            self.assertIn(("data._id.unique",), result.data)
+            db.close()
+        finally:
+            os.remove(filename)
+
+    def test_duplicate_text_guids(self):
+        handle, filename = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        batch = container_module.REBUILD_BATCH
+        try:
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            container.get_or_create_facts("data").insert([{"a": i} for i in range(5)])
+            with db.transaction() as t:
+                t.execute(SQL('DROP INDEX "data._id.unique"'))
+                t.execute(SQL("UPDATE data SET _id='" + GUID + "'"))
+            db.close()
+
+            container_module.REBUILD_BATCH = 2
+            db = Sqlite(filename=filename)
+            Container(db=db)
+            # THE GUIDS ARE CONVERTED, BUT CAN NOT BE INDEXED
+            self.assertEqual(db.query(SQL("SELECT COUNT(1) FROM data WHERE TYPEOF(_id)<>'blob'")).data, [(0,)])
+            self.assertEqual(db.query(SQL("SELECT name FROM sqlite_master WHERE name='data._id.unique'")).data, [])
+            self.assertEqual(db.query(SQL('SELECT name FROM "__unindexed__"')).data, [("data",)])
+            db.close()
+
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            result = container.get_table("data").query({"select": "a", "where": {"eq": {"_id": GUID}}, "sort": "a", "format": "list"})
+            self.assertEqual(result.data, [0, 1, 2, 3, 4])
+
+            container.remove_facts("data")
+            self.assertEqual(db.query(SQL('SELECT name FROM "__unindexed__"')).data, [])
+            db.close()
+        finally:
+            container_module.REBUILD_BATCH = batch
+            os.remove(filename)
@@ -0,0 +1,66 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+
+ADVISED = SQL("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE '%.__advised__' ORDER BY name")
+
+
+class TestIndexAdvisor(FuzzyTestCase):
+
+    def setUp(self):
+        self.container = Container(db={})
+        self.table = self.container.get_or_create_facts("docs")
+        self.table.insert([{"a": i % 10, "b": str(i), "c": i} for i in range(100)])
+        self.advisor = self.container.advisor
+        self.advisor.min_seconds = 0
+
+    def test_advise_and_apply(self):
+        for i in range(3):
+            self.table.query({"where": {"eq": {"a": i}}, "sort": "b", "format": "list"})
+
+        report = self.advisor.advise()
+        self.assertEqual(
+            [(r.action, r.columns) for r in report],
+            [("add", ["a.$n", "b.$s"])]  # THE COMPOSITE ALSO COVERS (a.$n)
+        )
+        self.assertIn("3 queries", report[0].reason)
+
+        self.advisor.apply(report)
+        self.assertEqual([r[0] for r in self.container.db.query(ADVISED).data], ["docs.a.$n.b.$s.__advised__"])
+        self.assertEqual(self.advisor.advise(), [])
+
+    def test_drop_unused(self):
+        self.table.query({"where": {"eq": {"a": 1}}, "format": "list"})
+        self.advisor.apply()
+        self.assertEqual([r[0] for r in self.container.db.query(ADVISED).data], ["docs.a.$n.__advised__"])
+
+        self.advisor.period = 2
+        for _ in range(2):
+            self.table.query({"where": {"eq": {"c": 1}}, "format": "list"})
+        report = self.advisor.advise()
+        self.assertEqual(
+            [(r.action, r.index) for r in report],
+            [("add", "docs.c.$n.__advised__"), ("drop", "docs.a.$n.__advised__")]
+        )
+        self.advisor.apply(report)
+        self.assertEqual([r[0] for r in self.container.db.query(ADVISED).data], ["docs.c.$n.__advised__"])
+
+    def test_auto(self):
+        self.advisor.auto = True
+        self.advisor.period = 5
+        for i in range(5):
+            self.table.query({"where": {"gt": {"c": i}}, "format": "list"})
+        self.assertEqual([r[0] for r in self.container.db.query(ADVISED).data], ["docs.c.$n.__advised__"])
+        self.assertEqual(self.advisor.num_queries, 0)
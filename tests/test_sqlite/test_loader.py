@@ -0,0 +1,100 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import gzip
+import os
+import tempfile
+
+from mo_json import value2json
+from mo_json.typed_encoder import encode
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+from jx_sqlite.loader import chunks
+
+
+class TestLoader(FuzzyTestCase):
+
+    def test_chunks(self):
+        self.assertEqual(list(chunks(iter(range(7)), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_load_gzip(self):
+        handle, filename = tempfile.mkstemp(suffix=".json.gz")
+        os.close(handle)
+        try:
+            with gzip.open(filename, "wb") as f:
+                for i in range(25):
+                    f.write((value2json({"a": i, "b": "x" + str(i % 3)}) + "\n").encode("utf8"))
+
+            container = Container(db={})
+            self.assertEqual(container.load(filename, "loaded", chunk_size=10), 25)
+
+            result = container.get_table("loaded").query({
+                "select": {"value": "a", "aggregate": "sum"},
+                "groupby": "b",
+                "format": "list"
+            })
+            self.assertEqual(result.data, [{"b": "x0", "a": 108}, {"b": "x1", "a": 92}, {"b": "x2", "a": 100}])
+        finally:
+            os.remove(filename)
+
+    def test_load_lines(self):
+        container = Container(db={})
+        self.assertEqual(container.load([b'{"a": 1}\n', "\n", '{"a": 2}'], "lines"), 2)
+        result = container.get_table("lines").query({"select": "a", "sort": "a", "format": "list"})
+        self.assertEqual(result.data, [1, 2])
+
+    def test_parallel_matches_serial(self):
+        lines = []
+        for i in range(200):
+            doc = {"a": i, "b": "x" + str(i % 3) if i % 7 else i}
+            if i % 5 == 0:
+                doc["n"] = [{"c": i}, {"c": i + 1}]
+            lines.append(value2json(doc))
+
+        serial = Container(db={})
+        self.assertEqual(serial.load(lines, "docs", chunk_size=30), 200)
+        parallel = Container(db={})
+        self.assertEqual(parallel.load(lines, "docs", chunk_size=30, processes=2), 200)
+
+        for sql in [
+            'SELECT "a.$n", "b.$s", "b.$n" FROM docs',
+            'SELECT p."a.$n", c.__order__, c."n.c.$n" FROM "docs.n" c JOIN docs p ON p.__id__ = c.__parent__',
+        ]:
+            expected = sorted(serial.db.query(SQL(sql)).data)
+            self.assertEqual(sorted(parallel.db.query(SQL(sql)).data), expected)
+            self.assertGreater(len(expected), 0)
+
+    def test_typed_matches_untyped(self):
+        docs = []
+        for i in range(50):
+            doc = {"a": i, "b": "x" + str(i % 3) if i % 7 else i, "o": {"t": i % 2 == 0}}
+            if i % 5 == 0:
+                doc["n"] = [{"c": i}, {"c": i + 1, "m": [i, -i]}]
+            docs.append(doc)
+
+        untyped = Container(db={})
+        untyped.get_or_create_facts("docs").insert(docs)
+        typed = Container(db={})
+        typed.get_or_create_facts("docs").insert_typed([encode(d) for d in docs])
+        loaded = Container(db={})
+        self.assertEqual(loaded.load([encode(d) for d in docs], "docs", chunk_size=20, processes=2, typed=True), 50)
+
+        for sql in [
+            'SELECT "a.$n", "b.$s", "b.$n", "o.t.$b" FROM docs',
+            'SELECT p."a.$n", c.__order__, c."n.c.$n" FROM "docs.n" c JOIN docs p ON p.__id__ = c.__parent__',
+            'SELECT p."n.c.$n", c.__order__, c."n.m.$n" FROM "docs.n.m" c JOIN "docs.n" p ON p.__id__ = c.__parent__',
+        ]:
+            expected = sorted(untyped.db.query(SQL(sql)).data)
+            self.assertGreater(len(expected), 0)
+            self.assertEqual(sorted(typed.db.query(SQL(sql)).data), expected)
+            self.assertEqual(sorted(loaded.db.query(SQL(sql)).data), expected)
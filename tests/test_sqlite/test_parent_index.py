@@ -0,0 +1,51 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import tempfile
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+from jx_sqlite.sqlite import Sqlite
+
+INDEXES = SQL("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE '%.__parent__' ORDER BY name")
+
+
+class TestParentIndex(FuzzyTestCase):
+
+    def test_join_uses_index(self):
+        container = Container(db={})
+        container.get_or_create_facts("docs").insert([{"a": 1, "n": [{"b": 1, "m": [{"c": 1}]}]}])
+        db = container.db
+        self.assertEqual([r[0] for r in db.query(INDEXES).data], ["docs.n.__parent__", "docs.n.m.__parent__"])
+
+        plan = db.query(SQL('EXPLAIN QUERY PLAN SELECT * FROM docs p LEFT JOIN "docs.n" c ON c.__parent__=p.__id__')).data
+        self.assertIn("USING INDEX docs.n.__parent__", " ".join(r[-1] for r in plan))
+
+    def test_migrate(self):
+        handle, filename = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        try:
+            db = Sqlite(filename=filename)
+            Container(db=db).get_or_create_facts("docs").insert([{"n": [{"b": 1}, {"b": 2}]}])
+            with db.transaction() as t:
+                # AS MADE BEFORE THE INDEX EXISTED
+                t.execute(SQL('DROP INDEX "docs.n.__parent__"'))
+            db.close()
+
+            db = Sqlite(filename=filename)
+            Container(db=db)
+            self.assertEqual([r[0] for r in db.query(INDEXES).data], ["docs.n.__parent__"])
+            db.close()
+        finally:
+            os.remove(filename)
@@ -0,0 +1,59 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_files import TempDirectory
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Thread
+
+from jx_sqlite.sqlite import Sqlite, sql_create, sql_insert
+
+
+class TestReadPool(FuzzyTestCase):
+
+    def test_wal_mode(self):
+        with TempDirectory() as temp:
+            db = Sqlite(filename=(temp / "test.sqlite").abspath, read_pool_size=2)
+            try:
+                self.assertEqual(db.query("PRAGMA journal_mode").data[0][0], "wal")
+                self.assertEqual(len(db.readers), 2)
+            finally:
+                db.close()
+
+    def test_read_during_transaction(self):
+        with TempDirectory() as temp:
+            db = Sqlite(filename=(temp / "test.sqlite").abspath, read_pool_size=2)
+            try:
+                with db.transaction() as t:
+                    t.execute(sql_create("data", {"value": "INTEGER"}))
+
+                counts = []
+
+                def reader(please_stop):
+                    counts.append(db.query("SELECT COUNT(1) FROM data").data[0][0])
+
+                with db.transaction() as t:
+                    t.execute(sql_insert("data", [{"value": i} for i in range(10)]))
+                    t.query("SELECT 1")  # ENSURE TRANSACTION HAS STARTED
+                    # WITHOUT THE READ POOL THIS READ WOULD WAIT FOR THE COMMIT
+                    Thread.run("reader", reader).join()
+
+                Thread.run("reader", reader).join()
+                self.assertEqual(counts, [0, 10])
+            finally:
+                db.close()
+
+    def test_memory_has_no_pool(self):
+        db = Sqlite(read_pool_size=2)
+        try:
+            self.assertEqual(db.readers, [])
+            self.assertEqual(db.query("SELECT 1").data[0][0], 1)
+        finally:
+            db.close()
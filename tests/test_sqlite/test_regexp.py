@@ -0,0 +1,64 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import re
+
+from mo_future import text
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+from jx_sqlite.expressions.reg_exp_op import regex_to_sql
+from jx_sqlite.sqlite import Sqlite, quote_column, sql_create, sql_insert
+
+VALUES = ["", "a", "ab", "abc", "abd", "abc\nd", "a*c", "a.c", "b", "ba", "bab", "xyz", "abÿ", "abĀ"]
+
+
+class TestRegExp(FuzzyTestCase):
+
+    def test_rewrites_match_regex(self):
+        db = Sqlite()
+        db.create_new_functions()
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"v": "TEXT"}))
+                t.execute(sql_insert("data", [{"v": v} for v in VALUES]))
+
+            for pattern, rewritten in [
+                ("abc", True),
+                ("^abc", True),
+                ("ab.*", True),
+                (".*", True),
+                ("a.c", True),
+                ("a\\*c", True),
+                (".*b", True),
+                ("ab[cd]", False),
+                ("ab?c", False),
+                ("a|b", False),
+                ("b.+", False),
+            ]:
+                sql = regex_to_sql(quote_column("v"), pattern)
+                self.assertEqual("REGEXP" not in text(sql), rewritten, pattern)
+                result = db.query("SELECT v FROM data WHERE " + sql + " ORDER BY v")
+                expected = sorted(v for v in VALUES if re.match("(?s)(?:" + pattern + ")\\Z", v))
+                self.assertEqual([r[0] for r in result.data], expected, pattern)
+        finally:
+            db.close()
+
+    def test_query(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("regexp")
+        table.insert([{"v": v} for v in ["abba", "aaba", "aa", "ab", "ba", "b"]])
+
+        result = table.query({"select": "v", "where": {"regexp": {"v": ".*b.*"}}, "sort": "v", "format": "list"})
+        self.assertEqual(result.data, ["aaba", "ab", "abba", "b", "ba"])
+
+        result = table.query({"select": "v", "where": {"regexp": {"v": "a.*"}}, "sort": "v", "format": "list"})
+        self.assertEqual(result.data, ["aa", "aaba", "ab", "abba"])
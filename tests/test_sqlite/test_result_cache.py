@@ -0,0 +1,81 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Till
+
+from jx_sqlite.container import Container
+from jx_sqlite.result_cache import ResultCache
+
+QUERY = {"select": {"value": "a", "aggregate": "sum"}, "edges": ["b"], "format": "table"}
+
+
+class TestResultCache(FuzzyTestCase):
+
+    def test_repeat_query_is_cached(self):
+        container = Container(db={}, cache_size=10)
+        table = container.get_or_create_facts("cached")
+        table.insert([{"a": 1, "b": "x"}, {"a": 2, "b": "y"}])
+
+        first = table.query(dict(QUERY))
+        second = table.query(dict(QUERY))
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(container.cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_changed_result_is_not_cached(self):
+        container = Container(db={}, cache_size=10)
+        table = container.get_or_create_facts("cached")
+        table.insert([{"a": 1}, {"a": 2}])
+        query = {"select": "a", "sort": "a", "format": "list"}
+
+        first = table.query(dict(query))
+        first.data.append({"a": 99})
+        second = table.query(dict(query))
+        self.assertIsNot(second, first)
+        self.assertEqual(len(second.data), 2)
+        second.data.append({"a": 99})
+        third = table.query(dict(query))
+        self.assertEqual(len(third.data), 2)
+        self.assertEqual(container.cache.stats(), {"hits": 2, "misses": 1})
+
+    def test_insert_invalidates(self):
+        container = Container(db={}, cache_size=10)
+        table = container.get_or_create_facts("cached")
+        table.insert([{"a": 1, "b": "x"}])
+        self.assertEqual(table.query(dict(QUERY)).data, [["x", 1], [None, None]])
+
+        table.insert([{"a": 2, "b": "x"}])
+        self.assertEqual(table.query(dict(QUERY)).data, [["x", 3], [None, None]])
+
+        table.delete({"eq": {"a": 1}})
+        self.assertEqual(table.query(dict(QUERY)).data, [["x", 2], [None, None]])
+        self.assertEqual(container.cache.stats().hits, 0)
+
+    def test_no_cache_by_default(self):
+        container = Container(db={})
+        self.assertIsNone(container.cache)
+
+    def test_eviction(self):
+        cache = ResultCache(size=2)
+        cache.add("a", 1, "A")
+        cache.add("b", 1, "B")
+        cache.get("a", 1)
+        cache.add("c", 1, "C")  # b IS LEAST RECENTLY USED
+        self.assertEqual([cache.get(k, 1) for k in "abc"], ["A", None, "C"])
+        self.assertEqual(cache.get("a", 2), None)  # WRONG VERSION IS DROPPED
+        self.assertEqual(cache.stats(), {"size": 1, "evictions": 1})
+
+    def test_ttl(self):
+        cache = ResultCache(size=2, ttl=0.1)
+        cache.add("a", 1, "A")
+        self.assertEqual(cache.get("a", 1), "A")
+        Till(seconds=0.2).wait()
+        self.assertEqual(cache.get("a", 1), None)
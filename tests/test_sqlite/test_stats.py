@@ -0,0 +1,53 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.sqlite import Sqlite, sql_create, sql_insert
+from jx_sqlite.stats import statement_shape
+
+
+class TestStats(FuzzyTestCase):
+
+    def test_statement_shape(self):
+        self.assertEqual(
+            statement_shape("SELECT  \"a.$number\" FROM t WHERE b = 'it''s' AND c IN (1, 2.5, -3)"),
+            "SELECT \"a.$number\" FROM t WHERE b = ? AND c IN (?, ...)"
+        )
+
+    def test_disabled(self):
+        db = Sqlite()
+        try:
+            db.query("SELECT 1")
+            self.assertEqual(db.stats().statements, [])
+        finally:
+            db.close()
+
+    def test_collect(self):
+        db = Sqlite(stats=True, trace_sample=1)
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"value": "INTEGER"}))
+                t.execute(sql_insert("data", [{"value": i} for i in range(10)]))
+            for i in range(3):
+                db.query("SELECT value FROM data WHERE value < " + str(i + 5))
+
+            stats = db.stats(clear=True)
+            select = [s for s in stats.statements if s.shape == "SELECT value FROM data WHERE value < ?"][0]
+            self.assertEqual(select.latency.count, 3)
+            self.assertEqual(select.rows, 5 + 6 + 7)
+            self.assertTrue(select.trace)
+            self.assertEqual(stats.transactions.count, 1)
+            self.assertGreaterEqual(stats.queue_wait.count, 3)
+
+            self.assertEqual(db.stats().statements, [])
+        finally:
+            db.close()
@@ -0,0 +1,102 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_files import TempDirectory
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+from jx_sqlite.sqlite import Sqlite, sql_create, sql_insert
+
+
+class TestStream(FuzzyTestCase):
+
+    def test_query_iter_chunks(self):
+        db = Sqlite()
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"value": "INTEGER"}))
+                t.execute(sql_insert("data", [{"value": i} for i in range(25)]))
+
+            chunks = list(db.query_iter("SELECT value FROM data ORDER BY value", chunk_size=10))
+            self.assertEqual([len(c) for c in chunks], [10, 10, 5])
+            self.assertEqual([r[0] for c in chunks for r in c], list(range(25)))
+        finally:
+            db.close()
+
+    def test_query_iter_stop_early(self):
+        db = Sqlite()
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"value": "INTEGER"}))
+                t.execute(sql_insert("data", [{"value": i} for i in range(25)]))
+
+            stream = db.query_iter("SELECT value FROM data ORDER BY value", chunk_size=10)
+            self.assertEqual(len(next(stream)), 10)
+            stream.close()
+
+            # DATABASE IS STILL USABLE
+            with db.transaction() as t:
+                t.execute(sql_insert("data", {"value": 100}))
+            self.assertEqual(db.query("SELECT COUNT(1) FROM data").data[0][0], 26)
+        finally:
+            db.close()
+
+    def test_stream_documents(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("stream")
+        table.insert([{"a": i, "b": {"c": "x" + str(i)}} for i in range(7)])
+
+        chunks = list(table.query({"select": ["a", "b.c"], "sort": "a", "limit": 100}, stream=True))
+        docs = [d for c in chunks for d in c]
+        self.assertAlmostEqual(
+            docs,
+            [{"a": i, "b.c": "x" + str(i)} for i in range(7)]
+        )
+
+    def test_file_stream_is_snapshot(self):
+        with TempDirectory() as temp:
+            db = Sqlite(filename=(temp / "test.sqlite").abspath, read_pool_size=2)
+            try:
+                with db.transaction() as t:
+                    t.execute(sql_create("data", {"value": "INTEGER"}))
+                    t.execute(sql_insert("data", [{"value": i} for i in range(30)]))
+
+                stream = db.query_iter("SELECT value FROM data", chunk_size=10)
+                rows = list(next(stream))
+                # THE WRITER IS FREE WHILE THE STREAM IS OPEN
+                with db.transaction() as t:
+                    t.execute(sql_insert("data", [{"value": 1000 + i} for i in range(30)]))
+                rows.extend(r for c in stream for r in c)
+
+                self.assertEqual(len(rows), 30)
+                self.assertEqual(sorted(r[0] for r in rows), list(range(30)))
+                self.assertEqual(db.query("SELECT COUNT(1) FROM data").data[0][0], 60)
+            finally:
+                db.close()
+
+    def test_memory_stream_sees_later_commits(self):
+        # AN IN-MEMORY DATABASE STREAMS ON THE WRITER, SO IT IS NOT A SNAPSHOT
+        db = Sqlite()
+        try:
+            with db.transaction() as t:
+                t.execute(sql_create("data", {"value": "INTEGER"}))
+                t.execute(sql_insert("data", [{"value": i} for i in range(30)]))
+
+            stream = db.query_iter("SELECT value FROM data", chunk_size=10)
+            rows = list(next(stream))
+            with db.transaction() as t:
+                t.execute(sql_insert("data", [{"value": 1000 + i} for i in range(30)]))
+            rows.extend(r for c in stream for r in c)
+
+            self.assertEqual(len(rows), 60)
+            self.assertEqual(sorted(r[0] for r in rows), list(range(30)) + [1000 + i for i in range(30)])
+        finally:
+            db.close()
@@ -0,0 +1,56 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import tempfile
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import MIN_UID_BLOCK, Container
+from jx_sqlite.sqlite import Sqlite
+
+
+class TestUids(FuzzyTestCase):
+
+    def test_blocks_grow(self):
+        container = Container(db=Sqlite(stats=True))
+        container.db.stats(clear=True)
+
+        uids = [container.next_uid() for _ in range(10)]
+        uids.extend(container.reserve_uids(100000))
+        uids.append(container.next_uid())
+        self.assertEqual(len(set(uids)), len(uids))
+        self.assertEqual(uids, sorted(uids))
+
+        # ONE RESERVATION FOR THE SINGLE UIDS, ONE FOR THE BIG RANGE
+        self.assertEqual(container.db.stats().transactions.count, 2)
+        self.assertEqual(container.uid_block, 4 * MIN_UID_BLOCK)
+
+    def test_rebuild_from_data(self):
+        handle, filename = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        try:
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            container.get_or_create_facts("data").insert([{"a": [{"b": i}]} for i in range(10)])
+            max_id = db.query(SQL('SELECT MAX(__id__) FROM "data.a"')).data[0][0]
+            with db.transaction() as t:
+                # LOSE THE RESERVATIONS
+                t.execute(SQL('UPDATE "meta.about" SET next_id=0'))
+            db.close()
+
+            db = Sqlite(filename=filename)
+            container = Container(db=db)
+            self.assertGreater(container.next_uid(), max_id)
+            db.close()
+        finally:
+            os.remove(filename)
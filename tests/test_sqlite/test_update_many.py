@@ -0,0 +1,50 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+from jx_sqlite.sqlite import Sqlite
+
+
+class TestUpdateMany(FuzzyTestCase):
+
+    def test_keyed_updates(self):
+        db = Sqlite(stats=True)
+        container = Container(db=db)
+        table = container.get_or_create_facts("docs")
+        table.insert([{"_id": "k" + str(i), "a": i, "b": "x"} for i in range(1000)])
+        db.stats(clear=True)
+
+        table.update_many(
+            [{"_id": "k" + str(i), "set": {"a": -i, "c": {"d": True}}} for i in range(0, 1000, 2)] +
+            [
+                {"_id": "k1", "set": {"a": "one"}},  # CHANGE OF TYPE
+                {"_id": "k3", "clear": "b"},
+                {"_id": "missing", "set": {"a": 0}},
+            ]
+        )
+
+        # ONE TO ADD THE NEW COLUMN, ONE FOR THE UPDATES
+        self.assertEqual(db.stats().transactions.count, 2)
+        result = db.query(SQL('SELECT _id, "a.$n", "a.$s", "b.$s", "c.d.$b" FROM docs WHERE _id IN (\'k0\', \'k1\', \'k2\', \'k3\') ORDER BY _id'))
+        self.assertEqual(
+            [tuple(r) for r in result.data],
+            [("k0", 0, None, "x", 1), ("k1", None, "one", "x", None), ("k2", -2, None, "x", 1), ("k3", 3, None, None, None)]
+        )
+        self.assertEqual(db.query(SQL("SELECT COUNT(1) FROM docs")).data[0][0], 1000)
+
+    def test_reject_nested(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("docs")
+        table.insert([{"_id": "k", "n": [{"a": 1}, {"a": 2}]}])
+        self.assertRaises("Can not update", table.update_many, [{"_id": "k", "set": {"n.a": 3}}])
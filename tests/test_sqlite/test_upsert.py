@@ -0,0 +1,68 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import, division, unicode_literals
+
+from mo_sql import SQL
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from jx_sqlite.container import Container
+
+
+class TestUpsert(FuzzyTestCase):
+
+    def test_replace_nested(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("docs")
+        table.insert([
+            {"_id": "k1", "a": 1, "x": "gone", "n": [{"b": 1, "m": [{"z": 1}]}, {"b": 2}]},
+            {"_id": "k2", "a": 2, "n": [{"b": 3}]},
+        ])
+        db = container.db
+        k1 = db.query(SQL("SELECT __id__ FROM docs WHERE _id='k1'")).data[0][0]
+
+        table.upsert([
+            {"_id": "k1", "a": 0, "n": [{"b": 0}]},
+            {"_id": "k3", "a": 3, "n": [{"b": 6, "m": [{"z": 2}]}]},
+            {"_id": "k1", "a": 10, "n": [{"b": 5}]},  # LAST ONE WINS
+        ])
+
+        # EXISTING FACT KEEPS ITS UID, AND LOSES THE PROPERTY IT NO LONGER HAS
+        result = db.query(SQL('SELECT __id__, _id, "a.$n", "x.$s" FROM docs ORDER BY _id'))
+        self.assertEqual([tuple(r) for r in result.data][0], (k1, "k1", 10, None))
+        self.assertEqual([r[1:3] for r in result.data], [("k1", 10), ("k2", 2), ("k3", 3)])
+
+        result = db.query(SQL('SELECT p._id, c."n.b.$n" FROM "docs.n" c JOIN docs p ON p.__id__=c.__parent__ ORDER BY 1'))
+        self.assertEqual([tuple(r) for r in result.data], [("k1", 5), ("k2", 3), ("k3", 6)])
+
+        # NO ORPHANS LEFT IN THE DEEPER TABLE
+        result = db.query(SQL('SELECT "n.m.z.$n" FROM "docs.n.m"'))
+        self.assertEqual([tuple(r) for r in result.data], [(2,)])
+
+    def test_other_key(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("keyed")
+        table.upsert([{"k": i, "v": "a"} for i in range(5)], key="k")
+        table.upsert([{"k": i, "v": "b"} for i in range(3, 8)], key="k")
+        result = container.db.query(SQL('SELECT "k.$n", "v.$s" FROM keyed ORDER BY 1'))
+        self.assertEqual([tuple(r) for r in result.data], [(i, "a" if i < 3 else "b") for i in range(8)])
+
+        # NO INDEX IS MADE AS A SIDE EFFECT
+        result = container.db.query(SQL("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='keyed' AND name LIKE '%k.$n%'"))
+        self.assertEqual(result.data, [])
+
+    def test_duplicate_key(self):
+        container = Container(db={})
+        table = container.get_or_create_facts("keyed")
+        table.insert([{"k": 1, "v": "a"}, {"k": 1, "v": "b"}, {"k": 2, "v": "c"}])
+        self.assertRaises("more than one document with k=1", table.upsert, [{"k": 2, "v": "d"}, {"k": 1, "v": "e"}], key="k")
+
+        # NOTHING CHANGED
+        result = container.db.query(SQL('SELECT "k.$n", "v.$s" FROM keyed ORDER BY 2'))
+        self.assertEqual([tuple(r) for r in result.data], [(1, "a"), (1, "b"), (2, "c")])